@@ -1,15 +1,176 @@
-from flask import Flask, request, jsonify, Response
-import requests
-import xml.etree.ElementTree as ET
+from flask import Flask, request, jsonify, Response, g
+from flask.json.provider import DefaultJSONProvider
+from upstream import cliente, url_busqueda, url_estudio, vigilar_obsolescencia, cabeceras_obsolescencia
+from circuito import CircuitoAbierto
+from cache import cache
+from parseo import iterar_items, parsear_estudio, ItemsRSS, ConteoRSS, FasesRSS
+from clasificacion import ESTADOS, FASES, clasificador_fases, coincide_fase, resumen_clinico
+from indice import indice
+from criterios import normalizar_sexo
+from vocabulario import AUTOCOMPLETAR_MAX, TIPOS, canonizar_patologia, vocabulario
+from paginacion import Pagina, decodificar_cursor
+from informes import PDF_CALENTAR, generador_pdf
+from metricas import (METRICAS_ACTIVAS, TIPO_CONTENIDO, etapa, exponer, http_bytes, http_en_curso, http_segundos,
+                      reiniciar as reiniciar_metricas)
+from respuestas import Compresor, codificacion_aceptada, comprimible, comprimir, etiqueta, volcar_json
 import os
-import csv
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+import math
+import time
+import json
+import contextvars
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 app = Flask(__name__)
 
+# -------------------- UPSTREAM NO DISPONIBLE --------------------
+@app.before_request
+def abrir_registro_obsolescencia():
+    g.obsolescencia = vigilar_obsolescencia()
+
+@app.after_request
+def marcar_obsolescencia(response):
+    # Datos servidos desde una copia caducada porque el upstream no respondía
+    response.headers.update(cabeceras_obsolescencia(g.get('obsolescencia')))
+    return response
+
+def respuesta_error(e, mensaje=None):
+    # Circuito abierto y sin copia en caché: se falla al instante con 503 y Retry-After
+    cuerpo = jsonify({"error": mensaje or str(e)})
+    if isinstance(e, CircuitoAbierto):
+        return cuerpo, 503, {"Retry-After": str(math.ceil(e.reintentar_en))}
+    return cuerpo, 500
+
+# -------------------- MÉTRICAS --------------------
+class ProveedorJSON(DefaultJSONProvider):
+    # jsonify pasa por aquí: la serialización se mide como etapa propia y usa orjson si está instalado
+    def dumps(self, obj, **kwargs):
+        with etapa("serializacion"):
+            if 'indent' in kwargs:
+                return super().dumps(obj, **kwargs)
+            return volcar_json(obj, ordenar=self.sort_keys, default=self.default).decode('utf-8')
+
+app.json = ProveedorJSON(app)
+
+def iniciar_metricas():
+    g.metricas_inicio = time.perf_counter()
+    # Plantilla de la ruta, no la URL: acota la cardinalidad de las etiquetas
+    g.metricas_ruta = request.url_rule.rule if request.url_rule else "sin_ruta"
+    http_en_curso.sumar(1, request.method)
+
+def registrar_metricas(response):
+    # Flask también pasa por aquí las respuestas de error. En streaming la
+    # latencia llega hasta las cabeceras y no se conoce el tamaño.
+    metodo = request.method
+    http_en_curso.sumar(-1, metodo)
+    http_segundos.observar(time.perf_counter() - g.metricas_inicio, metodo, g.metricas_ruta,
+                           str(response.status_code))
+    # Un 304 conserva aquí el Content-Length de la respuesta completa, pero sale sin cuerpo
+    tamano = 0 if response.status_code == 304 else response.content_length
+    if tamano is not None:
+        http_bytes.observar(tamano, g.metricas_ruta)
+    return response
+
+if METRICAS_ACTIVAS:
+    app.before_request(iniciar_metricas)
+    app.after_request(registrar_metricas)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not METRICAS_ACTIVAS:
+        return jsonify({"error": "Métricas desactivadas (METRICAS=0)"}), 404
+    return Response(exponer(), content_type=TIPO_CONTENIDO)
+
+# -------------------- CACHÉ HTTP Y COMPRESIÓN --------------------
+# Se registra después de las métricas para que estas vean el 304 y los bytes comprimidos
+@app.after_request
+def negociar_respuesta(response):
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    # Respuestas completas: ETag del cuerpo y 304 si el cliente ya tiene esa versión
+    if not response.is_streamed and request.method in ('GET', 'HEAD') and response.status_code == 200:
+        response.headers['ETag'] = etiqueta(response.get_data())
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+    if not comprimible(response.mimetype, None if response.is_streamed else response.content_length):
+        return response
+    response.vary.add('Accept-Encoding')
+    codificacion = codificacion_aceptada(request.headers.get('Accept-Encoding'))
+    if codificacion is None:
+        return response
+    if response.is_streamed:
+        response.response = comprimir_flujo(response.response, Compresor(codificacion))
+    else:
+        response.set_data(comprimir(response.get_data(), codificacion))
+    response.headers['Content-Encoding'] = codificacion
+    return response
+
+def comprimir_flujo(trozos, compresor):
+    try:
+        for trozo in trozos:
+            yield compresor.comprimir(trozo.encode('utf-8') if isinstance(trozo, str) else trozo)
+        yield compresor.terminar()
+    finally:
+        if hasattr(trozos, 'close'):
+            trozos.close()
+
 # -------------------- BUSCAR ENSAYOS --------------------
+FORMATOS_STREAMING = ('ndjson', 'json_stream')
+
+def ensayos_filtrados(items, filtro_fase=''):
+    # El RSS no trae estado ni países: solo la fase (deducida del título) se puede filtrar aquí
+    for item in items:
+        titulo = item["titulo"]
+        link = item["link"]
+        ensayo_id = link.split("/")[-1] if link else "N/A"
+        estado = ESTADOS[0]  # el feed no trae el estado
+        codigo_fase = clasificador_fases.clasificar_uno(titulo)
+        ubicacion = "Desconocida"
+
+        if filtro_fase and not coincide_fase(codigo_fase, filtro_fase):
+            continue
+
+        yield {
+            "identificador": ensayo_id,
+            "titulo": titulo,
+            "estado": estado,
+            "fase": FASES[codigo_fase],
+            "ubicacion": ubicacion
+        }
+
+def respuesta_streaming(pagina, formato, avisos=None):
+    avisos = avisos or {}
+    ensayos = iter(pagina)
+    # El primer elemento se lee antes de responder para que un fallo del upstream siga dando 500
+    primero = next(ensayos, None)
+    pendientes = itertools.chain([primero], ensayos) if primero is not None else ensayos
+
+    def ndjson():
+        try:
+            for ensayo in pendientes:
+                yield json.dumps(ensayo) + "\n"
+            final = {"paginacion": pagina.metadatos()} if pagina.limite or pagina.offset else {}
+            final.update(avisos)
+            if final:
+                yield json.dumps(final) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    def json_stream():
+        yield '{"ensayos": ['
+        try:
+            for i, ensayo in enumerate(pendientes):
+                yield ("," if i else "") + json.dumps(ensayo)
+            # Cierre: el resto del objeto, sin su llave de apertura
+            yield '], ' + json.dumps({"paginacion": pagina.metadatos(), **avisos})[1:]
+        except Exception as e:
+            yield '], "error": ' + json.dumps(str(e)) + '}'
+
+    if formato == 'ndjson':
+        return Response(ndjson(), mimetype='application/x-ndjson')
+    return Response(json_stream(), mimetype='application/json')
+
 @app.route('/buscar_ensayos', methods=['GET'])
 def buscar_ensayos():
     molecula = request.args.get('molecula')
@@ -18,87 +179,131 @@ def buscar_ensayos():
     filtro_estado = request.args.get('estado', '').lower()
     filtro_fase = request.args.get('fase', '').lower()
     filtro_pais = request.args.get('pais', '').lower()
+    limite = request.args.get('limite', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    cursor = request.args.get('cursor')
 
     if not molecula and not patologia:
         return jsonify({"error": "Debe especificar al menos 'molecula' o 'patologia'"}), 400
+    try:
+        if cursor:
+            offset = decodificar_cursor(cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if offset < 0 or (limite is not None and limite < 1):
+        return jsonify({"error": "'offset' y 'limite' deben ser positivos"}), 400
 
-    rss_url = f"https://clinicaltrials.gov/ct2/results/rss.xml?term={molecula}&cond={patologia}"
+    rss_url = url_busqueda(molecula, patologia)
 
     try:
-        response = requests.get(rss_url)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-
-        ensayos = []
-        for item in root.findall(".//item"):
-            titulo = item.find("title").text or ""
-            link = item.find("link").text or ""
-            ensayo_id = link.split("/")[-1] if link else "N/A"
-            estado = "En curso"
-            fase = "3" if "phase 3" in titulo.lower() else "Desconocida"
-            ubicacion = "Desconocida"
-
-            if filtro_estado and filtro_estado not in estado.lower():
-                continue
-            if filtro_fase and filtro_fase != fase.lower():
-                continue
-            if filtro_pais and filtro_pais not in ubicacion.lower():
-                continue
-
-            ensayos.append({
-                "identificador": ensayo_id,
-                "titulo": titulo,
-                "estado": estado,
-                "fase": fase,
-                "ubicacion": ubicacion
-            })
+        # Filtros estructurados: se resuelven en el índice local solo si una sincronización completa y
+        # reciente lo cubre para esta búsqueda; si no, el upstream es la fuente de verdad
+        filtrada = filtro_estado or filtro_fase or filtro_pais
+        cobertura = indice.cobertura(molecula, patologia) if filtrada else None
+        avisos = {}
+        if cobertura:
+            fuente = "indice"
+            avisos["cobertura"] = cobertura
+            ensayos = indice.buscar(molecula=molecula, patologia=patologia, estado=filtro_estado, fase=filtro_fase,
+                                    pais=filtro_pais, limite=offset + limite + 1 if limite else None)
+        else:
+            # Formatos streaming y primera página con 'limite': se parsea mientras se descarga
+            # y se corta al llenar la página. Resto de páginas: feed completo (cacheado y compartido).
+            fuente = "upstream"
+            no_aplicados = [nombre for nombre, valor in (("estado", filtro_estado), ("pais", filtro_pais)) if valor]
+            if no_aplicados:
+                avisos["filtros_no_aplicados"] = no_aplicados
+            if formato in FORMATOS_STREAMING or (limite and not offset):
+                items = iterar_items(cliente.iterar(rss_url))
+            else:
+                items = cliente.consumir(rss_url, ItemsRSS)
+            ensayos = ensayos_filtrados(items, filtro_fase)
+        pagina = Pagina(ensayos, offset, limite)
+
+        if formato in FORMATOS_STREAMING:
+            return respuesta_streaming(pagina, formato, avisos)
+
+        # En la ruta en streaming incluye la descarga y el parseo que se intercalan con el filtrado
+        with etapa("filtrado"):
+            ensayos = list(pagina)
 
         if formato == 'texto':
             resumen = f"Se encontraron {len(ensayos)} ensayos clínicos:\n\n"
             for i, ensayo in enumerate(ensayos[:10], 1):
                 resumen += f"{i}. {ensayo['titulo']} (ID: {ensayo['identificador']})\n"
+            if "filtros_no_aplicados" in avisos:
+                resumen += f"\nFiltros no aplicados (el feed no trae esos datos): {', '.join(avisos['filtros_no_aplicados'])}\n"
             return resumen, 200, {'Content-Type': 'text/plain; charset=utf-8'}
 
-        return jsonify({"ensayos": ensayos})
+        respuesta = {"ensayos": ensayos, "fuente": fuente, **avisos}
+        if limite or offset:
+            respuesta["paginacion"] = pagina.metadatos()
+        return jsonify(respuesta)
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return respuesta_error(e)
 
 # -------------------- DETALLE ENSAYO --------------------
+def obtener_detalle(ensayo_id):
+    registro, origen = cliente.obtener(url_estudio(ensayo_id), parsear_estudio, con_origen=True)
+    # Los detalles recién descargados alimentan el índice local; una copia en caché ya se indexó al llegar
+    if origen == "upstream":
+        indice.guardar_detalle(registro)
+    return registro.a_dict()
+
 @app.route('/ensayo_detalle', methods=['GET'])
 def ensayo_detalle():
     ensayo_id = request.args.get('id')
     if not ensayo_id:
         return jsonify({"error": "El parámetro 'id' es obligatorio"}), 400
 
-    url = f"https://clinicaltrials.gov/ct2/show/{ensayo_id}?displayxml=true"
-
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
+        return jsonify(obtener_detalle(ensayo_id))
 
-        def get_text(path):
-            el = root.find(path)
-            return el.text if el is not None else "No disponible"
+    except Exception as e:
+        return respuesta_error(e, f"No se pudo obtener el detalle del ensayo: {str(e)}")
 
-        return jsonify({
-            "id": ensayo_id,
-            "titulo": get_text(".//official_title") or get_text(".//brief_title"),
-            "resumen": get_text(".//brief_summary/textblock"),
-            "estado": get_text(".//overall_status"),
-            "fase": get_text(".//phase"),
-            "tipo_estudio": get_text(".//study_type"),
-            "patrocinador": get_text(".//lead_sponsor/agency"),
-            "fecha_inicio": get_text(".//start_date"),
-            "condiciones": [el.text for el in root.findall(".//condition")],
-            "intervenciones": [el.text for el in root.findall(".//intervention/intervention_name")],
-            "ubicaciones": [el.text for el in root.findall(".//location/facility/name")],
-            "criterios": get_text(".//eligibility/criteria/textblock")
-        })
+# -------------------- DETALLE EN LOTE --------------------
+DETALLE_MAX_IDS = int(os.environ.get("DETALLE_MAX_IDS", 100))
+DETALLE_MAX_PARALELO = int(os.environ.get("DETALLE_MAX_PARALELO", 10))
+pool_detalle = ThreadPoolExecutor(max_workers=DETALLE_MAX_PARALELO, thread_name_prefix="detalle")
 
+def detalle_o_error(ensayo_id):
+    try:
+        return ensayo_id, {"detalle": obtener_detalle(ensayo_id)}
     except Exception as e:
-        return jsonify({"error": f"No se pudo obtener el detalle del ensayo: {str(e)}"}), 500
+        return ensayo_id, {"error": f"No se pudo obtener el detalle del ensayo: {str(e)}"}
+
+@app.route('/ensayos_detalle', methods=['POST'])
+def ensayos_detalle():
+    cuerpo = request.get_json(silent=True)
+    ids = cuerpo.get('ids') if isinstance(cuerpo, dict) else cuerpo
+    formato = request.args.get('formato', 'json')
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        return jsonify({"error": "El cuerpo debe ser {\"ids\": [...]} con una lista de identificadores"}), 400
+    ids = list(dict.fromkeys(i.strip() for i in ids if i.strip()))
+    if not ids:
+        return jsonify({"error": "La lista 'ids' está vacía"}), 400
+    if len(ids) > DETALLE_MAX_IDS:
+        return jsonify({"error": f"Máximo {DETALLE_MAX_IDS} identificadores por petición"}), 400
+
+    # Las descargas comparten caché y single-flight con /ensayo_detalle
+    # (en el contexto de la petición, para que anoten si sirven datos obsoletos)
+    futuros = [pool_detalle.submit(contextvars.copy_context().run, detalle_o_error, ensayo_id) for ensayo_id in ids]
+
+    if formato == 'ndjson':
+        def generar():
+            # Cada ensayo se emite en cuanto llega, sin esperar al más lento
+            for futuro in as_completed(futuros):
+                ensayo_id, resultado = futuro.result()
+                yield json.dumps({"id": ensayo_id, **resultado}) + "\n"
+        return Response(generar(), mimetype='application/x-ndjson')
+
+    resultados = dict(futuro.result() for futuro in futuros)
+    return jsonify({
+        "ensayos": {i: r["detalle"] for i, r in resultados.items() if "detalle" in r},
+        "errores": {i: r["error"] for i, r in resultados.items() if "error" in r}
+    })
 
 # -------------------- CRITERIOS POR ID --------------------
 @app.route('/criterios_ensayo', methods=['GET'])
@@ -108,43 +313,136 @@ def criterios_ensayo():
         return jsonify({"error": "El parámetro 'id' es obligatorio"}), 400
 
     try:
-        url = f"https://clinicaltrials.gov/ct2/show/{ensayo_id}?displayxml=true"
-        r = requests.get(url)
-        r.raise_for_status()
-        root = ET.fromstring(r.content)
-        criterios = root.find(".//eligibility/criteria/textblock")
+        # Mismo registro (y misma descarga en curso) que /ensayo_detalle
+        registro = cliente.obtener(url_estudio(ensayo_id), parsear_estudio)
         return jsonify({
             "id": ensayo_id,
-            "criterios_inclusion_exclusion": criterios.text if criterios is not None else "No disponible"
+            "criterios_inclusion_exclusion": registro.criterios,
+            "elegibilidad": registro.elegibilidad.a_dict()
         })
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return respuesta_error(e)
+
+# -------------------- BÚSQUEDA POR CRITERIOS --------------------
+def lista_parametro(valor):
+    return [t.strip() for t in (valor or '').split(',') if t.strip()]
+
+@app.route('/buscar_por_criterios', methods=['GET'])
+def buscar_por_criterios():
+    # Ej.: ensayos de ruxolitinib en vitiligo que no excluyen a mayores de 65 ni a embarazadas:
+    # ?molecula=ruxolitinib&patologia=vitiligo&edad=66&no_excluye=embarazo
+    molecula = request.args.get('molecula')
+    patologia = request.args.get('patologia')
+    edad = request.args.get('edad', type=float)
+    sexo = request.args.get('sexo')
+    incluye = lista_parametro(request.args.get('incluye'))
+    no_excluye = lista_parametro(request.args.get('no_excluye'))
+    limite = request.args.get('limite', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    cursor = request.args.get('cursor')
+
+    if not (molecula or patologia or edad is not None or sexo or incluye or no_excluye):
+        return jsonify({"error": "Debe especificar al menos un criterio de búsqueda"}), 400
+    if sexo and normalizar_sexo(sexo) is None:
+        return jsonify({"error": "'sexo' debe ser 'mujeres', 'hombres' o 'todos'"}), 400
+    try:
+        if cursor:
+            offset = decodificar_cursor(cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if offset < 0 or (limite is not None and limite < 1):
+        return jsonify({"error": "'offset' y 'limite' deben ser positivos"}), 400
+
+    # Criterios parseados al indexar cada ensayo: solo consultas sobre el índice local
+    ensayos = indice.buscar_por_criterios(molecula, patologia, edad, sexo, incluye, no_excluye,
+                                          limite=offset + limite + 1 if limite else None)
+    pagina = Pagina(ensayos, offset, limite)
+    respuesta = {"ensayos": list(pagina), "fuente": "indice"}
+    if limite or offset:
+        respuesta["paginacion"] = pagina.metadatos()
+    return jsonify(respuesta)
+
+# -------------------- AUTOCOMPLETAR --------------------
+@app.route('/autocompletar', methods=['GET'])
+def autocompletar():
+    # Ej.: ?q=sema -> semaglutide (por "semaglutida"); ?q=cánc&tipo=patologia -> cancer, breast cancer...
+    q = request.args.get('q')
+    tipo = request.args.get('tipo') or None
+    limite = request.args.get('limite', AUTOCOMPLETAR_MAX, type=int)
+    if q is None:
+        return jsonify({"error": "El parámetro 'q' es obligatorio"}), 400
+    if tipo and tipo not in TIPOS.values():
+        return jsonify({"error": "'tipo' debe ser 'molecula' o 'patologia'"}), 400
+    if not 1 <= limite <= AUTOCOMPLETAR_MAX:
+        return jsonify({"error": f"'limite' debe estar entre 1 y {AUTOCOMPLETAR_MAX}"}), 400
+
+    # Índice de prefijos en memoria construido al arrancar: sin E/S ni consultas
+    return jsonify({"q": q, "sugerencias": vocabulario.autocompletar(q, tipo, limite)})
 
 # -------------------- COMPARAR MOLÉCULAS --------------------
+COMPARAR_MAX_MOLECULAS = int(os.environ.get("COMPARAR_MAX_MOLECULAS", 20))
+COMPARAR_DEADLINE = float(os.environ.get("COMPARAR_DEADLINE", 10))
+COMPARAR_DEADLINE_MAX = float(os.environ.get("COMPARAR_DEADLINE_MAX", 30))
+COMPARAR_PARALELO = int(os.environ.get("COMPARAR_PARALELO", 5))
+
 @app.route('/comparar_moleculas', methods=['GET'])
 def comparar_moleculas():
-    mol1 = request.args.get('molecula1')
-    mol2 = request.args.get('molecula2')
+    moleculas = [m.strip() for m in request.args.get('moleculas', '').split(',') if m.strip()]
+    # Forma antigua (?molecula1=&molecula2=): se mantienen sus claves de primer nivel
+    legado = not moleculas
+    moleculas += [m for m in (request.args.get('molecula1'), request.args.get('molecula2')) if m]
+    moleculas = list(dict.fromkeys(moleculas))
     patologia = request.args.get('patologia')
-    if not mol1 or not mol2 or not patologia:
+    deadline = min(request.args.get('timeout', COMPARAR_DEADLINE, type=float), COMPARAR_DEADLINE_MAX)
+    if len(moleculas) < 2 or not patologia:
         return jsonify({"error": "Faltan parámetros obligatorios"}), 400
+    if len(moleculas) > COMPARAR_MAX_MOLECULAS:
+        return jsonify({"error": f"Máximo {COMPARAR_MAX_MOLECULAS} moléculas por comparación"}), 400
+    if not deadline > 0:
+        return jsonify({"error": "'timeout' debe ser mayor que 0"}), 400
+
+    # El plazo baja hasta el cliente upstream (semáforo, timeouts, reintentos y descarga): cada hilo
+    # termina al vencer en lugar de quedar abandonado
+    plazo = time.monotonic() + deadline
 
     def contar(mol):
+        inicio = time.perf_counter()
         try:
-            url = f"https://clinicaltrials.gov/ct2/results/rss.xml?term={mol}&cond={patologia}"
-            r = requests.get(url)
-            r.raise_for_status()
-            return len(ET.fromstring(r.content).findall(".//item"))
-        except:
-            return 0
+            ensayos, origen = cliente.consumir(url_busqueda(mol, patologia), ConteoRSS, con_origen=True, plazo=plazo)
+            return {"ensayos": ensayos, "latencia_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                    "desde_cache": origen != "upstream", "obsoleto": origen == "obsoleto"}
+        except TimeoutError:
+            return {"ensayos": None, "latencia_ms": None, "desde_cache": False,
+                    "error": f"Sin respuesta en {deadline}s"}
+        except Exception as e:
+            return {"ensayos": None, "latencia_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                    "desde_cache": False, "error": str(e)}
+
+    # Pool propio de cada petición, con a lo sumo COMPARAR_PARALELO hilos: una comparación no hace
+    # cola detrás de otra y al salir del `with` no queda ningún hilo trabajando
+    with ThreadPoolExecutor(max_workers=min(len(moleculas), COMPARAR_PARALELO),
+                            thread_name_prefix="comparar") as pool:
+        contextos = [contextvars.copy_context() for _ in moleculas]
+        resultados = dict(zip(moleculas, pool.map(lambda ctx, mol: ctx.run(contar, mol), contextos, moleculas)))
 
     return jsonify({
-        mol1: contar(mol1),
-        mol2: contar(mol2),
-        "patologia": patologia
+        **({mol: r["ensayos"] for mol, r in resultados.items()} if legado else {}),
+        "patologia": patologia,
+        "resultados": resultados,
+        "completo": all("error" not in r for r in resultados.values())
     })
 
 # -------------------- ENDPOINT ANALYSIS --------------------
+# Claves canónicas del vocabulario: "Cáncer", "neoplasia" o "tumor" -> "cancer"
+ENDPOINTS_COMUNES = {
+    "cancer": ["supervivencia global", "respuesta objetiva"],
+    "diabetes": ["HbA1c", "peso corporal"],
+    "type 1 diabetes": ["HbA1c", "peso corporal"],
+    "type 2 diabetes": ["HbA1c", "peso corporal"],
+    "vitiligo": ["re-pigmentación", "mejora de VASI"]
+}
+SIN_ENDPOINTS = ["No especificados"]
+
 @app.route('/analisis_endpoint', methods=['GET'])
 def analisis_endpoint():
     patologia = request.args.get('patologia')
@@ -152,16 +450,10 @@ def analisis_endpoint():
     if not patologia:
         return jsonify({"error": "El parámetro 'patologia' es obligatorio"}), 400
 
-    comunes = {
-        "cáncer": ["supervivencia global", "respuesta objetiva"],
-        "diabetes": ["HbA1c", "peso corporal"],
-        "vitiligo": ["re-pigmentación", "mejora de VASI"]
-    }
-
     return jsonify({
         "patologia": patologia,
         "fase": fase,
-        "endpoints_comunes": comunes.get(patologia.lower(), ["No especificados"])
+        "endpoints_comunes": ENDPOINTS_COMUNES.get(canonizar_patologia(patologia), SIN_ENDPOINTS)
     })
 
 # -------------------- PICO SUGERIDO (+ PDF) --------------------
@@ -182,26 +474,44 @@ def pico_sugerido():
     }
 
     if formato == 'pdf':
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(50, height - 50, f"Esquema PICO - {molecula} / {patologia}")
-        c.setFont("Helvetica", 12)
-        y = height - 100
-        for clave, valor in pico.items():
-            c.drawString(50, y, f"{clave}: {valor}")
-            y -= 30
-        c.save()
-        buffer.seek(0)
-
-        return Response(buffer, mimetype='application/pdf', headers={
+        parametros = {"molecula": molecula, "patologia": patologia, "pico": pico}
+        if request.args.get('modo') == 'trabajo':
+            return respuesta_trabajo(generador_pdf.crear_trabajo("pico", parametros))
+        # El render corre en el pool de procesos; este hilo solo espera
+        pdf = generador_pdf.renderizar("pico", parametros)
+        return Response(pdf, mimetype='application/pdf', headers={
             "Content-Disposition": f"attachment;filename=pico_{molecula}.pdf"
         })
 
     return jsonify(pico)
 
+# -------------------- TRABAJOS PDF --------------------
+def respuesta_trabajo(trabajo_id):
+    return jsonify({
+        "id": trabajo_id,
+        "estado_url": f"/trabajos_pdf/{trabajo_id}",
+        "descarga_url": f"/trabajos_pdf/{trabajo_id}/pdf"
+    }), 202
+
+@app.route('/trabajos_pdf/<trabajo_id>', methods=['GET'])
+def estado_trabajo_pdf(trabajo_id):
+    estado = generador_pdf.estado_trabajo(trabajo_id)
+    if estado is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(estado)
+
+@app.route('/trabajos_pdf/<trabajo_id>/pdf', methods=['GET'])
+def descargar_trabajo_pdf(trabajo_id):
+    pdf = generador_pdf.resultado_trabajo(trabajo_id)
+    if pdf is None:
+        estado = generador_pdf.estado_trabajo(trabajo_id)
+        if estado is None:
+            return jsonify({"error": "Trabajo no encontrado"}), 404
+        return jsonify(estado), 409
+    return Response(pdf, mimetype='application/pdf', headers={
+        "Content-Disposition": f"attachment;filename=informe_{trabajo_id[:12]}.pdf"
+    })
+
 # -------------------- TENDENCIAS DE INVESTIGACIÓN --------------------
 @app.route('/tendencias_investigacion', methods=['GET'])
 def tendencias_investigacion():
@@ -209,29 +519,12 @@ def tendencias_investigacion():
     if not patologia:
         return jsonify({"error": "El parámetro 'patologia' es obligatorio"}), 400
 
-    datos = {
-        "vitiligo": {
-            "moleculas_en_alza": ["ruxolitinib", "tofacitinib", "baricitinib"],
-            "endpoints_frecuentes": ["mejora del VASI", "calidad de vida", "re-pigmentación facial"],
-            "zonas_con_mayor_actividad": ["EEUU", "India", "España"],
-            "nuevos_estudios_por_año": {
-                "2021": 6, "2022": 10, "2023": 14, "2024": 18
-            }
-        },
-        "diabetes": {
-            "moleculas_en_alza": ["semaglutida", "tirzepatida", "dapagliflozina"],
-            "endpoints_frecuentes": ["HbA1c", "peso corporal", "riesgo CV"],
-            "zonas_con_mayor_actividad": ["EEUU", "México", "Brasil"],
-            "nuevos_estudios_por_año": {
-                "2021": 20, "2022": 25, "2023": 30, "2024": 34
-            }
-        }
-    }
-
-    if patologia.lower() not in datos:
-        return jsonify({"error": f"No hay datos simulados para {patologia}"}), 404
+    # Agregados materializados en el índice local: se actualizan al guardar cada ensayo
+    tendencias = indice.tendencias(patologia)
+    if tendencias is None:
+        return jsonify({"error": f"No hay ensayos indexados para {patologia}"}), 404
 
-    return jsonify({"patologia": patologia, **datos[patologia.lower()]})
+    return jsonify({"patologia": patologia, **tendencias, "fuente": "indice"})
 
 # -------------------- RESUMEN CLÍNICO DE MOLÉCULA --------------------
 @app.route('/resumen_molecula', methods=['GET'])
@@ -243,37 +536,41 @@ def resumen_molecula():
         return jsonify({"error": "Los parámetros 'molecula' y 'patologia' son obligatorios"}), 400
 
     try:
-        url = f"https://clinicaltrials.gov/ct2/results/rss.xml?term={molecula}&cond={patologia}"
-        response = requests.get(url)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-        items = root.findall(".//item")
-
-        cantidad = len(items)
-        fases_detectadas = []
-        for item in items:
-            titulo = item.find("title").text or ""
-            if "phase 1" in titulo.lower(): fases_detectadas.append("Fase 1")
-            if "phase 2" in titulo.lower(): fases_detectadas.append("Fase 2")
-            if "phase 3" in titulo.lower(): fases_detectadas.append("Fase 3")
-
-        fases_unicas = list(set(fases_detectadas))
-        recomendacion = "Revisión favorable" if "Fase 3" in fases_unicas else "Revisión preliminar"
-
-        return jsonify({
-            "molécula": molecula,
-            "patología": patologia,
-            "ensayos_encontrados": cantidad,
-            "fases_detectadas": fases_unicas or ["No especificadas"],
-            "centros_participantes_estimados": f"{min(5 + cantidad, 50)} (estimación)",
-            "recomendación": recomendacion,
-            "observaciones": "Resumen automático. Requiere evaluación experta."
-        })
+        url = url_busqueda(molecula, patologia)
+        ids, fases = cliente.consumir(url, FasesRSS)
+        return jsonify(resumen_clinico(molecula, patologia, fases, indice.estados(ids)))
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return respuesta_error(e)
+
+# -------------------- ESTADÍSTICAS DE CACHÉ --------------------
+@app.route('/estadisticas_cache', methods=['GET'])
+def estadisticas_cache():
+    return jsonify({**cache.estadisticas(), "circuito": cliente.circuito.estadisticas(),
+                    "pdf": generador_pdf.estadisticas()})
+
+# -------------------- CALENTAMIENTO --------------------
+# Rutas que solo usan datos locales (vocabulario, tablas, índice, caché): no llaman al upstream
+RUTAS_CALENTAMIENTO = (
+    '/autocompletar?q=a',
+    '/analisis_endpoint?patologia=cancer',
+    '/buscar_por_criterios?edad=40&no_excluye=embarazo&limite=1',
+    '/estadisticas_cache',
+)
+
+def calentar():
+    # Antes de aceptar tráfico (servidor.py): conexiones con el upstream ya abiertas y una pasada
+    # por las rutas locales (hooks, JSON, consultas SQLite). No cuentan en las métricas.
+    cliente.calentar()
+    if PDF_CALENTAR:
+        generador_pdf.calentar()
+    with app.test_client() as c:
+        for ruta in RUTAS_CALENTAMIENTO:
+            c.get(ruta)
+    reiniciar_metricas()
 
 # -------------------- EJECUCIÓN APP --------------------
 if __name__ == '__main__':
+    # Solo para desarrollo: cada worker de PDF reejecutaría este script; en producción, servidor.py
     port = int(os.environ.get("PORT", 10000))
     app.run(host='0.0.0.0', port=port)
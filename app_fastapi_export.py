@@ -1,161 +1,600 @@
 
-from fastapi import FastAPI, Query
-from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi import FastAPI, Query, Body
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from contextlib import asynccontextmanager, aclosing
 from typing import Optional, List
-import requests
-import xml.etree.ElementTree as ET
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+from upstream import ClienteUpstreamAsync, url_busqueda, url_estudio, vigilar_obsolescencia, cabeceras_obsolescencia
+from circuito import CircuitoAbierto
+from cache import cache
+from parseo import aiterar_items, parsear_estudio, ItemsRSS, ConteoRSS, FasesRSS
+from clasificacion import ESTADOS, FASES, clasificador_fases, coincide_fase, resumen_clinico
+from indice import indice
+from criterios import normalizar_sexo
+from vocabulario import AUTOCOMPLETAR_MAX, canonizar_patologia, vocabulario
+from paginacion import Pagina, decodificar_cursor
+from informes import PDF_CALENTAR, generador_pdf, clave_pdf
+from metricas import (METRICAS_ACTIVAS, TIPO_CONTENIDO, etapa, exponer, http_bytes, http_en_curso, http_segundos,
+                      reiniciar as reiniciar_metricas)
+from respuestas import Compresor, codificacion_aceptada, coincide_etag, comprimible, comprimir, etiqueta, volcar_json
+from exportacion import EscritorCSV, EscritorParquet, VolcadoFilas, aexportar, fila_exportacion
+import os
+import math
+import json
+import time
+import asyncio
+from collections import deque
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Un único cliente asíncrono (pool keep-alive) compartido por todas las peticiones
+    app.state.upstream = ClienteUpstreamAsync()
+    if CALENTAR_AL_ARRANCAR:
+        # uvicorn no abre el puerto (ni gunicorn da el worker por listo) hasta que termina el arranque
+        await calentar(app)
+    yield
+    await app.state.upstream.aclose()
+    generador_pdf.cerrar()
+
+
+class RespuestaJSON(JSONResponse):
+    # Respuesta por defecto: la serialización de los dict devueltos se mide como etapa propia
+    # y usa orjson si está instalado
+    def render(self, content):
+        with etapa("serializacion"):
+            return volcar_json(content)
+
 
 app = FastAPI(
     title="API de Ensayos Clínicos",
     description="API para consultar y analizar información sobre ensayos clínicos.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=RespuestaJSON
 )
 
 
+# -------------------- UPSTREAM NO DISPONIBLE --------------------
+class MarcarObsolescencia:
+    """Middleware ASGI: abre el registro de obsolescencia de cada petición y,
+    si se sirvieron copias caducadas porque el upstream no respondía, lo
+    indica en las cabeceras. No envuelve el cuerpo, así que no penaliza las
+    respuestas en streaming."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        registro = vigilar_obsolescencia()
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start" and registro:
+                extra = [(k.lower().encode("latin-1"), v.encode("latin-1"))
+                         for k, v in cabeceras_obsolescencia(registro).items()]
+                mensaje = {**mensaje, "headers": [*mensaje.get("headers", []), *extra]}
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
+
+
+app.add_middleware(MarcarObsolescencia)
+
+
+# -------------------- CACHÉ HTTP Y COMPRESIÓN --------------------
+class NegociarRespuesta:
+    """Middleware ASGI de ETag y compresión. Retiene el inicio de la
+    respuesta hasta el primer trozo del cuerpo: si llega entero (respuestas
+    normales) calcula un ETag débil y contesta 304 cuando coincide con
+    If-None-Match; si no (streaming), lo deja pasar. En ambos casos comprime
+    con gzip o brotli según Accept-Encoding. Va dentro del de métricas para
+    que este cuente el 304 y los bytes comprimidos."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        peticion = Headers(scope=scope)
+        condicional = scope["method"] in ("GET", "HEAD")
+        codificacion = codificacion_aceptada(peticion.get("accept-encoding"))
+        inicio = None
+        compresor = None
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body":
+                await send(mensaje)
+                return
+            cuerpo = mensaje.get("body", b"")
+            completo = not mensaje.get("more_body", False)
+            if inicio is None:
+                # Siguientes trozos de una respuesta en streaming
+                if compresor is not None:
+                    cuerpo = compresor.comprimir(cuerpo) + (compresor.terminar() if completo else b"")
+                await send({**mensaje, "body": cuerpo})
+                return
+            respuesta, inicio = inicio, None
+            cabeceras = MutableHeaders(raw=list(respuesta.get("headers", [])))
+            if completo and condicional and respuesta["status"] == 200:
+                cabeceras["etag"] = etiqueta(cuerpo)
+                if coincide_etag(peticion.get("if-none-match"), cabeceras["etag"]):
+                    del cabeceras["content-length"]
+                    del cabeceras["content-type"]
+                    await send({**respuesta, "status": 304, "headers": cabeceras.raw})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+            if "content-encoding" not in cabeceras and comprimible(cabeceras.get("content-type"),
+                                                                    len(cuerpo) if completo else None):
+                cabeceras.add_vary_header("Accept-Encoding")
+                if codificacion is not None:
+                    cabeceras["content-encoding"] = codificacion
+                    if completo:
+                        cuerpo = comprimir(cuerpo, codificacion)
+                        cabeceras["content-length"] = str(len(cuerpo))
+                    else:
+                        del cabeceras["content-length"]
+                        compresor = Compresor(codificacion)
+                        cuerpo = compresor.comprimir(cuerpo)
+            await send({**respuesta, "headers": cabeceras.raw})
+            await send({**mensaje, "body": cuerpo})
+
+        await self.app(scope, receive, enviar)
+
+
+app.add_middleware(NegociarRespuesta)
+
+
+# -------------------- MÉTRICAS --------------------
+class Metricas:
+    """Middleware ASGI de métricas por endpoint: latencia hasta el último byte
+    (también en streaming), código de estado, bytes enviados y peticiones en
+    curso. Como MarcarObsolescencia, solo observa los mensajes que pasan."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inicio = time.perf_counter()
+        estado = "500"
+        enviados = 0
+
+        async def enviar(mensaje):
+            nonlocal estado, enviados
+            if mensaje["type"] == "http.response.start":
+                estado = str(mensaje["status"])
+            elif mensaje["type"] == "http.response.body":
+                enviados += len(mensaje.get("body", b""))
+            await send(mensaje)
+
+        http_en_curso.sumar(1, scope["method"])
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            http_en_curso.sumar(-1, scope["method"])
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            http_segundos.observar(time.perf_counter() - inicio, scope["method"], ruta, estado)
+            http_bytes.observar(enviados, ruta)
+
+
+if METRICAS_ACTIVAS:
+    app.add_middleware(Metricas)
+
+
+@app.get("/metrics")
+def metrics():
+    if not METRICAS_ACTIVAS:
+        return JSONResponse({"error": "Métricas desactivadas (METRICAS=0)"}, status_code=404)
+    return PlainTextResponse(exponer(), media_type=TIPO_CONTENIDO)
+
+
+def respuesta_error(e, mensaje=None):
+    # Circuito abierto y sin copia en caché: se falla al instante con 503 y Retry-After
+    cuerpo = {"error": mensaje or str(e)}
+    if isinstance(e, CircuitoAbierto):
+        return JSONResponse(cuerpo, status_code=503, headers={"Retry-After": str(math.ceil(e.reintentar_en))})
+    return cuerpo
+
+
 # -------------------- BUSCAR ENSAYOS --------------------
+FORMATOS_STREAMING = ("ndjson", "json_stream")
+
+
+async def items_busqueda(url, streaming=False):
+    # En streaming se parsea mientras se descarga y la descarga se corta al dejar de iterar
+    if not streaming:
+        for item in await app.state.upstream.consumir(url, ItemsRSS):
+            yield item
+        return
+    async with aclosing(aiterar_items(app.state.upstream.iterar(url))) as items:
+        async for item in items:
+            yield item
+
+
+async def desde_lista(ensayos):
+    for ensayo in ensayos:
+        yield ensayo
+
+
+async def ensayos_filtrados(items, fase=None):
+    # El RSS no trae estado ni países: solo la fase (deducida del título) se puede filtrar aquí
+    async for item in items:
+        titulo = item["titulo"]
+        link = item["link"]
+        ensayo_id = link.split("/")[-1] if link else "N/A"
+        estado_estudio = ESTADOS[0]  # el feed no trae el estado
+        codigo_fase = clasificador_fases.clasificar_uno(titulo)
+        ubicacion = "Desconocida"
+
+        if fase and not coincide_fase(codigo_fase, fase):
+            continue
+
+        yield {
+            "identificador": ensayo_id,
+            "titulo": titulo,
+            "estado": estado_estudio,
+            "fase": FASES[codigo_fase],
+            "ubicacion": ubicacion
+        }
+
+
+async def respuesta_streaming(pagina, formato, fuente, avisos=None):
+    avisos = avisos or {}
+    ensayos = aiter(pagina)
+    # El primer elemento se lee antes de responder para que un fallo del upstream se informe como error
+    try:
+        primero = await anext(ensayos, None)
+    except Exception:
+        await fuente.aclose()
+        raise
+
+    async def pendientes():
+        if primero is not None:
+            yield primero
+            async for ensayo in ensayos:
+                yield ensayo
+
+    async def ndjson():
+        async with aclosing(fuente):
+            try:
+                async for ensayo in pendientes():
+                    yield json.dumps(ensayo) + "\n"
+                final = {"paginacion": pagina.metadatos()} if pagina.limite or pagina.offset else {}
+                final.update(avisos)
+                if final:
+                    yield json.dumps(final) + "\n"
+            except Exception as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+
+    async def json_stream():
+        async with aclosing(fuente):
+            yield '{"ensayos": ['
+            try:
+                primero_emitido = False
+                async for ensayo in pendientes():
+                    yield ("," if primero_emitido else "") + json.dumps(ensayo)
+                    primero_emitido = True
+                # Cierre: el resto del objeto, sin su llave de apertura
+                yield '], ' + json.dumps({"paginacion": pagina.metadatos(), **avisos})[1:]
+            except Exception as e:
+                yield '], "error": ' + json.dumps(str(e)) + '}'
+
+    if formato == "ndjson":
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    return StreamingResponse(json_stream(), media_type="application/json")
+
+
+async def avisos_busqueda(molecula, patologia, estado=None, fase=None, pais=None):
+    # Filtros estructurados: se resuelven en el índice local solo si una sincronización completa y
+    # reciente lo cubre para esta búsqueda; si no, el upstream es la fuente de verdad
+    if not (estado or fase or pais):
+        return {}
+    cobertura = await run_in_threadpool(indice.cobertura, molecula, patologia)
+    if cobertura:
+        return {"cobertura": cobertura}
+    no_aplicados = [nombre for nombre, valor in (("estado", estado), ("pais", pais)) if valor]
+    return {"filtros_no_aplicados": no_aplicados} if no_aplicados else {}
+
+
+def cabeceras_avisos(avisos):
+    # Las exportaciones no tienen un JSON donde informar de los avisos de la búsqueda
+    cabeceras = {}
+    if "filtros_no_aplicados" in avisos:
+        cabeceras["X-Filtros-No-Aplicados"] = ", ".join(avisos["filtros_no_aplicados"])
+    if "cobertura" in avisos:
+        cabeceras["X-Indice-Sincronizado"] = avisos["cobertura"]["sincronizado"]
+    return cabeceras
+
+
+async def fuente_busqueda(molecula, patologia, estado=None, fase=None, pais=None, offset=0, limite=None,
+                          streaming=False, avisos=None):
+    # Devuelve (origen, fuente, página, avisos); `fuente` es el generador que hay que cerrar al terminar.
+    # `avisos` evita repetir avisos_busqueda si quien llama ya los tiene
+    if avisos is None:
+        avisos = await avisos_busqueda(molecula, patologia, estado, fase, pais)
+    if "cobertura" in avisos:
+        fuente = desde_lista(await run_in_threadpool(
+            indice.buscar, molecula=molecula, patologia=patologia, estado=estado, fase=fase, pais=pais,
+            limite=offset + limite + 1 if limite else None
+        ))
+        return "indice", fuente, Pagina(fuente, offset, limite), avisos
+    fuente = items_busqueda(url_busqueda(molecula, patologia), streaming=streaming)
+    return "upstream", fuente, Pagina(ensayos_filtrados(fuente, fase), offset, limite), avisos
+
+
 @app.get("/buscar_ensayos")
-def buscar_ensayos(
+async def buscar_ensayos(
     molecula: Optional[str] = None,
     patologia: Optional[str] = None,
     estado: Optional[str] = None,
     fase: Optional[str] = None,
     pais: Optional[str] = None,
-    formato: Optional[str] = "json"
+    formato: Optional[str] = "json",
+    limite: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
 ):
     if not molecula and not patologia:
         return {"error": "Debe especificar al menos 'molecula' o 'patologia'"}
+    try:
+        if cursor:
+            offset = decodificar_cursor(cursor)
+    except ValueError as e:
+        return {"error": str(e)}
 
-    rss_url = f"https://clinicaltrials.gov/ct2/results/rss.xml?term={molecula}&cond={patologia}"
     try:
-        response = requests.get(rss_url)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-
-        ensayos = []
-        for item in root.findall(".//item"):
-            titulo = item.find("title").text or ""
-            link = item.find("link").text or ""
-            ensayo_id = link.split("/")[-1] if link else "N/A"
-            estado_estudio = "En curso"
-            fase_estudio = "3" if "phase 3" in titulo.lower() else "Desconocida"
-            ubicacion = "Desconocida"
-
-            if estado and estado.lower() not in estado_estudio.lower():
-                continue
-            if fase and fase.lower() != fase_estudio.lower():
-                continue
-            if pais and pais.lower() not in ubicacion.lower():
-                continue
-
-            ensayos.append({
-                "identificador": ensayo_id,
-                "titulo": titulo,
-                "estado": estado_estudio,
-                "fase": fase_estudio,
-                "ubicacion": ubicacion
-            })
+        # Formatos streaming y primera página con 'limite' cortan la descarga al llenar la página;
+        # el resto de páginas usan el feed completo (cacheado y compartido).
+        origen, fuente, pagina, avisos = await fuente_busqueda(
+            molecula, patologia, estado, fase, pais, offset, limite,
+            streaming=formato in FORMATOS_STREAMING or bool(limite and not offset)
+        )
+
+        if formato in FORMATOS_STREAMING:
+            return await respuesta_streaming(pagina, formato, fuente, avisos)
+
+        # En la ruta en streaming incluye la descarga y el parseo que se intercalan con el filtrado
+        with etapa("filtrado"):
+            async with aclosing(fuente):
+                ensayos = [ensayo async for ensayo in pagina]
 
         if formato == "texto":
             resumen = f"Se encontraron {len(ensayos)} ensayos clínicos:\n\n"
             for i, ensayo in enumerate(ensayos[:10], 1):
                 resumen += f"{i}. {ensayo['titulo']} (ID: {ensayo['identificador']})\n"
+            if "filtros_no_aplicados" in avisos:
+                resumen += f"\nFiltros no aplicados (el feed no trae esos datos): {', '.join(avisos['filtros_no_aplicados'])}\n"
             return PlainTextResponse(content=resumen)
 
-        return {"ensayos": ensayos}
+        respuesta = {"ensayos": ensayos, "fuente": origen, **avisos}
+        if limite or offset:
+            respuesta["paginacion"] = pagina.metadatos()
+        return respuesta
 
     except Exception as e:
-        return {"error": str(e)}
+        return respuesta_error(e)
 
 
 # -------------------- DETALLE ENSAYO --------------------
-@app.get("/ensayo_detalle")
-def ensayo_detalle(id: str):
-    url = f"https://clinicaltrials.gov/ct2/show/{id}?displayxml=true"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
+async def obtener_detalle(ensayo_id):
+    registro, origen = await app.state.upstream.obtener(url_estudio(ensayo_id), parsear_estudio, con_origen=True)
+    # Los detalles recién descargados alimentan el índice local; una copia en caché ya se indexó al llegar
+    if origen == "upstream":
+        await run_in_threadpool(indice.guardar_detalle, registro)
+    return registro.a_dict()
 
-        def get_text(path):
-            el = root.find(path)
-            return el.text if el is not None else "No disponible"
 
-        return {
-            "id": id,
-            "titulo": get_text(".//official_title") or get_text(".//brief_title"),
-            "resumen": get_text(".//brief_summary/textblock"),
-            "estado": get_text(".//overall_status"),
-            "fase": get_text(".//phase"),
-            "tipo_estudio": get_text(".//study_type"),
-            "patrocinador": get_text(".//lead_sponsor/agency"),
-            "fecha_inicio": get_text(".//start_date"),
-            "condiciones": [el.text for el in root.findall(".//condition")],
-            "intervenciones": [el.text for el in root.findall(".//intervention/intervention_name")],
-            "ubicaciones": [el.text for el in root.findall(".//location/facility/name")],
-            "criterios": get_text(".//eligibility/criteria/textblock")
-        }
+@app.get("/ensayo_detalle")
+async def ensayo_detalle(id: str):
+    try:
+        return await obtener_detalle(id)
 
     except Exception as e:
-        return {"error": f"No se pudo obtener el detalle del ensayo: {str(e)}"}
+        return respuesta_error(e, f"No se pudo obtener el detalle del ensayo: {str(e)}")
+
+
+# -------------------- DETALLE EN LOTE --------------------
+DETALLE_MAX_IDS = int(os.environ.get("DETALLE_MAX_IDS", 100))
+DETALLE_MAX_PARALELO = int(os.environ.get("DETALLE_MAX_PARALELO", 10))
+
+
+@app.post("/ensayos_detalle")
+async def ensayos_detalle(ids: List[str] = Body(..., embed=True), formato: Optional[str] = "json"):
+    ids = list(dict.fromkeys(i.strip() for i in ids if i.strip()))
+    if not ids:
+        return {"error": "La lista 'ids' está vacía"}
+    if len(ids) > DETALLE_MAX_IDS:
+        return {"error": f"Máximo {DETALLE_MAX_IDS} identificadores por petición"}
+
+    semaforo = asyncio.Semaphore(DETALLE_MAX_PARALELO)
+
+    async def detalle_o_error(ensayo_id):
+        # Las descargas comparten caché y single-flight con /ensayo_detalle
+        async with semaforo:
+            try:
+                return ensayo_id, {"detalle": await obtener_detalle(ensayo_id)}
+            except Exception as e:
+                return ensayo_id, {"error": f"No se pudo obtener el detalle del ensayo: {str(e)}"}
+
+    tareas = [asyncio.ensure_future(detalle_o_error(ensayo_id)) for ensayo_id in ids]
+
+    if formato == "ndjson":
+        async def generar():
+            # Cada ensayo se emite en cuanto llega, sin esperar al más lento
+            try:
+                for siguiente in asyncio.as_completed(tareas):
+                    ensayo_id, resultado = await siguiente
+                    yield json.dumps({"id": ensayo_id, **resultado}) + "\n"
+            finally:
+                for tarea in tareas:
+                    tarea.cancel()
+        return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+    resultados = dict(await asyncio.gather(*tareas))
+    return {
+        "ensayos": {i: r["detalle"] for i, r in resultados.items() if "detalle" in r},
+        "errores": {i: r["error"] for i, r in resultados.items() if "error" in r}
+    }
 
 
 # -------------------- CRITERIOS POR ID --------------------
 @app.get("/criterios_ensayo")
-def criterios_ensayo(id: str):
+async def criterios_ensayo(id: str):
     try:
-        url = f"https://clinicaltrials.gov/ct2/show/{id}?displayxml=true"
-        r = requests.get(url)
-        r.raise_for_status()
-        root = ET.fromstring(r.content)
-        criterios = root.find(".//eligibility/criteria/textblock")
+        # Mismo registro (y misma descarga en curso) que /ensayo_detalle
+        registro = await app.state.upstream.obtener(url_estudio(id), parsear_estudio)
         return {
             "id": id,
-            "criterios_inclusion_exclusion": criterios.text if criterios is not None else "No disponible"
+            "criterios_inclusion_exclusion": registro.criterios,
+            "elegibilidad": registro.elegibilidad.a_dict()
         }
     except Exception as e:
-        return {"error": str(e)}
+        return respuesta_error(e)
+
+
+# -------------------- BÚSQUEDA POR CRITERIOS --------------------
+def lista_parametro(valor):
+    return [t.strip() for t in (valor or "").split(",") if t.strip()]
+
+
+@app.get("/buscar_por_criterios")
+async def buscar_por_criterios(
+    molecula: Optional[str] = None,
+    patologia: Optional[str] = None,
+    edad: Optional[float] = Query(None, ge=0),
+    sexo: Optional[str] = None,
+    incluye: Optional[str] = None,
+    no_excluye: Optional[str] = None,
+    limite: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
+):
+    # Ej.: ensayos de ruxolitinib en vitiligo que no excluyen a mayores de 65 ni a embarazadas:
+    # ?molecula=ruxolitinib&patologia=vitiligo&edad=66&no_excluye=embarazo
+    incluye, no_excluye = lista_parametro(incluye), lista_parametro(no_excluye)
+    if not (molecula or patologia or edad is not None or sexo or incluye or no_excluye):
+        return JSONResponse({"error": "Debe especificar al menos un criterio de búsqueda"}, status_code=400)
+    if sexo and normalizar_sexo(sexo) is None:
+        return JSONResponse({"error": "'sexo' debe ser 'mujeres', 'hombres' o 'todos'"}, status_code=400)
+    try:
+        if cursor:
+            offset = decodificar_cursor(cursor)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    # Criterios parseados al indexar cada ensayo: solo consultas sobre el índice local
+    ensayos = await run_in_threadpool(indice.buscar_por_criterios, molecula, patologia, edad, sexo, incluye,
+                                      no_excluye, limite=offset + limite + 1 if limite else None)
+    pagina = Pagina(ensayos, offset, limite)
+    respuesta = {"ensayos": list(pagina), "fuente": "indice"}
+    if limite or offset:
+        respuesta["paginacion"] = pagina.metadatos()
+    return respuesta
+
+
+# -------------------- AUTOCOMPLETAR --------------------
+@app.get("/autocompletar")
+async def autocompletar(
+    q: str,
+    tipo: Optional[str] = Query(None, pattern="^(molecula|patologia)$"),
+    limite: int = Query(AUTOCOMPLETAR_MAX, ge=1, le=AUTOCOMPLETAR_MAX)
+):
+    # Ej.: ?q=sema -> semaglutide (por "semaglutida"); ?q=cánc&tipo=patologia -> cancer, breast cancer...
+    # Índice de prefijos en memoria construido al arrancar: microsegundos sin E/S, así que se
+    # resuelve en el event loop sin pasar por el pool de hilos
+    return {"q": q, "sugerencias": vocabulario.autocompletar(q, tipo, limite)}
 
 
 # -------------------- COMPARAR MOLÉCULAS --------------------
+COMPARAR_MAX_MOLECULAS = int(os.environ.get("COMPARAR_MAX_MOLECULAS", 20))
+COMPARAR_DEADLINE = float(os.environ.get("COMPARAR_DEADLINE", 10))
+COMPARAR_DEADLINE_MAX = float(os.environ.get("COMPARAR_DEADLINE_MAX", 30))
+COMPARAR_PARALELO = int(os.environ.get("COMPARAR_PARALELO", 5))
+
+
 @app.get("/comparar_moleculas")
-def comparar_moleculas(molecula1: str, molecula2: str, patologia: str):
-    def contar(mol):
+async def comparar_moleculas(
+    patologia: str,
+    moleculas: Optional[str] = None,
+    molecula1: Optional[str] = None,
+    molecula2: Optional[str] = None,
+    timeout: float = Query(COMPARAR_DEADLINE, gt=0)
+):
+    lista = [m.strip() for m in (moleculas or "").split(",") if m.strip()]
+    # Forma antigua (?molecula1=&molecula2=): se mantienen sus claves de primer nivel
+    legado = not lista
+    lista = list(dict.fromkeys(lista + [m for m in (molecula1, molecula2) if m]))
+    if len(lista) < 2:
+        return {"error": "Faltan parámetros obligatorios"}
+    if len(lista) > COMPARAR_MAX_MOLECULAS:
+        return {"error": f"Máximo {COMPARAR_MAX_MOLECULAS} moléculas por comparación"}
+    timeout = min(timeout, COMPARAR_DEADLINE_MAX)
+    # Límite propio de cada petición: la espera por el turno cuenta en su deadline, no en el de otras
+    turnos = asyncio.Semaphore(COMPARAR_PARALELO)
+
+    async def consumir(mol):
+        async with turnos:
+            return await app.state.upstream.consumir(url_busqueda(mol, patologia), ConteoRSS, con_origen=True)
+
+    async def contar(mol):
+        inicio = time.perf_counter()
         try:
-            url = f"https://clinicaltrials.gov/ct2/results/rss.xml?term={mol}&cond={patologia}"
-            r = requests.get(url)
-            r.raise_for_status()
-            return len(ET.fromstring(r.content).findall(".//item"))
-        except:
-            return 0
+            # wait_for cancela la descarga al vencer: no queda trabajo suelto
+            ensayos, origen = await asyncio.wait_for(consumir(mol), timeout)
+            return {"ensayos": ensayos, "latencia_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                    "desde_cache": origen != "upstream", "obsoleto": origen == "obsoleto"}
+        except asyncio.TimeoutError:
+            return {"ensayos": None, "latencia_ms": None, "desde_cache": False,
+                    "error": f"Sin respuesta en {timeout}s"}
+        except Exception as e:
+            return {"ensayos": None, "latencia_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                    "desde_cache": False, "error": str(e)}
+
+    # Todas las moléculas a la vez, COMPARAR_PARALELO como mucho contra el upstream; las que
+    # superan el deadline quedan como parciales
+    resultados = dict(zip(lista, await asyncio.gather(*(contar(mol) for mol in lista))))
 
     return {
-        molecula1: contar(molecula1),
-        molecula2: contar(molecula2),
-        "patologia": patologia
+        **({mol: r["ensayos"] for mol, r in resultados.items()} if legado else {}),
+        "patologia": patologia,
+        "resultados": resultados,
+        "completo": all("error" not in r for r in resultados.values())
     }
 
 
 # -------------------- ENDPOINT ANALYSIS --------------------
+# Claves canónicas del vocabulario: "Cáncer", "neoplasia" o "tumor" -> "cancer"
+ENDPOINTS_COMUNES = {
+    "cancer": ["supervivencia global", "respuesta objetiva"],
+    "diabetes": ["HbA1c", "peso corporal"],
+    "type 1 diabetes": ["HbA1c", "peso corporal"],
+    "type 2 diabetes": ["HbA1c", "peso corporal"],
+    "vitiligo": ["re-pigmentación", "mejora de VASI"]
+}
+SIN_ENDPOINTS = ["No especificados"]
+
+
 @app.get("/analisis_endpoint")
 def analisis_endpoint(patologia: str, fase: Optional[str] = None):
-    comunes = {
-        "cáncer": ["supervivencia global", "respuesta objetiva"],
-        "diabetes": ["HbA1c", "peso corporal"],
-        "vitiligo": ["re-pigmentación", "mejora de VASI"]
-    }
     return {
         "patologia": patologia,
         "fase": fase,
-        "endpoints_comunes": comunes.get(patologia.lower(), ["No especificados"])
+        "endpoints_comunes": ENDPOINTS_COMUNES.get(canonizar_patologia(patologia), SIN_ENDPOINTS)
     }
 
 
 # -------------------- PICO SUGERIDO (+ PDF) --------------------
 @app.get("/pico_sugerido")
-def pico_sugerido(molecula: str, patologia: str, formato: Optional[str] = "json"):
+async def pico_sugerido(molecula: str, patologia: str, formato: Optional[str] = "json", modo: Optional[str] = None):
     pico = {
         "Paciente": f"Pacientes con {patologia}",
         "Intervención": molecula,
@@ -164,114 +603,252 @@ def pico_sugerido(molecula: str, patologia: str, formato: Optional[str] = "json"
     }
 
     if formato == 'pdf':
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(50, height - 50, f"Esquema PICO - {molecula} / {patologia}")
-        c.setFont("Helvetica", 12)
-        y = height - 100
-        for clave, valor in pico.items():
-            c.drawString(50, y, f"{clave}: {valor}")
-            y -= 30
-        c.save()
-        buffer.seek(0)
-        return StreamingResponse(buffer, media_type='application/pdf', headers={
+        parametros = {"molecula": molecula, "patologia": patologia, "pico": pico}
+        if modo == "trabajo":
+            return respuesta_trabajo(generador_pdf.crear_trabajo("pico", parametros))
+        # El render corre en el pool de procesos; el event loop solo espera el futuro
+        pdf = await generador_pdf.arenderizar("pico", parametros)
+        return Response(pdf, media_type='application/pdf', headers={
             "Content-Disposition": f"attachment;filename=pico_{molecula}.pdf"
         })
 
     return pico
 
 
+# -------------------- TRABAJOS PDF --------------------
+def respuesta_trabajo(trabajo_id, avisos=None):
+    return JSONResponse({
+        "id": trabajo_id,
+        "estado_url": f"/trabajos_pdf/{trabajo_id}",
+        "descarga_url": f"/trabajos_pdf/{trabajo_id}/pdf",
+        **(avisos or {})
+    }, status_code=202)
+
+
+@app.get("/trabajos_pdf/{trabajo_id}")
+def estado_trabajo_pdf(trabajo_id: str):
+    estado = generador_pdf.estado_trabajo(trabajo_id)
+    if estado is None:
+        return JSONResponse({"error": "Trabajo no encontrado"}, status_code=404)
+    return estado
+
+
+@app.get("/trabajos_pdf/{trabajo_id}/pdf")
+def descargar_trabajo_pdf(trabajo_id: str):
+    pdf = generador_pdf.resultado_trabajo(trabajo_id)
+    if pdf is None:
+        estado = generador_pdf.estado_trabajo(trabajo_id)
+        if estado is None:
+            return JSONResponse({"error": "Trabajo no encontrado"}, status_code=404)
+        return JSONResponse(estado, status_code=409)
+    return Response(pdf, media_type='application/pdf', headers={
+        "Content-Disposition": f"attachment;filename=informe_{trabajo_id[:12]}.pdf"
+    })
+
+
 # -------------------- TENDENCIAS DE INVESTIGACIÓN --------------------
 @app.get("/tendencias_investigacion")
-def tendencias_investigacion(patologia: str):
-    datos = {
-        "vitiligo": {
-            "moleculas_en_alza": ["ruxolitinib", "tofacitinib", "baricitinib"],
-            "endpoints_frecuentes": ["mejora del VASI", "calidad de vida", "re-pigmentación facial"],
-            "zonas_con_mayor_actividad": ["EEUU", "India", "España"],
-            "nuevos_estudios_por_año": {
-                "2021": 6, "2022": 10, "2023": 14, "2024": 18
-            }
-        },
-        "diabetes": {
-            "moleculas_en_alza": ["semaglutida", "tirzepatida", "dapagliflozina"],
-            "endpoints_frecuentes": ["HbA1c", "peso corporal", "riesgo CV"],
-            "zonas_con_mayor_actividad": ["EEUU", "México", "Brasil"],
-            "nuevos_estudios_por_año": {
-                "2021": 20, "2022": 25, "2023": 30, "2024": 34
-            }
-        }
-    }
-
-    if patologia.lower() not in datos:
-        return {"error": f"No hay datos simulados para {patologia}"}
+async def tendencias_investigacion(patologia: str):
+    # Agregados materializados en el índice local: se actualizan al guardar cada ensayo
+    tendencias = await run_in_threadpool(indice.tendencias, patologia)
+    if tendencias is None:
+        return JSONResponse({"error": f"No hay ensayos indexados para {patologia}"}, status_code=404)
 
-    return {"patologia": patologia, **datos[patologia.lower()]}
+    return {"patologia": patologia, **tendencias, "fuente": "indice"}
 
 
 # -------------------- RESUMEN CLÍNICO DE MOLÉCULA --------------------
 @app.get("/resumen_molecula")
-def resumen_molecula(molecula: str, patologia: str):
+async def resumen_molecula(molecula: str, patologia: str):
     try:
-        url = f"https://clinicaltrials.gov/ct2/results/rss.xml?term={molecula}&cond={patologia}"
-        response = requests.get(url)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-        items = root.findall(".//item")
-
-        cantidad = len(items)
-        fases_detectadas = []
-        for item in items:
-            titulo = item.find("title").text or ""
-            if "phase 1" in titulo.lower(): fases_detectadas.append("Fase 1")
-            if "phase 2" in titulo.lower(): fases_detectadas.append("Fase 2")
-            if "phase 3" in titulo.lower(): fases_detectadas.append("Fase 3")
-
-        fases_unicas = list(set(fases_detectadas))
-        recomendacion = "Revisión favorable" if "Fase 3" in fases_unicas else "Revisión preliminar"
-
-        return {
-            "molécula": molecula,
-            "patología": patologia,
-            "ensayos_encontrados": cantidad,
-            "fases_detectadas": fases_unicas or ["No especificadas"],
-            "centros_participantes_estimados": f"{min(5 + cantidad, 50)} (estimación)",
-            "recomendación": recomendacion,
-            "observaciones": "Resumen automático. Requiere evaluación experta."
-        }
+        url = url_busqueda(molecula, patologia)
+        ids, fases = await app.state.upstream.consumir(url, FasesRSS)
+        estados = await run_in_threadpool(indice.estados, ids)
+        return resumen_clinico(molecula, patologia, fases, estados)
 
     except Exception as e:
-        return {"error": str(e)}
+        return respuesta_error(e)
+
+# -------------------- EXPORTACIONES --------------------
+EXPORT_DETALLE_PARALELO = int(os.environ.get("EXPORT_DETALLE_PARALELO", DETALLE_MAX_PARALELO))
+
+
+async def filas_exportacion(ensayos, detalle=False):
+    # Ventana de descargas de detalle en paralelo; las filas salen en el orden de la búsqueda
+    if not detalle:
+        async for ensayo in ensayos:
+            yield fila_exportacion(ensayo)
+        return
+
+    async def con_detalle(ensayo):
+        try:
+            registro = await app.state.upstream.obtener(url_estudio(ensayo["identificador"]), parsear_estudio)
+        except Exception:
+            registro = None  # un detalle fallido no corta la exportación: la fila sale con los datos de búsqueda
+        return fila_exportacion(ensayo, registro)
+
+    ventana = deque()
+    try:
+        async for ensayo in ensayos:
+            ventana.append(asyncio.ensure_future(con_detalle(ensayo)))
+            if len(ventana) >= EXPORT_DETALLE_PARALELO:
+                yield await ventana.popleft()
+        while ventana:
+            yield await ventana.popleft()
+    finally:
+        for tarea in ventana:
+            tarea.cancel()
+
+
+async def respuesta_exportacion(filas, fuente, escritor, nombre, gzip=False, avisos=None):
+    # Como en respuesta_streaming, la primera fila se lee antes de responder para informar fallos del upstream
+    try:
+        primera = await anext(filas, None)
+    except Exception:
+        await filas.aclose()
+        await fuente.aclose()
+        raise
+
+    async def todas():
+        if primera is not None:
+            yield primera
+            async for fila in filas:
+                yield fila
+
+    async def cuerpo():
+        async with aclosing(fuente), aclosing(filas):
+            async for datos in aexportar(todas(), escritor, gzip):
+                yield datos
+
+    headers = {"Content-Disposition": f"attachment;filename={nombre}.{escritor.extension}",
+               **cabeceras_avisos(avisos or {})}
+    if gzip:
+        headers.update({"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return StreamingResponse(cuerpo(), media_type=escritor.media_type, headers=headers)
+
 
 # -------------------- EXPORTAR ENSAYOS EN PDF --------------------
+async def preparar_pdf_exportacion(molecula, patologia, estado, fase, pais, detalle, limite, avisos):
+    origen, fuente, pagina, avisos = await fuente_busqueda(molecula, patologia, estado, fase, pais, limite=limite,
+                                                           streaming=True, avisos=avisos)
+    volcado = VolcadoFilas()
+    try:
+        async with aclosing(fuente):
+            async for fila in filas_exportacion(pagina, detalle):
+                volcado.agregar(fila)
+        # La clave incluye el hash de las filas: si los datos no han cambiado se reutiliza el PDF
+        parametros = {"molecula": molecula, "patologia": patologia}
+        clave = clave_pdf("exportacion", {**parametros, "filas": volcado.cerrar()})
+        clave, futuro = generador_pdf.enviar("exportacion", {**parametros, "ruta_filas": volcado.ruta}, clave)
+    except BaseException:
+        volcado.eliminar()
+        raise
+    # El volcado se borra al terminar el render, aunque esta petición se cancele antes
+    futuro.add_done_callback(lambda _: volcado.eliminar())
+    return await asyncio.wrap_future(futuro)
+
+
 @app.get("/exportar_ensayos_pdf")
-def exportar_ensayos_pdf(molecula: str, patologia: Optional[str] = None):
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, height - 50, f"Exportación de Ensayos - {molecula}")
-    c.setFont("Helvetica", 12)
-    c.drawString(50, height - 90, f"Patología: {patologia or 'No especificada'}")
-    c.drawString(50, height - 120, "Este es un ejemplo de exportación en PDF.")
-
-    c.save()
-    buffer.seek(0)
-    return StreamingResponse(buffer, media_type='application/pdf', headers={
-        "Content-Disposition": f"attachment;filename=ensayos_{molecula}.pdf"
+async def exportar_ensayos_pdf(
+    molecula: str,
+    patologia: Optional[str] = None,
+    estado: Optional[str] = None,
+    fase: Optional[str] = None,
+    pais: Optional[str] = None,
+    detalle: bool = False,
+    limite: Optional[int] = Query(None, ge=1),
+    modo: Optional[str] = None
+):
+    avisos = await avisos_busqueda(molecula, patologia, estado, fase, pais)
+    exportacion = preparar_pdf_exportacion(molecula, patologia, estado, fase, pais, detalle, limite, avisos)
+    if modo == "trabajo":
+        # La descarga y el render siguen en segundo plano aunque el cliente se desconecte; el registro
+        # de trabajos guarda la referencia a la tarea para que no la recoja el recolector
+        tarea = asyncio.create_task(exportacion)
+        return respuesta_trabajo(generador_pdf.registrar_trabajo(None, tarea), avisos)
+    try:
+        pdf = await exportacion
+    except Exception as e:
+        return respuesta_error(e)
+    return Response(pdf, media_type='application/pdf', headers={
+        "Content-Disposition": f"attachment;filename=ensayos_{molecula}.pdf", **cabeceras_avisos(avisos)
     })
 
-# -------------------- EXPORTAR ENSAYOS EN CSV --------------------
+# -------------------- EXPORTAR ENSAYOS EN CSV / PARQUET --------------------
 @app.get("/exportar_ensayos_csv")
-def exportar_ensayos_csv(molecula: str, patologia: Optional[str] = None):
-    output = io.StringIO()
-    output.write("ID,Título,Estado,Fase\n")
-    for i in range(1, 6):
-        output.write(f"NCT000{i},Ensayo simulado {i},En curso,Fase 3\n")
-    output.seek(0)
-    return StreamingResponse(io.BytesIO(output.getvalue().encode("utf-8")), media_type='text/csv', headers={
-        "Content-Disposition": f"attachment;filename=ensayos_{molecula}.csv"
-    })
+async def exportar_ensayos_csv(
+    molecula: str,
+    patologia: Optional[str] = None,
+    estado: Optional[str] = None,
+    fase: Optional[str] = None,
+    pais: Optional[str] = None,
+    detalle: bool = False,
+    limite: Optional[int] = Query(None, ge=1),
+    formato: Optional[str] = "csv",
+    gzip: bool = False
+):
+    # formato=excel: CSV con BOM y ';' que Excel abre directamente
+    try:
+        origen, fuente, pagina, avisos = await fuente_busqueda(molecula, patologia, estado, fase, pais,
+                                                               limite=limite, streaming=True)
+        return await respuesta_exportacion(filas_exportacion(pagina, detalle), fuente,
+                                           EscritorCSV(excel=formato == "excel"), f"ensayos_{molecula}", gzip,
+                                           avisos)
+    except Exception as e:
+        return respuesta_error(e)
+
+
+@app.get("/exportar_ensayos_parquet")
+async def exportar_ensayos_parquet(
+    molecula: str,
+    patologia: Optional[str] = None,
+    estado: Optional[str] = None,
+    fase: Optional[str] = None,
+    pais: Optional[str] = None,
+    detalle: bool = False,
+    limite: Optional[int] = Query(None, ge=1)
+):
+    try:
+        escritor = EscritorParquet()
+    except ImportError:
+        return JSONResponse({"error": "La exportación Parquet requiere pyarrow"}, status_code=501)
+    try:
+        origen, fuente, pagina, avisos = await fuente_busqueda(molecula, patologia, estado, fase, pais,
+                                                               limite=limite, streaming=True)
+        return await respuesta_exportacion(filas_exportacion(pagina, detalle), fuente, escritor,
+                                           f"ensayos_{molecula}", avisos=avisos)
+    except Exception as e:
+        return respuesta_error(e)
+
+# -------------------- ESTADÍSTICAS DE CACHÉ --------------------
+@app.get("/estadisticas_cache")
+def estadisticas_cache():
+    return {**cache.estadisticas(), "circuito": app.state.upstream.circuito.estadisticas(),
+            "pdf": generador_pdf.estadisticas()}
+
+
+# -------------------- CALENTAMIENTO --------------------
+# Lo activa servidor.py: cada worker calienta en su lifespan, antes de aceptar peticiones
+CALENTAR_AL_ARRANCAR = os.environ.get("CALENTAR_AL_ARRANCAR", "0").lower() not in ("0", "false", "no")
+
+# Rutas que solo usan datos locales (vocabulario, tablas, índice, caché): no llaman al upstream
+RUTAS_CALENTAMIENTO = (
+    "/autocompletar?q=a",
+    "/analisis_endpoint?patologia=cancer",
+    "/buscar_por_criterios?edad=40&no_excluye=embarazo&limite=1",
+    "/estadisticas_cache",
+)
+
+
+async def calentar(app):
+    # Conexiones con el upstream ya abiertas y una pasada en proceso por las rutas locales
+    # (middlewares, validación, JSON, consultas SQLite). No cuentan en las métricas.
+    import httpx
+
+    await app.state.upstream.calentar()
+    if PDF_CALENTAR:
+        await run_in_threadpool(generador_pdf.calentar)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://calentamiento") as c:
+        for ruta in RUTAS_CALENTAMIENTO:
+            await c.get(ruta)
+    reiniciar_metricas()
@@ -0,0 +1,186 @@
+"""Benchmark de arranque en frío de las dos apps.
+
+En procesos nuevos, con índice y cachés propios en un directorio temporal y
+el upstream simulado (benchmarks/mock_upstream.py), mide:
+
+- importacion_ms: importar el módulo de la app (mediana de `--repeticiones`).
+- primera_respuesta_ms: desde lanzar el servidor hasta la primera respuesta
+  200 de una ruta local (lo que tarda un worker nuevo en servir tráfico).
+- primera_busqueda_ms: latencia de la primera búsqueda que va al upstream
+  (caché vacía; el pool de conexiones, abierto o no según el calentamiento).
+- memoria_mb: RSS del servidor y sus hijos tras esa búsqueda (solo Linux).
+
+`--servidor desarrollo` arranca las apps con `python app.py` y uvicorn;
+`--servidor produccion`, con servidor.py (como suite.py). Con `--comparar` se
+contrasta con una ejecución anterior y el proceso sale con código 1 si
+alguna medida empeora más de `--tolerancia`.
+
+    python benchmarks/arranque.py --salida arranque_base.json
+    python benchmarks/arranque.py --servidor produccion --comparar arranque_base.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from suite import APPS, esperar, puerto_libre, rss_arbol, version_codigo  # noqa: E402
+
+MODULOS = {"flask": "app", "fastapi": "app_fastapi_export"}
+RUTA_LOCAL = "/autocompletar?q=a"
+RUTA_BUSQUEDA = "/buscar_ensayos?molecula=ruxolitinib&patologia=vitiligo"
+MEDIDAS = ("importacion_ms", "primera_respuesta_ms", "primera_busqueda_ms", "memoria_mb")
+
+
+# -------------------- MEDIDAS --------------------
+def tiempo_importacion(modulo, entorno):
+    # Proceso nuevo por medida: sin módulos ya cargados ni cachés del sistema de imports en memoria
+    codigo = f"import time; t = time.perf_counter(); import {modulo}; print(time.perf_counter() - t)"
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=entorno, capture_output=True,
+                            text=True, check=True).stdout
+    return float(salida.strip().splitlines()[-1])
+
+
+def comando_servidor(app, servidor, puerto):
+    if servidor == "produccion":
+        return [sys.executable, "servidor.py", app, "--host", "127.0.0.1", "--port", str(puerto),
+                "--workers", "1"], {}
+    if app == "flask":
+        return [sys.executable, "app.py"], {"PORT": str(puerto)}
+    return [sys.executable, "-m", "uvicorn", "app_fastapi_export:app", "--port", str(puerto),
+            "--log-level", "warning"], {}
+
+
+def primera_respuesta(url, timeout=60):
+    # Sondeo cada 5 ms hasta el primer 200 (mientras no escucha, la conexión se rechaza)
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            if httpx.get(url, timeout=timeout).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"No respondió {url}")
+
+
+def medir(app, servidor, entorno, repeticiones, salida):
+    importaciones = [tiempo_importacion(MODULOS[app], entorno) for _ in range(repeticiones)]
+
+    puerto = puerto_libre()
+    comando, extra = comando_servidor(app, servidor, puerto)
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(comando, cwd=RAIZ, env=dict(entorno, **extra), stdout=salida, stderr=salida)
+    try:
+        primera_respuesta(f"http://127.0.0.1:{puerto}{RUTA_LOCAL}")
+        arranque = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        httpx.get(f"http://127.0.0.1:{puerto}{RUTA_BUSQUEDA}", timeout=60).raise_for_status()
+        busqueda = time.perf_counter() - inicio
+        memoria = rss_arbol(proceso.pid)
+    finally:
+        proceso.terminate()
+        proceso.wait()
+    return {
+        "app": app,
+        "servidor": servidor,
+        "importacion_ms": round(statistics.median(importaciones) * 1000, 1),
+        "importacion_min_ms": round(min(importaciones) * 1000, 1),
+        "primera_respuesta_ms": round(arranque * 1000, 1),
+        "primera_busqueda_ms": round(busqueda * 1000, 1),
+        "memoria_mb": round(memoria / 2 ** 20, 1) if memoria else None,
+    }
+
+
+# -------------------- COMPARACIÓN --------------------
+def comparar(actuales, base, tolerancia):
+    # Regresión: cualquier medida más de `tolerancia` (fracción) por encima de la base de la misma app.
+    # Se puede comparar un servidor con otro (p. ej. producción frente a desarrollo).
+    previos = {r["app"]: r for r in base["resultados"]}
+    regresiones = []
+    print(f"\n{'app':<8} {'servidor':<25} {'medida':<21} {'base':>9} {'actual':>9}")
+    for r in actuales:
+        b = previos.get(r["app"])
+        if b is None:
+            continue
+        servidores = r["servidor"] if b["servidor"] == r["servidor"] else f"{b['servidor']} -> {r['servidor']}"
+        for medida in MEDIDAS:
+            if r[medida] is None or b.get(medida) is None:
+                continue
+            peor = r[medida] > b[medida] * (1 + tolerancia)
+            if peor:
+                regresiones.append((r["app"], medida))
+            print(f"{r['app']:<8} {servidores:<25} {medida:<21} {b[medida]:>9} {r[medida]:>9}"
+                  + ("  REGRESIÓN" if peor else ""))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", default=",".join(APPS))
+    parser.add_argument("--servidor", choices=("desarrollo", "produccion"), default="desarrollo")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Importaciones medidas por app")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latencia del upstream simulado (s)")
+    parser.add_argument("--salida", default=os.path.join(RAIZ, "benchmarks", "arranque.json"))
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de los servidores")
+    args = parser.parse_args()
+
+    apps = [a for a in args.apps.split(",") if a in APPS]
+    salida = None if args.verbose else subprocess.DEVNULL
+
+    puerto_mock = puerto_libre()
+    mock = subprocess.Popen([sys.executable, os.path.join(RAIZ, "benchmarks", "mock_upstream.py"),
+                             "--port", str(puerto_mock), "--latencia", str(args.latencia)],
+                            stdout=salida, stderr=salida)
+    resultados = []
+    try:
+        esperar(f"http://127.0.0.1:{puerto_mock}/ct2/show/NCT0")
+        print(f"{'app':<8} {'servidor':<11} {'import ms':>10} {'1ª resp ms':>11} {'1ª búsq ms':>11} {'mem MB':>7}")
+        for app in apps:
+            with tempfile.TemporaryDirectory() as directorio:
+                entorno = dict(os.environ,
+                               CLINICALTRIALS_BASE_URL=f"http://127.0.0.1:{puerto_mock}",
+                               CACHE_BACKEND="memoria",
+                               INDICE_RUTA=os.path.join(directorio, "ensayos.sqlite3"),
+                               PDF_CACHE_RUTA=os.path.join(directorio, "cache_pdf.sqlite3"))
+                r = medir(app, args.servidor, entorno, args.repeticiones, salida)
+                resultados.append(r)
+                print(f"{app:<8} {args.servidor:<11} {r['importacion_ms']:>10} {r['primera_respuesta_ms']:>11} "
+                      f"{r['primera_busqueda_ms']:>11} {r['memoria_mb'] or '-':>7}")
+    finally:
+        mock.terminate()
+
+    informe = {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": version_codigo(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("salida", "comparar", "verbose")},
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} medida(s) empeoran más de un {args.tolerancia:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
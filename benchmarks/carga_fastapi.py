@@ -0,0 +1,81 @@
+"""Prueba de carga de app_fastapi_export contra el upstream simulado.
+
+Arranca benchmarks/mock_upstream.py y la app FastAPI (uvicorn, 1 worker) en
+subprocesos, lanza ráfagas de peticiones concurrentes a /buscar_ensayos y
+muestra el throughput por nivel de concurrencia. Con handlers async el
+throughput crece con la concurrencia (≈ concurrencia / latencia upstream) en
+lugar de estancarse en el tamaño del threadpool de Starlette (~40).
+
+    python benchmarks/carga_fastapi.py --niveles 10,40,200,1000 --latencia 0.5
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def esperar_puerto(url, timeout=15):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"No arrancó {url}")
+
+
+async def peticion(host, puerto, ruta):
+    # Cliente HTTP/1.1 mínimo: evita que el generador de carga sea el cuello de botella
+    reader, writer = await asyncio.open_connection(host, puerto)
+    writer.write(f"GET {ruta} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    datos = await reader.read()
+    writer.close()
+    return datos.split(b" ", 2)[1] == b"200" and b'"error"' not in datos
+
+
+async def rafaga(puerto, concurrencia):
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(
+        peticion("127.0.0.1", puerto, f"/buscar_ensayos?molecula=mol{i}&patologia=vitiligo")
+        for i in range(concurrencia)
+    ))
+    return time.perf_counter() - inicio, resultados.count(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--niveles", default="10,40,200,1000")
+    parser.add_argument("--latencia", type=float, default=0.5)
+    parser.add_argument("--puerto-mock", type=int, default=8999)
+    parser.add_argument("--puerto-app", type=int, default=8000)
+    args = parser.parse_args()
+
+    mock = subprocess.Popen([sys.executable, os.path.join(RAIZ, "benchmarks", "mock_upstream.py"),
+                             "--port", str(args.puerto_mock), "--latencia", str(args.latencia)])
+    entorno = dict(os.environ, CLINICALTRIALS_BASE_URL=f"http://127.0.0.1:{args.puerto_mock}")
+    api = subprocess.Popen([sys.executable, "-m", "uvicorn", "app_fastapi_export:app", "--port", str(args.puerto_app),
+                            "--log-level", "warning", "--backlog", "4096"], cwd=RAIZ, env=entorno)
+    try:
+        base = f"http://127.0.0.1:{args.puerto_app}"
+        esperar_puerto(f"http://127.0.0.1:{args.puerto_mock}/ct2/show/NCT0")
+        esperar_puerto(f"{base}/docs")
+        print(f"latencia upstream: {args.latencia:.2f}s")
+        print(f"{'concurrencia':>12} {'tiempo (s)':>11} {'req/s':>9} {'errores':>8}")
+        for nivel in (int(n) for n in args.niveles.split(",")):
+            total, errores = asyncio.run(rafaga(args.puerto_app, nivel))
+            print(f"{nivel:>12} {total:>11.2f} {nivel / total:>9.1f} {errores:>8}")
+    finally:
+        api.terminate()
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
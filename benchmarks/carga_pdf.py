@@ -0,0 +1,102 @@
+"""PDFs/s bajo carga concurrente: render en hilos frente al pool de procesos.
+
+Simula lo que hace el servidor FastAPI: `concurrencia` peticiones en vuelo
+sobre un event loop, y mide PDFs/s, latencia por PDF y el retraso máximo
+del event loop (un ticker cada 10 ms), que es lo que notan las demás
+peticiones mientras se renderiza.
+
+  - hilos:       render en el threadpool, como hacían los endpoints `def`
+  - pool:        informes.GeneradorPDF con entradas siempre distintas
+  - pool_cache:  GeneradorPDF con entradas repetidas (--distintos combinaciones)
+
+    python benchmarks/carga_pdf.py --peticiones 200 --concurrencia 20 --filas 300
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from informes import BackendMemoria, CachePDF, GeneradorPDF, renderizar  # noqa: E402
+
+MODOS = ("hilos", "pool", "pool_cache")
+
+
+def parametros(i, filas):
+    ensayos = [{"identificador": f"NCT{j:08d}", "titulo": f"Ensayo sintético {j} de la molécula {i}",
+                "estado": "Recruiting", "fase": "3"} for j in range(filas)]
+    return {"molecula": f"molecula{i}", "patologia": "vitiligo", "ensayos": ensayos}
+
+
+async def ticker(retrasos, parar):
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.01)
+        retrasos.append(time.perf_counter() - inicio - 0.01)
+
+
+async def ejecutar(modo, peticiones, concurrencia, filas, distintos, procesos):
+    hilos = ThreadPoolExecutor(concurrencia)
+    generador = GeneradorPDF(procesos, cache=CachePDF(BackendMemoria(peticiones)))
+    generador.renderizar("pico", {"molecula": "calentamiento", "patologia": "x", "pico": {}})
+    generador.renderizados = 0
+    entradas = [parametros(i % distintos if modo == "pool_cache" else i, filas) for i in range(peticiones)]
+    loop = asyncio.get_running_loop()
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias, retrasos, parar = [], [], asyncio.Event()
+
+    async def peticion(p):
+        async with semaforo:
+            inicio = time.perf_counter()
+            if modo == "hilos":
+                pdf = await loop.run_in_executor(hilos, renderizar, "exportacion", p)
+            else:
+                pdf = await generador.arenderizar("exportacion", p)
+            latencias.append(time.perf_counter() - inicio)
+            return len(pdf)
+
+    tarea_ticker = asyncio.ensure_future(ticker(retrasos, parar))
+    inicio = time.perf_counter()
+    tamanos = await asyncio.gather(*(peticion(p) for p in entradas))
+    total = time.perf_counter() - inicio
+    parar.set()
+    await tarea_ticker
+    generador.cerrar()
+    hilos.shutdown()
+
+    latencias.sort()
+    return {
+        "modo": modo,
+        "pdfs_s": round(peticiones / total, 1),
+        "kb_pdf": round(statistics.mean(tamanos) / 1024, 1),
+        "p50_ms": round(latencias[len(latencias) // 2] * 1000, 1),
+        "p95_ms": round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 1),
+        "loop_max_ms": round(max(retrasos, default=0) * 1000, 1),
+        "renderizados": generador.renderizados if modo != "hilos" else peticiones,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    parser.add_argument("--filas", type=int, default=300, help="Filas por PDF (≈45 por página)")
+    parser.add_argument("--distintos", type=int, default=10, help="Entradas distintas en pool_cache")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--modos", default=",".join(MODOS))
+    args = parser.parse_args()
+
+    print(f"{'modo':<11} {'PDFs/s':>7} {'KB/PDF':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} {'loop máx (ms)':>14} {'renders':>8}")
+    for modo in args.modos.split(","):
+        r = asyncio.run(ejecutar(modo, args.peticiones, args.concurrencia, args.filas, args.distintos, args.procesos))
+        print(f"{r['modo']:<11} {r['pdfs_s']:>7} {r['kb_pdf']:>7} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+              f"{r['loop_max_ms']:>14} {r['renderizados']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Clasificación de fases: coste por título del bucle anterior y de clasificacion.py.
+
+Compara el resumen anterior de /resumen_molecula (tres `lower()` y tres
+búsquedas de subcadena por título, acumulando un set) con
+clasificacion.clasificador_fases + distribucion. El clasificador reconoce
+1/2, 2/3, subfases y romanos y devuelve conteos por fase; es un cambio de
+corrección y este benchmark mide lo que cuesta, no una mejora de velocidad.
+
+    python benchmarks/clasificacion_fases.py --titulos 1000,100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from clasificacion import ETIQUETAS_FASE, clasificador_fases, distribucion  # noqa: E402
+
+PLANTILLAS = [
+    "A Phase 3, Randomized, Double-blind Study of {m} in Adults With {c}",
+    "Phase 2/Phase 3 Trial of {m} Versus Placebo in {c}",
+    "Open-label Extension Study of {m} for {c}",
+    "Phase I Dose-escalation Study of {m} in Patients With Advanced {c}",
+    "Early Phase 1 Pilot Study of Topical {m} in {c}",
+    "Observational Registry of Patients With {c} Treated With {m}",
+]
+
+
+def anterior(titulos):
+    fases = set()
+    for titulo in titulos:
+        if "phase 1" in titulo.lower(): fases.add("Fase 1")
+        if "phase 2" in titulo.lower(): fases.add("Fase 2")
+        if "phase 3" in titulo.lower(): fases.add("Fase 3")
+    return fases
+
+
+def clasificador(titulos):
+    return distribucion(clasificador_fases.clasificar(titulos), ETIQUETAS_FASE)
+
+
+def medir(fn, titulos, repeticiones=5):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn(titulos)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titulos", default="1000,100000")
+    args = parser.parse_args()
+
+    aleatorio = random.Random(0)
+    print(f"{'títulos':>8} {'anterior (µs/título)':>21} {'clasificador (µs/título)':>25}")
+    for n in (int(x) for x in args.titulos.split(",")):
+        titulos = [aleatorio.choice(PLANTILLAS).format(m=f"molecule{i}", c="vitiligo") for i in range(n)]
+        t_anterior = medir(anterior, titulos) / n * 1e6
+        t_clasificador = medir(clasificador, titulos) / n * 1e6
+        print(f"{n:>8} {t_anterior:>21.3f} {t_clasificador:>25.3f}")
+    print(clasificador(titulos)["conteos"])
+
+
+if __name__ == "__main__":
+    main()
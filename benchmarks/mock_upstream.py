@@ -0,0 +1,110 @@
+"""Servidor local que imita ClinicalTrials.gov para pruebas de carga.
+
+Sirve feeds RSS sintéticos (/ct2/results/rss.xml) y estudios displayxml
+(/ct2/show/{id}) con tamaño y latencia configurables. Las respuestas llevan
+ETag y Last-Modified y contestan 304 a los GET condicionales
+(`--sin-validadores` simula un upstream que no los envía).
+
+    python benchmarks/mock_upstream.py --port 8999 --latencia 0.5 --items 50 --ubicaciones 20
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+LATENCIA = float(os.environ.get("MOCK_LATENCIA", 0.2))
+ITEMS = int(os.environ.get("MOCK_ITEMS", 50))
+UBICACIONES = int(os.environ.get("MOCK_UBICACIONES", 1))
+VALIDADORES = os.environ.get("MOCK_VALIDADORES", "1") != "0"
+MODIFICADO = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+FASES = ["Phase 1", "Phase 2", "Phase 3", "Phase 4"]
+PAISES = ["Spain", "France", "United States", "Germany", "Brazil"]
+
+
+def generar_rss(n_items, term="", cond=""):
+    partes = ['<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>',
+              f"<title>ClinicalTrials.gov: {term} {cond}</title>"]
+    for i in range(n_items):
+        nct = f"NCT{i:08d}"
+        partes.append(
+            f"<item><title>{FASES[i % 4]} Study of {term or 'Drug'} in {cond or 'Condition'} #{i}</title>"
+            f"<link>https://clinicaltrials.gov/ct2/show/{nct}</link>"
+            f"<description>Synthetic trial {i}</description><guid>{nct}</guid></item>"
+        )
+    partes.append("</channel></rss>")
+    return "".join(partes).encode("utf-8")
+
+
+def generar_estudio(nct, ubicaciones=UBICACIONES):
+    sedes = "".join(
+        f"<location><facility><name>Hospital Sintético {i}</name><address><city>Ciudad {i}</city>"
+        f"<country>{PAISES[i % len(PAISES)]}</country></address></facility><status>Recruiting</status></location>"
+        for i in range(ubicaciones)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><clinical_study>'
+        f"<required_header><download_date>ClinicalTrials.gov processed this data</download_date>"
+        f"<url>https://clinicaltrials.gov/show/{nct}</url></required_header>"
+        f"<id_info><org_study_id>ORG-{nct}</org_study_id><nct_id>{nct}</nct_id></id_info>"
+        f"<brief_title>Study {nct}</brief_title><official_title>Official title of {nct}</official_title>"
+        "<sponsors><lead_sponsor><agency>Synthetic Pharma</agency><agency_class>Industry</agency_class></lead_sponsor></sponsors>"
+        "<brief_summary><textblock>Synthetic summary.</textblock></brief_summary>"
+        "<overall_status>Recruiting</overall_status><start_date>January 2023</start_date>"
+        "<phase>Phase 3</phase><study_type>Interventional</study_type>"
+        "<study_design_info><allocation>Randomized</allocation><masking>Double</masking></study_design_info>"
+        "<primary_outcome><measure>Change in F-VASI</measure><time_frame>Week 24</time_frame></primary_outcome>"
+        "<condition>Vitiligo</condition>"
+        "<intervention><intervention_type>Drug</intervention_type><intervention_name>Ruxolitinib</intervention_name></intervention>"
+        "<eligibility><criteria><textblock>Inclusion Criteria: - Age 18 to 65 years "
+        "Exclusion Criteria: - Pregnancy</textblock></criteria><gender>All</gender>"
+        "<minimum_age>18 Years</minimum_age><maximum_age>65 Years</maximum_age></eligibility>"
+        f"{sedes}"
+        "<keyword>vitiligo</keyword><keyword>JAK inhibitor</keyword>"
+        "<condition_browse><mesh_term>Vitiligo</mesh_term><mesh_term>Hypopigmentation</mesh_term></condition_browse>"
+        "</clinical_study>"
+    ).encode("utf-8")
+
+
+def respuesta_xml(cuerpo, request):
+    if not VALIDADORES:
+        return Response(cuerpo, media_type="application/xml")
+    # Los documentos son deterministas: el ETag es el hash del cuerpo
+    cabeceras = {"ETag": '"' + hashlib.md5(cuerpo).hexdigest() + '"', "Last-Modified": MODIFICADO}
+    if request.headers.get("if-none-match") == cabeceras["ETag"]:
+        return Response(status_code=304, headers=cabeceras)
+    return Response(cuerpo, media_type="application/xml", headers=cabeceras)
+
+
+app = FastAPI()
+
+
+@app.get("/ct2/results/rss.xml")
+async def rss(request: Request, term: str = "", cond: str = "", items: int = None, count: int = None):
+    await asyncio.sleep(LATENCIA)
+    n_items = next((n for n in (items, count) if n is not None), ITEMS)
+    return respuesta_xml(generar_rss(n_items, term, cond), request)
+
+
+@app.get("/ct2/show/{nct}")
+async def estudio(request: Request, nct: str):
+    await asyncio.sleep(LATENCIA)
+    return respuesta_xml(generar_estudio(nct, UBICACIONES), request)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--latencia", type=float, default=LATENCIA)
+    parser.add_argument("--items", type=int, default=ITEMS, help="Ítems por feed RSS")
+    parser.add_argument("--ubicaciones", type=int, default=UBICACIONES, help="Centros por estudio (tamaño del XML)")
+    parser.add_argument("--sin-validadores", action="store_true", help="Sin ETag/Last-Modified ni respuestas 304")
+    args = parser.parse_args()
+    LATENCIA, ITEMS, UBICACIONES = args.latencia, args.items, args.ubicaciones
+    VALIDADORES = VALIDADORES and not args.sin_validadores
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096)
@@ -0,0 +1,93 @@
+"""Compara la extracción anterior de estudios (dict con ~12 búsquedas ".//")
+frente a parseo.parsear_estudio (un solo recorrido hacia un RegistroEnsayo).
+
+Mide el tiempo de parseo + extracción por registro y la memoria que ocupa
+cada registro mientras se mantiene vivo (como en el índice o en la caché),
+con y sin internado de cadenas repetidas.
+
+    python benchmarks/parseo_estudio.py --registros 5000 --ubicaciones 1,20
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from mock_upstream import generar_estudio  # noqa: E402
+from parseo import extraer_registro  # noqa: E402
+
+
+def extraer_anterior(root, ensayo_id):
+    # Copia de la extracción previa de /ensayo_detalle, como referencia
+    def get_text(path):
+        el = root.find(path)
+        return el.text if el is not None else "No disponible"
+
+    return {
+        "id": ensayo_id,
+        "titulo": get_text(".//official_title") or get_text(".//brief_title"),
+        "resumen": get_text(".//brief_summary/textblock"),
+        "estado": get_text(".//overall_status"),
+        "fase": get_text(".//phase"),
+        "tipo_estudio": get_text(".//study_type"),
+        "patrocinador": get_text(".//lead_sponsor/agency"),
+        "fecha_inicio": get_text(".//start_date"),
+        "condiciones": [el.text for el in root.findall(".//condition")],
+        "intervenciones": [el.text for el in root.findall(".//intervention/intervention_name")],
+        "ubicaciones": [el.text for el in root.findall(".//location/facility/name")],
+        "paises": sorted({el.text for el in root.findall(".//location/facility/address/country") if el.text}),
+        "criterios": get_text(".//eligibility/criteria/textblock")
+    }
+
+
+MODOS = {
+    "anterior": lambda contenido, nct: extraer_anterior(ET.fromstring(contenido), nct),
+    "registro": lambda contenido, nct: extraer_registro(ET.fromstring(contenido), internar=False),
+    "registro_internado": lambda contenido, nct: extraer_registro(ET.fromstring(contenido), internar=True),
+}
+
+
+def medir(modo, documentos):
+    extraer = MODOS[modo]
+    # Tiempo: parseo + extracción, sin conservar los resultados
+    inicio = time.perf_counter()
+    for nct, contenido in documentos:
+        extraer(contenido, nct)
+    por_registro_us = (time.perf_counter() - inicio) / len(documentos) * 1e6
+
+    # Memoria: registros vivos al terminar (el árbol XML ya se ha liberado)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    registros = [extraer(contenido, nct) for nct, contenido in documentos]
+    gc.collect()
+    vivos = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del registros
+    return por_registro_us, vivos / len(documentos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registros", type=int, default=5000)
+    parser.add_argument("--ubicaciones", default="1,20", help="Sedes por estudio, separadas por comas")
+    args = parser.parse_args()
+
+    print(f"{'modo':<20} {'sedes':>6} {'KB doc':>7} {'µs/registro':>12} {'bytes/registro':>15}")
+    for ubicaciones in (int(u) for u in args.ubicaciones.split(",")):
+        documentos = [(f"NCT{i:08d}", generar_estudio(f"NCT{i:08d}", ubicaciones)) for i in range(args.registros)]
+        kb_doc = len(documentos[0][1]) / 1024
+        for modo in MODOS:
+            medir(modo, documentos[:200])  # calentamiento
+            por_registro_us, bytes_registro = medir(modo, documentos)
+            print(f"{modo:<20} {ubicaciones:>6} {kb_doc:>7.1f} {por_registro_us:>12.1f} {bytes_registro:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Compara ET.fromstring + findall frente al parser incremental de parseo.py.
+
+Para feeds RSS sintéticos de distinto tamaño simula la llegada del cuerpo en
+trozos de 64 KB (con un retardo opcional por trozo) y mide tiempo hasta el
+primer resultado, tiempo total y memoria pico. Los modos `cliente_*` pasan
+además por ClienteUpstream.iterar, sin caché y con la caché en memoria
+activada, que retiene el cuerpo hasta UPSTREAM_MAX_CUERPO_CACHE bytes. Cada
+caso corre en un subproceso propio para que el pico de RSS no se contamine
+entre casos.
+
+    python benchmarks/parseo_rss.py --items 1000,10000,50000 --retardo-chunk 0.001
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from mock_upstream import generar_rss  # noqa: E402
+from cache import BackendMemoria, CacheRespuestas  # noqa: E402
+from parseo import iterar_items  # noqa: E402
+from upstream import MAX_CUERPO_CACHE, ClienteUpstream, trocear  # noqa: E402
+
+MODOS = ("arbol", "streaming", "streaming_limite", "cliente_sin_cache", "cliente_cache")
+URL = "http://mock.local/ct2/results/rss.xml?term=drug&cond=condition"
+
+
+def llegada(contenido, retardo):
+    for chunk in trocear(contenido):
+        if retardo:
+            time.sleep(retardo)
+        yield chunk
+
+
+def cliente_goteo(contenido, retardo, cache):
+    # ClienteUpstream sobre un adaptador que entrega `contenido` como llegada(): sin red ni servidor
+    import requests
+    from requests.adapters import BaseAdapter
+
+    class Cuerpo:
+        def stream(self, tamano, decode_content=True):
+            return llegada(contenido, retardo)
+
+        def close(self):
+            pass
+
+    class Goteo(BaseAdapter):
+        def send(self, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = Cuerpo()
+            response.url = request.url
+            response.request = request
+            return response
+
+        def close(self):
+            pass
+
+    return ClienteUpstream(transporte=Goteo(), cache=cache)
+
+
+def medir(modo, contenido, retardo, limite):
+    if modo.startswith("cliente"):
+        # Cliente nuevo en cada medida: la segunda pasada no debe salir de la caché de la primera
+        cache = CacheRespuestas(BackendMemoria()) if modo == "cliente_cache" else None
+        cliente = cliente_goteo(contenido, retardo, cache)
+    inicio = time.perf_counter()
+    primero = None
+    procesados = 0
+    if modo == "arbol":
+        root = ET.fromstring(b"".join(llegada(contenido, retardo)))
+        for item in root.findall(".//item"):
+            titulo = item.find("title").text or ""
+            primero = primero or time.perf_counter()
+            procesados += 1
+    elif modo.startswith("cliente"):
+        for item in iterar_items(cliente.iterar(URL)):
+            primero = primero or time.perf_counter()
+            procesados += 1
+    else:
+        for item in iterar_items(llegada(contenido, retardo)):
+            primero = primero or time.perf_counter()
+            procesados += 1
+            if modo == "streaming_limite" and procesados >= limite:
+                break
+    return procesados, primero - inicio, time.perf_counter() - inicio
+
+
+def ejecutar(modo, n_items, retardo, limite):
+    contenido = generar_rss(n_items, "drug", "condition")
+    rss_base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    procesados, primero, total = medir(modo, contenido, retardo, limite)
+    rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Segunda pasada con tracemalloc solo para la memoria (ralentiza los tiempos)
+    tracemalloc.start()
+    medir(modo, contenido, 0, limite)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "modo": modo,
+        "items": n_items,
+        "procesados": procesados,
+        "bytes_feed": len(contenido),
+        "primer_resultado_ms": round(primero * 1000, 2),
+        "total_ms": round(total * 1000, 2),
+        "pico_python_mb": round(pico / 2 ** 20, 2),
+        "pico_rss_extra_mb": round((rss_pico - rss_base) / 1024, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", default="1000,10000,50000")
+    parser.add_argument("--retardo-chunk", type=float, default=0.001)
+    parser.add_argument("--limite", type=int, default=20)
+    parser.add_argument("--caso", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso:
+        modo, n_items = args.caso.split(":")
+        print(json.dumps(ejecutar(modo, int(n_items), args.retardo_chunk, args.limite)))
+        return
+
+    print(f"Caché en los modos cliente_*: cuerpos de hasta {MAX_CUERPO_CACHE / 2 ** 20:.0f} MB")
+    print(f"{'modo':<17} {'items':>7} {'MB feed':>8} {'1er res (ms)':>13} {'total (ms)':>11} "
+          f"{'pico py (MB)':>13} {'pico RSS (MB)':>14}")
+    for n_items in (int(n) for n in args.items.split(",")):
+        for modo in MODOS:
+            salida = subprocess.run(
+                [sys.executable, __file__, "--caso", f"{modo}:{n_items}",
+                 "--retardo-chunk", str(args.retardo_chunk), "--limite", str(args.limite)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            r = json.loads(salida)
+            print(f"{r['modo']:<17} {r['items']:>7} {r['bytes_feed'] / 2 ** 20:>8.1f} {r['primer_resultado_ms']:>13} "
+                  f"{r['total_ms']:>11} {r['pico_python_mb']:>13} {r['pico_rss_extra_mb']:>14}")
+
+
+if __name__ == "__main__":
+    main()
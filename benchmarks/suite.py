@@ -0,0 +1,323 @@
+"""Suite de benchmarks reproducible de las dos apps contra el upstream simulado.
+
+Arranca benchmarks/mock_upstream.py y cada app (con servidor.py y un solo
+worker) en subprocesos con índice y cachés propios en un directorio
+temporal. Para cada escenario lanza `--peticiones` peticiones con
+`--concurrencia` en vuelo y mide throughput, latencia p50/p95/p99, errores,
+bytes por respuesta y el pico de memoria residente del servidor (proceso y
+sus hijos, p. ej. el pool de PDFs; muestreado de /proc, solo Linux).
+
+Los escenarios con `{i}` en la ruta usan parámetros distintos en cada
+petición (caché fría); el resto repite la misma consulta (caché caliente).
+Los resultados se escriben en JSON; con `--comparar` se contrastan con una
+ejecución anterior y el proceso sale con código 1 si algún escenario tiene
+más errores o empeora más de `--tolerancia` en p95 o throughput.
+
+    python benchmarks/suite.py --salida base.json
+    python benchmarks/suite.py --salida nuevo.json --comparar base.json
+    python benchmarks/suite.py --apps fastapi --escenarios buscar_ensayos,exportar_ensayos_csv
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = ("flask", "fastapi")
+
+# (nombre, método, ruta, cuerpo, apps). En la ruta y el cuerpo, {i} es el número de petición.
+ESCENARIOS = [
+    ("buscar_ensayos", "GET", "/buscar_ensayos?molecula=mol{i}&patologia=vitiligo", None, APPS),
+    ("buscar_ensayos_cache", "GET", "/buscar_ensayos?molecula=ruxolitinib&patologia=vitiligo", None, APPS),
+    # Sinónimos de la consulta anterior: se canonizan a la misma URL y salen de la caché
+    ("buscar_ensayos_sinonimo", "GET", "/buscar_ensayos?molecula=Jakavi&patologia=Vit%C3%ADligo", None, APPS),
+    ("buscar_ensayos_pagina", "GET", "/buscar_ensayos?molecula=mol{i}&patologia=vitiligo&limite=10", None, APPS),
+    ("buscar_ensayos_ndjson", "GET", "/buscar_ensayos?molecula=mol{i}&patologia=vitiligo&formato=ndjson", None, APPS),
+    ("ensayo_detalle", "GET", "/ensayo_detalle?id=NCT{i:08d}", None, APPS),
+    ("ensayos_detalle", "POST", "/ensayos_detalle",
+     '{{"ids": ["NCT1{i:07d}", "NCT2{i:07d}", "NCT3{i:07d}", "NCT4{i:07d}", "NCT5{i:07d}"]}}', APPS),
+    ("criterios_ensayo", "GET", "/criterios_ensayo?id=NCT{i:08d}", None, APPS),
+    ("comparar_moleculas", "GET", "/comparar_moleculas?moleculas=a{i},b{i},c{i}&patologia=vitiligo", None, APPS),
+    ("analisis_endpoint", "GET", "/analisis_endpoint?patologia=vitiligo", None, APPS),
+    ("autocompletar", "GET", "/autocompletar?q=ru", None, APPS),
+    ("pico_sugerido", "GET", "/pico_sugerido?molecula=mol{i}&patologia=vitiligo", None, APPS),
+    ("pico_sugerido_pdf", "GET", "/pico_sugerido?molecula=mol{i}&patologia=vitiligo&formato=pdf", None, APPS),
+    # Tras ensayo_detalle el índice local ya tiene ensayos de vitiligo
+    ("tendencias_investigacion", "GET", "/tendencias_investigacion?patologia=vitiligo", None, APPS),
+    ("buscar_por_criterios", "GET", "/buscar_por_criterios?patologia=vitiligo&edad=66&no_excluye=embarazo", None,
+     APPS),
+    ("resumen_molecula", "GET", "/resumen_molecula?molecula=mol{i}&patologia=vitiligo", None, APPS),
+    ("exportar_ensayos_csv", "GET", "/exportar_ensayos_csv?molecula=mol{i}&patologia=vitiligo&limite=20", None,
+     ("fastapi",)),
+    ("exportar_ensayos_pdf", "GET", "/exportar_ensayos_pdf?molecula=mol{i}&patologia=vitiligo&limite=20", None,
+     ("fastapi",)),
+    ("estadisticas_cache", "GET", "/estadisticas_cache", None, APPS),
+    ("metrics", "GET", "/metrics", None, APPS),
+]
+
+
+# -------------------- PROCESOS --------------------
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar(url, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"No arrancó {url}")
+
+
+def arrancar_app(nombre, puerto, entorno, salida):
+    # Como en producción: con `python app.py` cada worker de PDF (forkserver) cargaría la app entera
+    comando = [sys.executable, "servidor.py", nombre, "--host", "127.0.0.1", "--port", str(puerto),
+               "--workers", "1"]
+    proceso = subprocess.Popen(comando, cwd=RAIZ, env=entorno, stdout=salida, stderr=salida)
+    esperar(f"http://127.0.0.1:{puerto}/estadisticas_cache")
+    return proceso
+
+
+def rss_arbol(pid):
+    # Memoria residente (bytes) del proceso y sus descendientes; None fuera de Linux
+    try:
+        padres = {}
+        for entrada in os.listdir("/proc"):
+            if entrada.isdigit():
+                try:
+                    with open(f"/proc/{entrada}/stat") as f:
+                        padres[int(entrada)] = int(f.read().rsplit(")", 1)[1].split()[1])
+                except OSError:
+                    pass
+        arbol, pendientes = set(), [pid]
+        while pendientes:
+            actual = pendientes.pop()
+            arbol.add(actual)
+            pendientes.extend(p for p, padre in padres.items() if padre == actual and p not in arbol)
+        total = 0
+        for p in arbol:
+            try:
+                with open(f"/proc/{p}/status") as f:
+                    total += next(int(l.split()[1]) for l in f if l.startswith("VmRSS:")) * 1024
+            except (OSError, StopIteration):
+                pass
+        return total
+    except OSError:
+        return None
+
+
+class MonitorMemoria:
+    """Muestrea el RSS del servidor en un hilo mientras dura el escenario."""
+
+    def __init__(self, pid, intervalo=0.05):
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico = None
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _muestrear(self):
+        while not self._parar.is_set():
+            rss = rss_arbol(self.pid)
+            if rss is not None:
+                self.pico = max(self.pico or 0, rss)
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *_):
+        self._parar.set()
+        self._hilo.join()
+
+
+# -------------------- GENERADOR DE CARGA --------------------
+async def peticion(puerto, metodo, ruta, cuerpo):
+    # Cliente HTTP/1.1 mínimo (como en carga_fastapi.py): el generador no debe ser el cuello de botella
+    inicio = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+    datos = cuerpo.encode() if cuerpo else b""
+    cabeceras = f"{metodo} {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+    if cuerpo:
+        cabeceras += f"Content-Type: application/json\r\nContent-Length: {len(datos)}\r\n"
+    writer.write(cabeceras.encode() + b"\r\n" + datos)
+    await writer.drain()
+    respuesta = await reader.read()
+    writer.close()
+    latencia = time.perf_counter() - inicio
+    cabecera, _, contenido = respuesta.partition(b"\r\n\r\n")
+    estado = int(cabecera.split(b" ", 2)[1]) if cabecera else 0
+    # Varios endpoints informan los fallos como {"error": ...} con 200
+    ok = 200 <= estado < 400 and not contenido.lstrip().startswith(b'{"error"')
+    return latencia, ok, len(contenido)
+
+
+async def ejecutar(puerto, metodo, ruta, cuerpo, peticiones, concurrencia, desplazamiento):
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una(i):
+        async with semaforo:
+            n = desplazamiento + i
+            try:
+                return await peticion(puerto, metodo, ruta.format(i=n), cuerpo.format(i=n) if cuerpo else None)
+            except OSError:
+                return None, False, 0
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(una(i) for i in range(peticiones)))
+    return time.perf_counter() - inicio, resultados
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, max(0, round(p / 100 * len(valores)) - 1))]
+
+
+def escenario(app, proceso, puerto, nombre, metodo, ruta, cuerpo, args, desplazamiento):
+    asyncio.run(ejecutar(puerto, metodo, ruta, cuerpo, args.calentamiento, args.concurrencia, 10 ** 6))
+    with MonitorMemoria(proceso.pid) as memoria:
+        duracion, resultados = asyncio.run(ejecutar(puerto, metodo, ruta, cuerpo, args.peticiones,
+                                                    args.concurrencia, desplazamiento))
+    latencias = sorted(r[0] for r in resultados if r[0] is not None)
+    return {
+        "app": app,
+        "escenario": nombre,
+        "peticiones": args.peticiones,
+        "concurrencia": args.concurrencia,
+        "errores": sum(1 for r in resultados if not r[1]),
+        "duracion_s": round(duracion, 3),
+        "rps": round(args.peticiones / duracion, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2) if latencias else None,
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2) if latencias else None,
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2) if latencias else None,
+        "max_ms": round(latencias[-1] * 1000, 2) if latencias else None,
+        "bytes_medios": round(statistics.mean(r[2] for r in resultados)) if resultados else 0,
+        "memoria_pico_mb": round(memoria.pico / 2 ** 20, 1) if memoria.pico else None,
+    }
+
+
+# -------------------- COMPARACIÓN --------------------
+CARGA = ("peticiones", "concurrencia", "latencia", "items", "ubicaciones")
+
+
+def comparar(actuales, parametros, base, tolerancia):
+    # Regresión: más errores, o p95 peor o throughput menor que la base en más de `tolerancia` (fracción)
+    distintos = [k for k in CARGA if base.get("parametros", {}).get(k) != parametros[k]]
+    if distintos:
+        print(f"\nAviso: la base se midió con otra carga ({', '.join(distintos)}); la comparación no es fiable")
+    previos = {(r["app"], r["escenario"]): r for r in base["resultados"]}
+    regresiones = []
+    print(f"\n{'app':<8} {'escenario':<26} {'p95 base':>9} {'p95':>9} {'rps base':>9} {'rps':>9}")
+    for r in actuales:
+        b = previos.get((r["app"], r["escenario"]))
+        if b is None or r["p95_ms"] is None or b["p95_ms"] is None:
+            continue
+        peor = (r["errores"] > b["errores"] or r["p95_ms"] > b["p95_ms"] * (1 + tolerancia)
+                or r["rps"] < b["rps"] * (1 - tolerancia))
+        if peor:
+            regresiones.append(r)
+        print(f"{r['app']:<8} {r['escenario']:<26} {b['p95_ms']:>9} {r['p95_ms']:>9} {b['rps']:>9} {r['rps']:>9}"
+              + ("  REGRESIÓN" if peor else ""))
+    return regresiones
+
+
+def version_codigo():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", default=",".join(APPS))
+    parser.add_argument("--escenarios", help="Lista separada por comas; por defecto, todos")
+    parser.add_argument("--peticiones", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    parser.add_argument("--calentamiento", type=int, default=5, help="Peticiones previas no medidas")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latencia del upstream simulado (s)")
+    parser.add_argument("--items", type=int, default=50, help="Ítems por feed RSS")
+    parser.add_argument("--ubicaciones", type=int, default=5, help="Centros por estudio")
+    parser.add_argument("--salida", default=os.path.join(RAIZ, "benchmarks", "resultados.json"))
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de los servidores")
+    args = parser.parse_args()
+
+    apps = [a for a in args.apps.split(",") if a in APPS]
+    filtro = set(args.escenarios.split(",")) if args.escenarios else None
+    salida = None if args.verbose else subprocess.DEVNULL
+
+    puerto_mock = puerto_libre()
+    mock = subprocess.Popen([sys.executable, os.path.join(RAIZ, "benchmarks", "mock_upstream.py"),
+                             "--port", str(puerto_mock), "--latencia", str(args.latencia),
+                             "--items", str(args.items), "--ubicaciones", str(args.ubicaciones)],
+                            stdout=salida, stderr=salida)
+    resultados = []
+    try:
+        esperar(f"http://127.0.0.1:{puerto_mock}/ct2/show/NCT0")
+        print(f"{'app':<8} {'escenario':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'errores':>8} {'mem MB':>7}")
+        for app in apps:
+            with tempfile.TemporaryDirectory() as directorio:
+                entorno = dict(os.environ,
+                               CLINICALTRIALS_BASE_URL=f"http://127.0.0.1:{puerto_mock}",
+                               CACHE_BACKEND="memoria",
+                               INDICE_RUTA=os.path.join(directorio, "ensayos.sqlite3"))
+                puerto = puerto_libre()
+                proceso = arrancar_app(app, puerto, entorno, salida)
+                try:
+                    for n, (nombre, metodo, ruta, cuerpo, apps_escenario) in enumerate(ESCENARIOS):
+                        if app not in apps_escenario or (filtro and nombre not in filtro):
+                            continue
+                        # Desplazamiento por escenario: las consultas "frías" no reutilizan las de otro
+                        r = escenario(app, proceso, puerto, nombre, metodo, ruta, cuerpo, args, n * 10 ** 5)
+                        resultados.append(r)
+                        print(f"{app:<8} {nombre:<26} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+                              f"{r['p99_ms']:>8} {r['errores']:>8} {r['memoria_pico_mb'] or '-':>7}")
+                finally:
+                    proceso.terminate()
+                    proceso.wait()
+    finally:
+        mock.terminate()
+
+    informe = {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": version_codigo(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("salida", "comparar", "verbose")},
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regresiones = comparar(resultados, informe["parametros"], json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} escenario(s) empeoran más de un {args.tolerancia:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Latencia de IndiceEnsayos.tendencias sobre un índice grande.
+
+Llena un índice SQLite temporal con ensayos sintéticos repartidos entre
+varias condiciones (con los agregados actualizándose al guardar), y mide
+el ritmo de ingesta y la latencia de consulta de tendencias por condición.
+
+    python benchmarks/tendencias.py --ensayos 200000 --condiciones 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from indice import IndiceEnsayos  # noqa: E402
+from parseo import RegistroEnsayo  # noqa: E402
+
+PAISES = ["Spain", "France", "United States", "Germany", "Brazil", "India", "China", "Japan", "Mexico", "Italy"]
+FASES = ["Phase 1", "Phase 2", "Phase 3", "Phase 4", "Phase 2/Phase 3"]
+
+
+def registros(n, condiciones, aleatorio):
+    for i in range(n):
+        yield RegistroEnsayo(
+            id=f"NCT{i:08d}",
+            titulo=f"Synthetic trial {i}",
+            estado="Recruiting",
+            fase=aleatorio.choice(FASES),
+            fecha_inicio=f"January {aleatorio.randint(2010, 2025)}",
+            condiciones=[f"condition {aleatorio.randrange(condiciones)}"],
+            intervenciones=[f"molecule {aleatorio.randrange(300)}" for _ in range(aleatorio.randint(1, 3))],
+            paises=aleatorio.sample(PAISES, aleatorio.randint(1, 3)),
+            endpoints=[f"endpoint {aleatorio.randrange(50)}"],
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ensayos", type=int, default=200000)
+    parser.add_argument("--condiciones", type=int, default=200)
+    parser.add_argument("--lote", type=int, default=1000)
+    parser.add_argument("--consultas", type=int, default=500)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(0)
+    with tempfile.TemporaryDirectory() as directorio:
+        indice = IndiceEnsayos(os.path.join(directorio, "indice.sqlite3"))
+        inicio = time.perf_counter()
+        lote = []
+        for registro in registros(args.ensayos, args.condiciones, aleatorio):
+            lote.append(registro)
+            if len(lote) >= args.lote:
+                indice.guardar(lote)
+                lote = []
+        indice.guardar(lote)
+        ingesta = time.perf_counter() - inicio
+        print(f"Ingesta: {args.ensayos} ensayos en {ingesta:.1f}s ({args.ensayos / ingesta:.0f} ensayos/s, "
+              "agregados incluidos)")
+
+        latencias = []
+        for _ in range(args.consultas):
+            condicion = f"condition {aleatorio.randrange(args.condiciones)}"
+            inicio = time.perf_counter()
+            indice.tendencias(condicion)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        latencias.sort()
+        print(f"tendencias(): p50 {statistics.median(latencias):.2f} ms, "
+              f"p99 {latencias[int(len(latencias) * 0.99) - 1]:.2f} ms, máx {latencias[-1]:.2f} ms "
+              f"(~{args.ensayos // args.condiciones} ensayos por condición)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# -------------------- CONFIGURACIÓN --------------------
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memoria")  # memoria | sqlite
+CACHE_RUTA = os.environ.get("CACHE_RUTA", "cache_upstream.sqlite3")
+CACHE_MAX_ENTRADAS = int(os.environ.get("CACHE_MAX_ENTRADAS", 2048))
+CACHE_TTL_BUSQUEDA = float(os.environ.get("CACHE_TTL_BUSQUEDA", 300))
+CACHE_TTL_ESTUDIO = float(os.environ.get("CACHE_TTL_ESTUDIO", 3600))
+# Antigüedad máxima de una copia caducada que aún se sirve si el upstream falla
+CACHE_MAX_OBSOLESCENCIA = float(os.environ.get("CACHE_MAX_OBSOLESCENCIA", 7 * 24 * 3600))
+
+
+def normalizar_url(url):
+    # Misma consulta => misma clave: host en minúsculas, parámetros ordenados y espacios colapsados
+    partes = urlsplit(url.strip())
+    query = sorted((k, " ".join(v.split())) for k, v in parse_qsl(partes.query, keep_blank_values=True))
+    return urlunsplit((partes.scheme.lower(), partes.netloc.lower(), partes.path, urlencode(query), ""))
+
+
+def validadores(cabeceras):
+    # (ETag, Last-Modified) de una respuesta upstream para revalidarla después; None si no trae ninguno
+    etag, modificado = cabeceras.get("ETag"), cabeceras.get("Last-Modified")
+    return (etag, modificado) if etag or modificado else None
+
+
+# -------------------- BACKENDS --------------------
+# Las entradas son (valor, guardado, validadores).
+class BackendMemoria:
+    """LRU en proceso; adecuado para un único worker."""
+
+    nombre = "memoria"
+
+    def __init__(self, max_entradas=CACHE_MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                self._datos.move_to_end(clave)
+            return entrada
+
+    def set(self, clave, valor, guardado, validadores=None):
+        with self._lock:
+            self._datos[clave] = (valor, guardado, validadores)
+            self._datos.move_to_end(clave)
+            desalojadas = 0
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                desalojadas += 1
+            return desalojadas
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class BackendSQLite:
+    """LRU en un fichero SQLite compartido entre los workers de gunicorn/uvicorn."""
+
+    nombre = "sqlite"
+
+    def __init__(self, ruta=CACHE_RUTA, max_entradas=CACHE_MAX_ENTRADAS):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self._local = threading.local()
+        with self._conexion() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas ("
+                "clave TEXT PRIMARY KEY, valor BLOB NOT NULL, guardado REAL NOT NULL, acceso REAL NOT NULL, "
+                "etag TEXT, modificado TEXT)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS respuestas_acceso ON respuestas (acceso)")
+
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            # Una conexión no se comparte entre procesos: tras un fork (gunicorn --preload) el hijo abre la suya
+            con = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    def get(self, clave):
+        con = self._conexion()
+        fila = con.execute("SELECT valor, guardado, etag, modificado FROM respuestas WHERE clave = ?",
+                           (clave,)).fetchone()
+        if fila is None:
+            return None
+        con.execute("UPDATE respuestas SET acceso = ? WHERE clave = ?", (time.time(), clave))
+        return bytes(fila[0]), fila[1], (fila[2], fila[3]) if fila[2] or fila[3] else None
+
+    def set(self, clave, valor, guardado, validadores=None):
+        etag, modificado = validadores or (None, None)
+        con = self._conexion()
+        with con:
+            con.execute("BEGIN IMMEDIATE")
+            con.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, valor, guardado, acceso, etag, modificado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (clave, valor, guardado, time.time(), etag, modificado),
+            )
+            sobrantes = con.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0] - self.max_entradas
+            if sobrantes > 0:
+                con.execute(
+                    "DELETE FROM respuestas WHERE clave IN "
+                    "(SELECT clave FROM respuestas ORDER BY acceso LIMIT ?)", (sobrantes,)
+                )
+        return max(sobrantes, 0)
+
+    def __len__(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+
+
+# -------------------- CACHÉ DE RESPUESTAS --------------------
+class CacheRespuestas:
+    """Caché de cuerpos upstream con TTL distinto para feeds RSS y estudios.
+
+    La frescura se evalúa al leer, así que un cambio de TTL aplica a las
+    entradas ya guardadas. Las entradas caducadas siguen en el backend hasta
+    que el LRU las desaloja: `obtener_obsoleto` las recupera como respaldo
+    cuando el upstream no responde. Si el upstream envió ETag o Last-Modified
+    se guardan con el cuerpo: `condiciones` da las cabeceras de un GET
+    condicional y, ante un 304, `revalidar` renueva la entrada sin volver a
+    descargarla. Los contadores son por proceso.
+    """
+
+    def __init__(self, backend, ttl_busqueda=CACHE_TTL_BUSQUEDA, ttl_estudio=CACHE_TTL_ESTUDIO,
+                 max_obsolescencia=CACHE_MAX_OBSOLESCENCIA):
+        self.backend = backend
+        self.ttl_busqueda = ttl_busqueda
+        self.ttl_estudio = ttl_estudio
+        self.max_obsolescencia = max_obsolescencia
+        self.hits = self.misses = self.evictions = self.obsoletos = self.revalidadas = 0
+
+    def ttl_para(self, url):
+        return self.ttl_busqueda if "/rss.xml" in url else self.ttl_estudio
+
+    def obtener(self, url):
+        entrada = self.backend.get(normalizar_url(url))
+        if entrada is not None and time.time() - entrada[1] < self.ttl_para(url):
+            self.hits += 1
+            return entrada[0]
+        self.misses += 1
+        return None
+
+    def obtener_obsoleto(self, url):
+        # (contenido, antigüedad en segundos) aunque haya caducado, o None
+        entrada = self.backend.get(normalizar_url(url))
+        if entrada is None:
+            return None
+        antiguedad = time.time() - entrada[1]
+        if antiguedad > self.max_obsolescencia:
+            return None
+        self.obsoletos += 1
+        return entrada[0], antiguedad
+
+    def condiciones(self, url):
+        # Cabeceras If-None-Match / If-Modified-Since de la copia guardada (caducada), o {}
+        entrada = self.backend.get(normalizar_url(url))
+        if entrada is None or entrada[2] is None:
+            return {}
+        etag, modificado = entrada[2]
+        cabeceras = {}
+        if etag:
+            cabeceras["If-None-Match"] = etag
+        if modificado:
+            cabeceras["If-Modified-Since"] = modificado
+        return cabeceras
+
+    def revalidar(self, url, validadores=None):
+        # 304 del upstream: la copia vuelve a ser fresca. None si se desalojó entretanto
+        clave = normalizar_url(url)
+        entrada = self.backend.get(clave)
+        if entrada is None:
+            return None
+        self.evictions += self.backend.set(clave, entrada[0], time.time(), validadores or entrada[2])
+        self.revalidadas += 1
+        return entrada[0]
+
+    def guardar(self, url, contenido, validadores=None):
+        self.evictions += self.backend.set(normalizar_url(url), contenido, time.time(), validadores)
+
+    def estadisticas(self):
+        consultas = self.hits + self.misses
+        return {
+            "backend": self.backend.nombre,
+            "entradas": len(self.backend),
+            "max_entradas": self.backend.max_entradas,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / consultas, 4) if consultas else None,
+            "obsoletos_servidos": self.obsoletos,
+            "revalidadas": self.revalidadas,
+            "ttl_busqueda": self.ttl_busqueda,
+            "ttl_estudio": self.ttl_estudio,
+        }
+
+
+def crear_cache():
+    if CACHE_BACKEND == "sqlite":
+        backend = BackendSQLite()
+    else:
+        backend = BackendMemoria()
+    return CacheRespuestas(backend)
+
+
+cache = crear_cache()
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+
+# -------------------- CONFIGURACIÓN --------------------
+CIRCUITO_UMBRAL_FALLOS = int(os.environ.get("CIRCUITO_UMBRAL_FALLOS", 5))
+CIRCUITO_ESPERA = float(os.environ.get("CIRCUITO_ESPERA", 30))
+CIRCUITO_SONDAS = int(os.environ.get("CIRCUITO_SONDAS", 1))
+
+CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+
+
+class CircuitoAbierto(Exception):
+    """El upstream se considera caído: la llamada se rechaza sin intentarla."""
+
+    def __init__(self, reintentar_en):
+        super().__init__(f"Upstream no disponible; se reintentará en {reintentar_en:.0f}s")
+        self.reintentar_en = reintentar_en
+
+
+# -------------------- CIRCUIT BREAKER --------------------
+class Circuito:
+    """Circuit breaker por fallos consecutivos.
+
+    Tras `umbral` fallos seguidos se abre y rechaza las llamadas durante
+    `espera` segundos. Después pasa a semiabierto y deja pasar hasta `sondas`
+    llamadas a la vez: la primera que sale bien lo cierra y la primera que
+    falla lo vuelve a abrir. Es seguro entre hilos y, al no esperar nunca con
+    el lock tomado, también desde un event loop.
+    """
+
+    def __init__(self, umbral=CIRCUITO_UMBRAL_FALLOS, espera=CIRCUITO_ESPERA, sondas=CIRCUITO_SONDAS):
+        self.umbral = umbral
+        self.espera = espera
+        self.sondas = sondas
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallos = 0
+        self._abierto_en = 0.0
+        self._sondas_en_curso = 0
+        self.aperturas = self.rechazadas = 0
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._actualizar()
+
+    def _actualizar(self):
+        if self._estado == ABIERTO and time.monotonic() - self._abierto_en >= self.espera:
+            self._estado = SEMIABIERTO
+            self._sondas_en_curso = 0
+        return self._estado
+
+    def _abrir(self):
+        self._estado = ABIERTO
+        self._abierto_en = time.monotonic()
+        self.aperturas += 1
+
+    def entrar(self):
+        # Devuelve si la llamada es una sonda de semiabierto; lanza CircuitoAbierto si no puede pasar
+        with self._lock:
+            estado = self._actualizar()
+            if estado == CERRADO:
+                return False
+            if estado == SEMIABIERTO and self._sondas_en_curso < self.sondas:
+                self._sondas_en_curso += 1
+                return True
+            self.rechazadas += 1
+            restante = self.espera - (time.monotonic() - self._abierto_en) if estado == ABIERTO else 0
+            raise CircuitoAbierto(max(restante, 1))
+
+    def registrar(self, exito, sonda=False):
+        # exito=None (p. ej. llamada cancelada) solo libera la plaza de sonda
+        with self._lock:
+            if sonda:
+                self._sondas_en_curso = max(self._sondas_en_curso - 1, 0)
+            if exito is None:
+                return
+            estado = self._actualizar()
+            if exito:
+                # Un éxito de una llamada iniciada antes de abrir no cierra el circuito
+                if estado == CERRADO or sonda:
+                    self._estado = CERRADO
+                    self._fallos = 0
+            elif estado == SEMIABIERTO:
+                self._abrir()
+            elif estado == CERRADO:
+                self._fallos += 1
+                if self._fallos >= self.umbral:
+                    self._abrir()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "estado": self._actualizar(),
+                "fallos_consecutivos": self._fallos,
+                "umbral": self.umbral,
+                "espera": self.espera,
+                "aperturas": self.aperturas,
+                "rechazadas": self.rechazadas,
+            }
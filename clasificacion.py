@@ -0,0 +1,132 @@
+import re
+from array import array
+from collections import Counter
+
+# -------------------- CATEGORÍAS --------------------
+# El código 0 es siempre "sin clasificar"; los códigos se guardan en array('b')
+FASES = ("Desconocida", "1", "1/2", "2", "2/3", "3", "4")
+ETIQUETAS_FASE = ("Desconocida", "Fase 1", "Fase 1/2", "Fase 2", "Fase 2/3", "Fase 3", "Fase 4")
+ESTADOS = ("Desconocido", "Reclutando", "Activo", "No iniciado", "Completado", "Interrumpido", "Retirado")
+
+_NUMERO = r"(?:[1-4]|iv|i{1,3})"
+_ROMANOS = {"i": "1", "ii": "2", "iii": "3", "iv": "4"}
+
+# Una sola alternancia precompilada por dimensión, aplicada sobre el texto en
+# minúsculas; los saltos de línea cuentan como un separador más.
+# Las subfases ("phase 1b", "phase iia") cuentan como su fase.
+PATRON_FASE = re.compile(
+    rf"phase\s*(?P<a>{_NUMERO})[ab]?(?:\s*[/-]\s*(?:phase\s*)?(?P<b>{_NUMERO})[ab]?)?\b"
+)
+# Las alternativas más largas van primero: "not yet recruiting" y "active, not recruiting" contienen "recruiting"
+PATRON_ESTADO = re.compile(
+    r"(?P<no_iniciado>not\s+yet\s+recruiting)|(?P<activo>active,\s*not\s+recruiting)"
+    r"|(?P<reclutando>recruiting|enrolling\s+by\s+invitation)|(?P<completado>completed)"
+    r"|(?P<interrumpido>terminated|suspended)|(?P<retirado>withdrawn)"
+)
+_CODIGOS_ESTADO = {"reclutando": 1, "activo": 2, "no_iniciado": 3, "completado": 4, "interrumpido": 5, "retirado": 6}
+
+
+def _codigo_fase(m):
+    a = _ROMANOS.get(m.group("a"), m.group("a"))
+    b = m.group("b")
+    b = _ROMANOS.get(b, b) if b else None
+    fase = f"{a}/{b}" if b and b != a else a
+    return FASES.index(fase) if fase in FASES else FASES.index(max(a, b or a))
+
+
+def _codigo_estado(m):
+    return _CODIGOS_ESTADO[m.lastgroup]
+
+
+# -------------------- CLASIFICADOR --------------------
+class Clasificador:
+    """Asigna a cada texto el código de la primera coincidencia del patrón.
+
+    El código de cada coincidencia distinta ("phase 3", "phase ii"...) se
+    calcula una vez y se memoriza: por texto queda un `lower()`, un `search`
+    y una consulta al diccionario.
+    """
+
+    def __init__(self, patron, codigo):
+        self.patron = patron
+        self._codigo = codigo
+        self._codigos = _Codigos(self)
+
+    def clasificar(self, textos):
+        buscar, codigos = self.patron.search, self._codigos
+        return array("b", [codigos[m.group()] if (m := buscar(t.lower() if t else "")) else 0 for t in textos])
+
+    def clasificar_uno(self, texto):
+        m = self.patron.search((texto or "").lower())
+        return self._codigos[m.group()] if m else 0
+
+
+class _Codigos(dict):
+    # texto coincidente -> código; "" (sin coincidencia) -> 0
+    def __init__(self, clasificador):
+        super().__init__({"": 0})
+        self._clasificador = clasificador
+
+    def __missing__(self, texto):
+        codigo = self[texto] = self._clasificador._codigo(self._clasificador.patron.match(texto))
+        return codigo
+
+
+clasificador_fases = Clasificador(PATRON_FASE, _codigo_fase)
+clasificador_estados = Clasificador(PATRON_ESTADO, _codigo_estado)
+
+
+# -------------------- AGREGACIÓN --------------------
+def distribucion(codigos, etiquetas):
+    """Conteo por categoría (en el orden de `etiquetas`) y proporciones."""
+    conteo = Counter(codigos)
+    total = len(codigos)
+    conteos = {etiqueta: conteo.get(codigo, 0) for codigo, etiqueta in enumerate(etiquetas)}
+    return {
+        "conteos": conteos,
+        "proporciones": {e: round(n / total, 4) if total else 0.0 for e, n in conteos.items()},
+    }
+
+
+# Nombres de grupo que el filtro de estado acepta además de las etiquetas
+GRUPOS_ESTADO = {"en curso": ("Reclutando", "Activo", "No iniciado")}
+
+
+def coincide_estado(codigo, filtro):
+    # Por subcadena de la etiqueta ("reclut" -> "Reclutando") o por grupo ("en curso")
+    filtro = filtro.strip().lower()
+    etiqueta = ESTADOS[codigo]
+    return filtro in etiqueta.lower() or etiqueta in GRUPOS_ESTADO.get(filtro, ())
+
+
+def coincide_fase(codigo, filtro):
+    # "3" coincide con "3" y con "2/3", igual que el filtro de fase del índice local
+    filtro = filtro.strip().lower()
+    fase = FASES[codigo].lower()
+    return filtro == fase or filtro in fase.split("/")
+
+
+# -------------------- RESUMEN DE MOLÉCULA --------------------
+def resumen_clinico(molecula, patologia, fases, estados=()):
+    # `fases`: códigos de todos los ensayos del feed; `estados`: textos de estado de los que tienen detalle indexado
+    cantidad = len(fases)
+    por_fase = distribucion(fases, ETIQUETAS_FASE)
+    conteos = por_fase["conteos"]
+    detectadas = [etiqueta for etiqueta, n in conteos.items() if n and etiqueta != "Desconocida"]
+    recomendacion = "Revisión favorable" if conteos["Fase 3"] or conteos["Fase 2/3"] else "Revisión preliminar"
+
+    resumen = {
+        "molécula": molecula,
+        "patología": patologia,
+        "ensayos_encontrados": cantidad,
+        "fases_detectadas": detectadas or ["No especificadas"],
+        "ensayos_por_fase": conteos,
+        "distribucion_fases": por_fase["proporciones"],
+        "centros_participantes_estimados": f"{min(5 + cantidad, 50)} (estimación)",
+        "recomendación": recomendacion,
+        "observaciones": "Resumen automático. Requiere evaluación experta."
+    }
+    if estados:
+        resumen["ensayos_por_estado"] = distribucion(clasificador_estados.clasificar(estados), ESTADOS)["conteos"]
+        resumen["estados_con_detalle"] = len(estados)
+    return resumen
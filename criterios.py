@@ -0,0 +1,221 @@
+import re
+from dataclasses import dataclass, field
+
+# -------------------- VOCABULARIO --------------------
+# Conceptos de cribado: nombre -> frases en minúsculas, palabras separadas por un
+# espacio; "*" al final admite cualquier terminación ("pregnan*": pregnant,
+# pregnancy). Se buscan como subcadenas en el texto normalizado a palabras (ver
+# `_normalizar`), que es mucho más rápido que una alternancia de regex.
+TERMINOS = {
+    "embarazo": ("pregnan*", "breast feeding", "breastfeeding", "lactat*", "nursing mother*"),
+    "anticoncepcion": ("contracepti*", "birth control"),
+    "vih": ("hiv", "human immunodeficiency virus"),
+    "hepatitis_b": ("hepatitis b", "hbv", "hbsag"),
+    "hepatitis_c": ("hepatitis c", "hcv"),
+    "tuberculosis": ("tuberculosis", "tb"),
+    "cancer": ("malignan*", "cancer*", "carcinoma*", "neoplas*"),
+    "insuficiencia_renal": ("renal impairment", "renal insufficiency", "renal failure", "renal disease",
+                            "creatinine clearance", "egfr", "dialysis"),
+    "insuficiencia_hepatica": ("hepatic impairment", "hepatic insufficiency", "hepatic failure", "liver disease",
+                               "liver failure", "cirrhosis"),
+    "cardiopatia": ("heart failure", "myocardial infarction", "cardiac", "arrhythmi*", "qt", "qtc"),
+    "infeccion_activa": ("active infection*", "serious infection*", "systemic infection*", "chronic infection*",
+                         "recurrent infection*"),
+    "inmunosupresion": ("immunosuppress*", "immunodeficien*", "immunocompromised"),
+    "diabetes": ("diabet*",),
+    "trasplante": ("transplant*",),
+    "hipersensibilidad": ("hypersensitivit*", "allerg*"),
+    "cirugia": ("surgery", "surgical"),
+    "vacunas": ("vaccin*",),
+    "alcohol_drogas": ("alcohol*", "substance abuse", "drug abuse"),
+    "psiquiatrico": ("psychiatric", "depression", "suicid*"),
+    "corticoides": ("corticosteroid*", "steroid*"),
+    "biologicos": ("biologic*", "monoclonal antibod*"),
+    "inhibidores_jak": ("jak", "janus kinase", "ruxolitinib", "tofacitinib", "baricitinib", "upadacitinib"),
+    "fototerapia": ("phototherapy", "nb uvb", "nbuvb", "uvb", "puva"),
+    "otro_ensayo": ("investigational drug*", "investigational product*", "investigational agent*",
+                    "investigational medication*", "another clinical trial*", "another trial*", "another study",
+                    "other clinical trial*", "other trial*", "other study"),
+    "consentimiento": ("informed consent",),
+}
+# " pregnan" / " hiv ": los espacios marcan el límite de palabra
+_AGUJAS = {nombre: tuple(" " + f[:-1] if f.endswith("*") else " " + f + " " for f in frases)
+           for nombre, frases in TERMINOS.items()}
+_PARES = [(aguja, nombre) for nombre, agujas in _AGUJAS.items() for aguja in agujas]
+_PALABRA = re.compile(r"[^\W_]+")
+
+SEXOS = {"all": "todos", "both": "todos", "todos": "todos", "female": "mujeres", "females": "mujeres",
+         "women": "mujeres", "mujer": "mujeres", "mujeres": "mujeres", "f": "mujeres", "male": "hombres",
+         "males": "hombres", "men": "hombres", "hombre": "hombres", "hombres": "hombres", "m": "hombres"}
+
+# -------------------- PATRONES --------------------
+# Se busca sobre el texto en minúsculas: sin IGNORECASE, `re` salta a las "i"/"e" candidatas
+_CABECERA = re.compile(r"(inclusion|exclusion)\s+criteria\b\s*:?")
+# Viñetas "-", "•", "*" precedidas de espacio (el patrón empieza por el carácter
+# para que `re` salte directamente a los candidatos) y listas numeradas "1." / "1)"
+# al principio de línea. Un guion tras un número no es viñeta: "18 - 65 years".
+_VINETA = re.compile(r"[-•·*](?<!\S[-•·*])(?<!\d\s[-•·*])\s+")
+_NUMERACION = re.compile(r"^[ \t]*\d{1,2}[.)]\s+", re.MULTILINE)
+
+# Las edades del texto solo cuentan con contexto de edad ("age", "aged", "of age",
+# "old") para no confundirlas con duraciones ("at least 2 years of disease").
+_ANTES = r"\bage[ds]?\b(?:\s+(?:of|is|was|at))?\s*"
+_ANIOS = r"\s*(?:years?|yrs?)"
+_DESPUES = rf"{_ANIOS}(?:\s+of\s+age|\s+old)"
+_MAYOR = r"(?:≥|>=|=>|>|at least|over|above|older than|greater than|more than)"
+_MENOR = r"(?:≤|<=|=<|<|under|below|younger than|less than|up to)"
+PATRON_RANGO = re.compile(
+    rf"{_ANTES}(?:between\s*)?(\d{{1,3}}){_ANIOS}?\s*(?:-|–|to|and)\s*(\d{{1,3}})"
+    rf"|(\d{{1,3}})\s*(?:-|–|to|and)\s*(\d{{1,3}}){_DESPUES}"
+)
+PATRON_DESDE = re.compile(
+    rf"{_ANTES}{_MAYOR}\s*(\d{{1,3}})|{_MAYOR}\s*(\d{{1,3}}){_DESPUES}"
+    rf"|(\d{{1,3}}){_ANIOS}(?:\s+of\s+age|\s+old)?\s*(?:or|and)\s+(?:older|over|above)"
+)
+PATRON_HASTA = re.compile(
+    rf"{_ANTES}{_MENOR}\s*(\d{{1,3}})|{_MENOR}\s*(\d{{1,3}}){_DESPUES}"
+    rf"|(\d{{1,3}}){_ANIOS}(?:\s+of\s+age|\s+old)?\s*(?:or|and)\s+(?:younger|under|below)"
+)
+# "18 Years", "6 Months", "N/A" de <minimum_age>/<maximum_age>
+_EDAD_XML = re.compile(r"(\d+(?:\.\d+)?)\s*(year|month|week|day|hour|minute)", re.IGNORECASE)
+_POR_ANIO = {"year": 1, "month": 12, "week": 52, "day": 365, "hour": 365 * 24, "minute": 365 * 24 * 60}
+
+
+# -------------------- ELEGIBILIDAD --------------------
+@dataclass(slots=True)
+class Elegibilidad:
+    """Criterios de elegibilidad estructurados; edades en años (None = sin límite)."""
+
+    inclusion: list = field(default_factory=list)
+    exclusion: list = field(default_factory=list)
+    edad_minima: float = None
+    edad_maxima: float = None
+    sexo: str = None  # "todos" | "mujeres" | "hombres"; None si el estudio no lo indica
+    terminos_inclusion: list = field(default_factory=list)
+    terminos_exclusion: list = field(default_factory=list)
+
+    def a_dict(self):
+        return {
+            "inclusion": self.inclusion,
+            "exclusion": self.exclusion,
+            "edad_minima": self.edad_minima,
+            "edad_maxima": self.edad_maxima,
+            "sexo": self.sexo,
+            "terminos": {"inclusion": self.terminos_inclusion, "exclusion": self.terminos_exclusion},
+        }
+
+
+def edad_en_anios(texto):
+    m = _EDAD_XML.search(texto or "")
+    if not m:
+        return None
+    return round(float(m.group(1)) / _POR_ANIO[m.group(2).lower()], 2)
+
+
+def normalizar_sexo(texto):
+    return SEXOS.get((texto or "").strip().lower())
+
+
+def _normalizar(texto):
+    # Minúsculas y solo palabras separadas por un espacio, con espacios en los extremos
+    return " " + " ".join(_PALABRA.findall(texto.lower())) + " "
+
+
+def concepto(termino):
+    # Nombre del concepto del vocabulario ("embarazo" o "pregnancy" -> "embarazo"); None si no lo es
+    clave = "_".join(_PALABRA.findall((termino or "").lower()))
+    if clave in TERMINOS:
+        return clave
+    texto = _normalizar(termino or "")
+    for nombre, agujas in _AGUJAS.items():
+        for aguja in agujas:
+            # El término entero debe ser la frase (o la raíz más una terminación sin espacios)
+            if texto == aguja or (not aguja.endswith(" ") and texto.startswith(aguja)
+                                  and " " not in texto[len(aguja):-1]):
+                return nombre
+    return None
+
+
+def _items(texto):
+    trozos = (t for parte in _NUMERACION.split(texto) for t in _VINETA.split(parte))
+    items = (" ".join(t.split()) for t in trozos)
+    return [item for item in items if len(item) > 1]
+
+
+def dividir_criterios(texto):
+    # (inclusión, exclusión); sin cabeceras, todo el texto cuenta como inclusión
+    texto = texto or ""
+    minusculas = texto.lower()
+    if len(minusculas) != len(texto):
+        # lower() cambió longitudes (algunos caracteres Unicode): las posiciones no servirían
+        minusculas = texto = minusculas
+    cabeceras = list(_CABECERA.finditer(minusculas))
+    if not cabeceras:
+        return _items(texto), []
+    inclusion, exclusion = [], []
+    for cabecera, siguiente in zip(cabeceras, cabeceras[1:] + [None]):
+        seccion = texto[cabecera.end():siguiente.start() if siguiente else len(texto)]
+        (exclusion if cabecera.group(1) == "exclusion" else inclusion).extend(_items(seccion))
+    return inclusion, exclusion
+
+
+def _terminos(items):
+    # Una sola pasada de normalización por sección; cada frase es una búsqueda de subcadena
+    if not items:
+        return []
+    texto = _normalizar("\n".join(items))
+    return sorted({nombre for aguja, nombre in _PARES if aguja in texto})
+
+
+def _primer_numero(m):
+    return float(next(g for g in m.groups() if g is not None))
+
+
+def _edades_texto(inclusion, exclusion):
+    minima = maxima = None
+    # Todos los patrones de edad necesitan "age", "old" u "young": el resto de ítems no se examina
+    inclusion = [i for i in map(str.lower, inclusion) if "age" in i or "old" in i or "young" in i]
+    exclusion = [i for i in map(str.lower, exclusion) if "age" in i or "old" in i or "young" in i]
+    for item in inclusion:
+        rango = PATRON_RANGO.search(item)
+        if rango:
+            a, b = sorted(float(g) for g in rango.groups() if g is not None)
+            minima, maxima = a if minima is None else minima, b if maxima is None else maxima
+            continue
+        desde, hasta = PATRON_DESDE.search(item), PATRON_HASTA.search(item)
+        if desde and minima is None:
+            minima = _primer_numero(desde)
+        if hasta and maxima is None:
+            maxima = _primer_numero(hasta)
+    # En exclusión el sentido se invierte: "age > 65" fija el máximo y "age < 18" el mínimo
+    for item in exclusion:
+        desde, hasta = PATRON_DESDE.search(item), PATRON_HASTA.search(item)
+        if desde and maxima is None:
+            maxima = _primer_numero(desde)
+        if hasta and minima is None:
+            minima = _primer_numero(hasta)
+    return minima, maxima
+
+
+def parsear_criterios(texto, sexo=None, edad_minima=None, edad_maxima=None):
+    """Divide el textblock en ítems de inclusión/exclusión y extrae edad, sexo y conceptos.
+
+    `sexo`, `edad_minima` y `edad_maxima` son los campos estructurados del
+    estudio (<gender>, <minimum_age>, <maximum_age>); tienen prioridad sobre
+    las edades que se deducen del texto.
+    """
+    inclusion, exclusion = dividir_criterios(texto if texto and texto != "No disponible" else "")
+    minima, maxima = edad_en_anios(edad_minima), edad_en_anios(edad_maxima)
+    if minima is None or maxima is None:
+        texto_minima, texto_maxima = _edades_texto(inclusion, exclusion)
+        minima = texto_minima if minima is None else minima
+        maxima = texto_maxima if maxima is None else maxima
+    return Elegibilidad(
+        inclusion=inclusion,
+        exclusion=exclusion,
+        edad_minima=minima,
+        edad_maxima=maxima,
+        sexo=normalizar_sexo(sexo),
+        terminos_inclusion=_terminos(inclusion),
+        terminos_exclusion=_terminos(exclusion),
+    )
@@ -0,0 +1,197 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zlib
+
+from clasificacion import ESTADOS, clasificador_estados
+
+# -------------------- CONFIGURACIÓN --------------------
+EXPORT_LOTE_PARQUET = int(os.environ.get("EXPORT_LOTE_PARQUET", 5000))  # filas por row group
+
+COLUMNAS = [
+    ("identificador", "ID"),
+    ("titulo", "Título"),
+    ("estado", "Estado"),
+    ("fase", "Fase"),
+    ("tipo_estudio", "Tipo de estudio"),
+    ("patrocinador", "Patrocinador"),
+    ("fecha_inicio", "Fecha de inicio"),
+    ("condiciones", "Condiciones"),
+    ("intervenciones", "Intervenciones"),
+    ("paises", "Países"),
+]
+_FILA_VACIA = dict.fromkeys((clave for clave, _ in COLUMNAS), "")
+
+
+def fila_exportacion(ensayo, registro=None):
+    # `ensayo` es un resultado de buscar_ensayos; `registro`, su RegistroEnsayo si se pidió el detalle
+    ubicacion = ensayo.get("ubicacion")
+    fila = dict(_FILA_VACIA)
+    fila.update(
+        identificador=ensayo["identificador"],
+        titulo=ensayo["titulo"],
+        estado=ensayo["estado"],
+        fase=ensayo["fase"],
+        paises=ubicacion if ubicacion and ubicacion != "Desconocida" else "",
+    )
+    if registro is not None:
+        fila.update(
+            titulo=registro.titulo,
+            estado=ESTADOS[clasificador_estados.clasificar_uno(registro.estado)],
+            fase=registro.fase,
+            tipo_estudio=registro.tipo_estudio,
+            patrocinador=registro.patrocinador,
+            fecha_inicio=registro.fecha_inicio,
+            condiciones="; ".join(c for c in registro.condiciones if c),
+            intervenciones="; ".join(i for i in registro.intervenciones if i),
+            paises="; ".join(registro.paises),
+        )
+    return fila
+
+
+# -------------------- ESCRITORES --------------------
+# inicio()/fila(f)/fin() devuelven los bytes listos para enviar, así que la
+# respuesta avanza fila a fila sin acumular el fichero completo.
+class EscritorCSV:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, excel=False):
+        # Variante Excel: BOM para que detecte UTF-8, ';' (configuración regional española) y CRLF
+        self.excel = excel
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, delimiter=";" if excel else ",",
+                                  lineterminator="\r\n" if excel else "\n")
+
+    def _volcar(self):
+        texto = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return texto.encode("utf-8")
+
+    def inicio(self):
+        self._writer.writerow([cabecera for _, cabecera in COLUMNAS])
+        return ("\ufeff" if self.excel else "").encode("utf-8") + self._volcar()
+
+    def fila(self, fila):
+        self._writer.writerow([fila[clave] for clave, _ in COLUMNAS])
+        return self._volcar()
+
+    def fin(self):
+        return b""
+
+
+class _Sumidero(io.RawIOBase):
+    """Fichero de solo escritura cuyo contenido se recoge y se vacía a trozos."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+class EscritorParquet:
+    """Parquet por row groups; requiere pyarrow (ImportError si no está instalado)."""
+
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self, lote=EXPORT_LOTE_PARQUET):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._esquema = pa.schema([(clave, pa.string()) for clave, _ in COLUMNAS])
+        self._sumidero = _Sumidero()
+        self._writer = pq.ParquetWriter(self._sumidero, self._esquema, compression="snappy")
+        self._lote = lote
+        self._filas = []
+
+    def _escribir_lote(self):
+        if self._filas:
+            self._writer.write_table(self._pa.Table.from_pylist(self._filas, schema=self._esquema))
+            self._filas = []
+
+    def inicio(self):
+        return b""
+
+    def fila(self, fila):
+        self._filas.append(fila)
+        if len(self._filas) >= self._lote:
+            self._escribir_lote()
+        return self._sumidero.vaciar()
+
+    def fin(self):
+        self._escribir_lote()
+        self._writer.close()
+        return self._sumidero.vaciar()
+
+
+async def aexportar(filas, escritor, gzip=False):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+
+    def salida(datos):
+        return compresor.compress(datos) if compresor else datos
+
+    yield salida(escritor.inicio())
+    async for fila in filas:
+        datos = salida(escritor.fila(fila))
+        if datos:
+            yield datos
+    yield salida(escritor.fin()) + (compresor.flush() if compresor else b"")
+
+
+# -------------------- VOLCADO PARA PDF --------------------
+class VolcadoFilas:
+    """Guarda las filas en un NDJSON temporal mientras calcula su hash.
+
+    El PDF se maqueta en el pool de procesos leyendo este fichero, así que las
+    filas no se mantienen en memoria ni viajan serializadas entre procesos.
+    """
+
+    def __init__(self):
+        self._fichero = tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False, encoding="utf-8")
+        self.ruta = self._fichero.name
+        self._hash = hashlib.sha256()
+        self.filas = 0
+
+    def agregar(self, fila):
+        linea = json.dumps(fila, ensure_ascii=False) + "\n"
+        self._fichero.write(linea)
+        self._hash.update(linea.encode("utf-8"))
+        self.filas += 1
+
+    def cerrar(self):
+        self._fichero.close()
+        return self._hash.hexdigest()
+
+    def eliminar(self):
+        self._fichero.close()
+        try:
+            os.unlink(self.ruta)
+        except FileNotFoundError:
+            pass
+
+
+def leer_filas(ruta):
+    with open(ruta, encoding="utf-8") as fichero:
+        for linea in fichero:
+            yield json.loads(linea)
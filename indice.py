@@ -0,0 +1,439 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timezone
+
+from clasificacion import ESTADOS, FASES, clasificador_estados, clasificador_fases, coincide_estado, coincide_fase
+from criterios import concepto, normalizar_sexo, parsear_criterios
+from parseo import NO_DISPONIBLE
+from vocabulario import canonizar_molecula, canonizar_patologia, vocabulario
+
+# -------------------- CONFIGURACIÓN --------------------
+INDICE_RUTA = os.environ.get("INDICE_RUTA", "ensayos.sqlite3")
+# Antigüedad máxima (segundos) de la última sincronización completa para resolver filtros en local
+INDICE_COBERTURA_MAX_EDAD = float(os.environ.get("INDICE_COBERTURA_MAX_EDAD", 24 * 3600))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ensayos (
+    id INTEGER PRIMARY KEY,
+    nct_id TEXT NOT NULL UNIQUE,
+    titulo TEXT,
+    resumen TEXT,
+    estado TEXT,
+    estado_norm TEXT,
+    estado_codigo INTEGER,
+    fase TEXT,
+    fase_codigo INTEGER,
+    tipo_estudio TEXT,
+    patrocinador TEXT,
+    fecha_inicio TEXT,
+    criterios TEXT,
+    paises TEXT,
+    anio_inicio INTEGER,
+    actualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ensayos_estado ON ensayos (estado_codigo);
+CREATE INDEX IF NOT EXISTS ensayos_fase ON ensayos (fase_codigo);
+CREATE TABLE IF NOT EXISTS ensayo_paises (nct_id TEXT NOT NULL, pais TEXT NOT NULL, PRIMARY KEY (pais, nct_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ensayo_condiciones (nct_id TEXT NOT NULL, condicion TEXT NOT NULL, PRIMARY KEY (condicion, nct_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ensayo_intervenciones (nct_id TEXT NOT NULL, intervencion TEXT NOT NULL, PRIMARY KEY (intervencion, nct_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ensayo_endpoints (nct_id TEXT NOT NULL, endpoint TEXT NOT NULL, PRIMARY KEY (nct_id, endpoint)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ensayo_paises_id ON ensayo_paises (nct_id);
+CREATE INDEX IF NOT EXISTS ensayo_condiciones_id ON ensayo_condiciones (nct_id);
+CREATE INDEX IF NOT EXISTS ensayo_intervenciones_id ON ensayo_intervenciones (nct_id);
+CREATE TABLE IF NOT EXISTS tendencias (
+    condicion TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    anio INTEGER NOT NULL,
+    estudios INTEGER NOT NULL,
+    PRIMARY KEY (condicion, dimension, valor, anio)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS ensayos_fts USING fts5 (
+    titulo, condiciones, intervenciones, resumen, tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS ensayo_elegibilidad (
+    nct_id TEXT PRIMARY KEY,
+    edad_minima REAL,
+    edad_maxima REAL,
+    sexo TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ensayo_criterios (
+    nct_id TEXT NOT NULL, tipo TEXT NOT NULL, termino TEXT NOT NULL, PRIMARY KEY (tipo, termino, nct_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ensayo_criterios_id ON ensayo_criterios (nct_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS criterios_fts USING fts5 (
+    inclusion, exclusion, tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS cobertura (
+    molecula TEXT NOT NULL,
+    patologia TEXT NOT NULL,
+    sincronizado REAL NOT NULL,
+    PRIMARY KEY (molecula, patologia)
+) WITHOUT ROWID;
+"""
+
+TABLAS_RELACIONADAS = ("ensayo_paises", "ensayo_condiciones", "ensayo_intervenciones", "ensayo_endpoints",
+                       "ensayo_elegibilidad", "ensayo_criterios")
+
+# Agregados materializados por condición: (condición, valor, año) de cada ensayo en cada dimensión.
+# Se suman al guardar un ensayo y se restan antes de reemplazarlo, así que nunca se recalculan enteros.
+DIMENSIONES_TENDENCIAS = {
+    # dimensión: (valor, join con la tabla que lo aporta)
+    "anio": ("''", ""),
+    "molecula": ("x.intervencion", "JOIN ensayo_intervenciones x USING (nct_id)"),
+    "pais": ("x.pais", "JOIN ensayo_paises x USING (nct_id)"),
+    "endpoint": ("x.endpoint", "JOIN ensayo_endpoints x USING (nct_id)"),
+}
+TENDENCIAS_TOP = int(os.environ.get("TENDENCIAS_TOP", 5))
+TENDENCIAS_VENTANA = int(os.environ.get("TENDENCIAS_VENTANA", 2))  # años recientes frente a los previos
+
+log = logging.getLogger("indice")
+
+
+def normalizar(texto):
+    return " ".join((texto or "").lower().split())
+
+
+def anio(fecha):
+    # "January 2023" / "2023-01-15" -> 2023
+    encontrado = re.search(r"\b(19|20)\d{2}\b", fecha or "")
+    return int(encontrado.group()) if encontrado else None
+
+
+def consulta_fts(*terminos, columna=None):
+    # Cada término va entre comillas para que la sintaxis de FTS5 no interprete su contenido; una
+    # tupla es un grupo de alternativas: ("vitiligo" OR "leucodermia")
+    prefijo = f"{columna} : " if columna else ""
+    partes = []
+    for termino in terminos:
+        alternativas = [t for t in ((termino,) if isinstance(termino, str) else termino or ()) if t and t.strip()]
+        if alternativas:
+            frases = " OR ".join('"' + t.replace('"', '""') + '"' for t in alternativas)
+            partes.append(prefijo + (f"({frases})" if len(alternativas) > 1 else frases))
+    return " AND ".join(partes)
+
+
+def formas(texto, tipo):
+    # Todas las formas conocidas del concepto, como en tendencias: el índice guarda el texto del
+    # upstream, que no siempre usa el nombre canónico ("leucodermia", "ozempic")
+    return vocabulario.variantes(texto, tipo) if texto else None
+
+
+def ambito(molecula=None, patologia=None):
+    # Ámbito de una sincronización o de una búsqueda: nombres canónicos, "" = sin restringir
+    return canonizar_molecula(molecula) or "", canonizar_patologia(patologia) or ""
+
+
+def _resultado(fila):
+    # Mismo formato que los resultados de /buscar_ensayos
+    return {
+        "identificador": fila["nct_id"],
+        "titulo": fila["titulo"],
+        "estado": ESTADOS[fila["estado_codigo"] or 0],
+        "fase": FASES[fila["fase_codigo"] or 0],
+        "ubicacion": fila["paises"] or "Desconocida",
+    }
+
+
+# -------------------- ÍNDICE LOCAL --------------------
+class IndiceEnsayos:
+    """Almacén SQLite de ensayos con columnas indexadas y búsqueda de texto FTS5.
+
+    Se alimenta con los `parseo.RegistroEnsayo` y resuelve en
+    local los filtros de estado, fase, país, condición e intervención.
+    Guarda también los criterios de elegibilidad ya parseados (edades, sexo,
+    conceptos de inclusión/exclusión y texto de cada sección en FTS5), de
+    modo que `buscar_por_criterios` responde con consultas sobre índices.
+    """
+
+    def __init__(self, ruta=INDICE_RUTA):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._conexion().executescript(ESQUEMA)
+
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            # Una conexión no se comparte entre procesos: tras un fork (gunicorn --preload) el hijo abre la suya
+            con = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    def guardar(self, registros):
+        con = self._conexion()
+        ahora = time.time()
+        with con:
+            con.execute("BEGIN IMMEDIATE")
+            for r in registros:
+                nct_id = r.id
+                # Se descuenta la versión anterior del ensayo antes de reemplazarla
+                self._ajustar_tendencias(con, nct_id, -1)
+                # El upsert conserva el rowid, que es también el rowid de la fila FTS
+                con.execute(
+                    "INSERT INTO ensayos (nct_id, titulo, resumen, estado, estado_norm, estado_codigo, fase, fase_codigo, "
+                    "tipo_estudio, patrocinador, fecha_inicio, criterios, paises, anio_inicio, actualizado) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (nct_id) DO UPDATE SET titulo = excluded.titulo, resumen = excluded.resumen, "
+                    "estado = excluded.estado, estado_norm = excluded.estado_norm, estado_codigo = excluded.estado_codigo, "
+                    "fase = excluded.fase, fase_codigo = excluded.fase_codigo, tipo_estudio = excluded.tipo_estudio, "
+                    "patrocinador = excluded.patrocinador, "
+                    "fecha_inicio = excluded.fecha_inicio, criterios = excluded.criterios, paises = excluded.paises, "
+                    "anio_inicio = excluded.anio_inicio, actualizado = excluded.actualizado",
+                    (nct_id, r.titulo, r.resumen, r.estado, normalizar(r.estado),
+                     clasificador_estados.clasificar_uno(r.estado), r.fase, clasificador_fases.clasificar_uno(r.fase),
+                     r.tipo_estudio, r.patrocinador, r.fecha_inicio, r.criterios,
+                     ", ".join(r.paises), anio(r.fecha_inicio), ahora),
+                )
+                rowid = con.execute("SELECT id FROM ensayos WHERE nct_id = ?", (nct_id,)).fetchone()[0]
+                for tabla in TABLAS_RELACIONADAS:
+                    con.execute(f"DELETE FROM {tabla} WHERE nct_id = ?", (nct_id,))
+                con.execute("DELETE FROM ensayos_fts WHERE rowid = ?", (rowid,))
+                con.execute("DELETE FROM criterios_fts WHERE rowid = ?", (rowid,))
+                con.executemany("INSERT OR IGNORE INTO ensayo_paises VALUES (?, ?)",
+                                [(nct_id, normalizar(p)) for p in r.paises if p])
+                con.executemany("INSERT OR IGNORE INTO ensayo_condiciones VALUES (?, ?)",
+                                [(nct_id, normalizar(c)) for c in r.condiciones if c])
+                con.executemany("INSERT OR IGNORE INTO ensayo_intervenciones VALUES (?, ?)",
+                                [(nct_id, normalizar(i)) for i in r.intervenciones if i])
+                con.executemany("INSERT OR IGNORE INTO ensayo_endpoints VALUES (?, ?)",
+                                [(nct_id, normalizar(e)) for e in r.endpoints if e])
+                con.execute(
+                    "INSERT INTO ensayos_fts (rowid, titulo, condiciones, intervenciones, resumen) VALUES (?, ?, ?, ?, ?)",
+                    (rowid, r.titulo, " ; ".join(c for c in r.condiciones if c),
+                     " ; ".join(i for i in r.intervenciones if i), r.resumen),
+                )
+                self._guardar_criterios(con, nct_id, rowid, r.elegibilidad or parsear_criterios(r.criterios))
+                self._ajustar_tendencias(con, nct_id, +1)
+
+    def guardar_detalle(self, registro):
+        # Detalle recién descargado en una petición: el índice es secundario, un fallo se registra y no
+        # convierte en error una respuesta que ya se tiene
+        if not registro.id or registro.id == NO_DISPONIBLE:
+            return
+        try:
+            self.guardar([registro])
+        except Exception:
+            log.exception("No se pudo indexar %s", registro.id)
+
+    def _guardar_criterios(self, con, nct_id, rowid, elegibilidad):
+        e = elegibilidad
+        con.execute("INSERT INTO ensayo_elegibilidad VALUES (?, ?, ?, ?)", (nct_id, e.edad_minima, e.edad_maxima, e.sexo))
+        con.executemany("INSERT OR IGNORE INTO ensayo_criterios VALUES (?, ?, ?)",
+                        [(nct_id, "inclusion", t) for t in e.terminos_inclusion]
+                        + [(nct_id, "exclusion", t) for t in e.terminos_exclusion])
+        con.execute("INSERT INTO criterios_fts (rowid, inclusion, exclusion) VALUES (?, ?, ?)",
+                    (rowid, "\n".join(e.inclusion), "\n".join(e.exclusion)))
+
+    def _ajustar_tendencias(self, con, nct_id, signo):
+        for dimension, (valor, join) in DIMENSIONES_TENDENCIAS.items():
+            con.execute(
+                "INSERT INTO tendencias (condicion, dimension, valor, anio, estudios) "
+                f"SELECT c.condicion, ?, {valor}, COALESCE(e.anio_inicio, 0), ? FROM ensayo_condiciones c {join} "
+                "JOIN ensayos e USING (nct_id) WHERE c.nct_id = ? "
+                "ON CONFLICT (condicion, dimension, valor, anio) DO UPDATE SET estudios = estudios + excluded.estudios",
+                (dimension, signo, nct_id),
+            )
+        if signo < 0:
+            con.execute(
+                "DELETE FROM tendencias WHERE condicion IN (SELECT condicion FROM ensayo_condiciones WHERE nct_id = ?) "
+                "AND estudios <= 0", (nct_id,)
+            )
+
+    def buscar(self, texto=None, molecula=None, patologia=None, estado=None, fase=None, pais=None,
+               condicion=None, intervencion=None, limite=None, offset=0):
+        condiciones, parametros = [], []
+        fts = consulta_fts(texto, formas(molecula, "molecula"), formas(patologia, "patologia"))
+        if fts:
+            condiciones.append("e.id IN (SELECT rowid FROM ensayos_fts WHERE ensayos_fts MATCH ?)")
+            parametros.append(fts)
+        if estado:
+            # Por subcadena, como los filtros del upstream: de la etiqueta ("reclutando", "en curso") o del
+            # texto original ("recruiting" incluye "not yet recruiting")
+            codigos = [codigo for codigo in range(len(ESTADOS)) if coincide_estado(codigo, estado)]
+            condiciones.append(f"(e.estado_codigo IN ({', '.join('?' * len(codigos))}) OR instr(e.estado_norm, ?) > 0)")
+            parametros += codigos + [normalizar(estado)]
+        if fase:
+            # Mismas reglas que el filtro sobre el upstream: "3" incluye "2/3", "2/3" solo "2/3"
+            codigos = [codigo for codigo in range(len(FASES)) if coincide_fase(codigo, fase)]
+            condiciones.append(f"e.fase_codigo IN ({', '.join('?' * len(codigos))})")
+            parametros += codigos
+        if pais:
+            condiciones.append("e.nct_id IN (SELECT nct_id FROM ensayo_paises WHERE instr(pais, ?) > 0)")
+            parametros.append(normalizar(pais))
+        if condicion:
+            condiciones.append("e.nct_id IN (SELECT nct_id FROM ensayo_condiciones WHERE condicion = ?)")
+            parametros.append(normalizar(condicion))
+        if intervencion:
+            condiciones.append("e.nct_id IN (SELECT nct_id FROM ensayo_intervenciones WHERE intervencion = ?)")
+            parametros.append(normalizar(intervencion))
+
+        sql = "SELECT e.nct_id, e.titulo, e.estado_codigo, e.fase_codigo, e.paises FROM ensayos e"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY e.nct_id LIMIT ? OFFSET ?"
+        parametros += [-1 if limite is None else limite, offset]
+
+        return [_resultado(fila) for fila in self._conexion().execute(sql, parametros)]
+
+    def buscar_por_criterios(self, molecula=None, patologia=None, edad=None, sexo=None, incluye=(), no_excluye=(),
+                             limite=None, offset=0):
+        """Ensayos cuyos criterios admiten al paciente descrito.
+
+        `edad` (años) debe caer en el rango de edades y `sexo` estar admitido;
+        cada término de `incluye` debe aparecer en la inclusión y ninguno de
+        `no_excluye` en la exclusión. Los conceptos del vocabulario
+        (criterios.TERMINOS, también por sus frases: "pregnancy") se resuelven
+        en ensayo_criterios y el resto como frase en el texto de la sección.
+        Un límite que el ensayo no indica no lo excluye.
+        """
+        condiciones, parametros = [], []
+        fts = consulta_fts(formas(molecula, "molecula"), formas(patologia, "patologia"))
+        if fts:
+            condiciones.append("e.id IN (SELECT rowid FROM ensayos_fts WHERE ensayos_fts MATCH ?)")
+            parametros.append(fts)
+        # Condiciones por fila (la elegibilidad va en el JOIN y los conceptos son búsquedas por clave
+        # primaria) en vez de NOT IN: no se materializan los conjuntos excluidos y la primera página
+        # sale en cuanto hay `limite` ensayos que cumplen.
+        if edad is not None:
+            condiciones.append("(g.edad_minima IS NULL OR g.edad_minima <= ?) "
+                               "AND (g.edad_maxima IS NULL OR g.edad_maxima >= ?)")
+            parametros += [edad, edad]
+        if sexo:
+            condiciones.append("(g.sexo IS NULL OR g.sexo IN ('todos', ?))")
+            parametros.append(normalizar_sexo(sexo))
+        for tipo, terminos, negacion in (("inclusion", incluye, ""), ("exclusion", no_excluye, "NOT ")):
+            for termino in terminos:
+                nombre = concepto(termino)
+                if nombre:
+                    condiciones.append(f"{negacion}EXISTS (SELECT 1 FROM ensayo_criterios c "
+                                       "WHERE c.tipo = ? AND c.termino = ? AND c.nct_id = e.nct_id)")
+                    parametros += [tipo, nombre]
+                else:
+                    condiciones.append(f"e.id {negacion}IN (SELECT rowid FROM criterios_fts WHERE criterios_fts MATCH ?)")
+                    parametros.append(consulta_fts(termino, columna=tipo))
+
+        sql = ("SELECT e.nct_id, e.titulo, e.estado_codigo, e.fase_codigo, e.paises, g.edad_minima, g.edad_maxima, g.sexo "
+               "FROM ensayos e LEFT JOIN ensayo_elegibilidad g USING (nct_id)")
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY e.nct_id LIMIT ? OFFSET ?"
+        parametros += [-1 if limite is None else limite, offset]
+
+        return [
+            {**_resultado(fila), "elegibilidad": {
+                "edad_minima": fila["edad_minima"], "edad_maxima": fila["edad_maxima"], "sexo": fila["sexo"]
+            }}
+            for fila in self._conexion().execute(sql, parametros)
+        ]
+
+    def tendencias(self, patologia, top=TENDENCIAS_TOP, ventana=TENDENCIAS_VENTANA):
+        """Tendencias de una condición leídas de los agregados materializados; None si no hay datos.
+
+        La condición se busca por todas sus formas conocidas (vocabulario.py:
+        "vitíligo", "non-segmental vitiligo"...) y se usa la que más estudios
+        tiene; no se suman entre sí porque un ensayo puede listar varias.
+        """
+        con = self._conexion()
+        variantes = vocabulario.variantes(patologia, "patologia")
+        fila = con.execute(
+            f"SELECT condicion FROM tendencias WHERE condicion IN ({', '.join('?' * len(variantes))}) "
+            "AND dimension = 'anio' GROUP BY condicion ORDER BY SUM(estudios) DESC LIMIT 1", variantes
+        ).fetchone()
+        if fila is None:
+            return None
+        condicion = fila["condicion"]
+        por_anio = {
+            fila["anio"]: fila["estudios"] for fila in con.execute(
+                "SELECT anio, estudios FROM tendencias WHERE condicion = ? AND dimension = 'anio' ORDER BY anio",
+                (condicion,)
+            )
+        }
+        if not por_anio:
+            return None
+
+        def frecuentes(dimension):
+            return [fila["valor"] for fila in con.execute(
+                "SELECT valor, SUM(estudios) AS total FROM tendencias WHERE condicion = ? AND dimension = ? "
+                "GROUP BY valor ORDER BY total DESC, valor LIMIT ?", (condicion, dimension, top)
+            )]
+
+        # En alza: más estudios en los últimos `ventana` años que en los `ventana` anteriores
+        ultimo = min(max(por_anio), date.today().year)  # sin contar fechas de inicio previstas
+        desde = ultimo - ventana + 1
+        en_alza = [fila["valor"] for fila in con.execute(
+            "SELECT valor, SUM(CASE WHEN anio >= ? THEN estudios ELSE 0 END) AS recientes, "
+            "SUM(CASE WHEN anio >= ? AND anio < ? THEN estudios ELSE 0 END) AS previos "
+            "FROM tendencias WHERE condicion = ? AND dimension = 'molecula' GROUP BY valor "
+            "HAVING recientes > 0 ORDER BY recientes - previos DESC, recientes DESC, valor LIMIT ?",
+            (desde, desde - ventana, desde, condicion, top)
+        )]
+        return {
+            "ensayos": sum(por_anio.values()),
+            "moleculas_en_alza": en_alza,
+            "endpoints_frecuentes": frecuentes("endpoint"),
+            "zonas_con_mayor_actividad": [pais.title() for pais in frecuentes("pais")],
+            "nuevos_estudios_por_año": {str(a): n for a, n in por_anio.items() if a},
+        }
+
+    def estados(self, nct_ids, lote=500):
+        # Estado (texto del upstream) de los ensayos ya indexados; los que no están se omiten
+        con = self._conexion()
+        nct_ids = list(nct_ids)
+        estados = []
+        for i in range(0, len(nct_ids), lote):
+            trozo = nct_ids[i:i + lote]
+            estados.extend(fila[0] for fila in con.execute(
+                f"SELECT estado FROM ensayos WHERE nct_id IN ({', '.join('?' * len(trozo))})", trozo
+            ))
+        return estados
+
+    # -------------------- COBERTURA --------------------
+    # sync_ensayos.py registra cada ámbito que deja completo: todos sus ensayos, al día en `sincronizado`.
+    # Que haya algún ensayo indexado (un /ensayo_detalle suelto, una sincronización parcial) no basta.
+    def registrar_cobertura(self, ambito, sincronizado):
+        self._conexion().execute("INSERT OR REPLACE INTO cobertura VALUES (?, ?, ?)", (*ambito, sincronizado))
+
+    def retirar_cobertura(self, ambito):
+        self._conexion().execute("DELETE FROM cobertura WHERE molecula = ? AND patologia = ?", ambito)
+
+    def sincronizado(self, ambito):
+        # Última sincronización completa (epoch) de exactamente este ámbito
+        fila = self._conexion().execute(
+            "SELECT sincronizado FROM cobertura WHERE molecula = ? AND patologia = ?", ambito
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def cobertura(self, molecula=None, patologia=None, max_edad=INDICE_COBERTURA_MAX_EDAD):
+        """Cobertura del índice para una búsqueda, o None si hay que preguntar al upstream.
+
+        Vale la sincronización completa del mismo ámbito o de uno más amplio
+        (sin molécula, sin patología o sin ninguna) de hace menos de `max_edad` segundos.
+        """
+        m, p = ambito(molecula, patologia)
+        fila = self._conexion().execute(
+            "SELECT MAX(sincronizado) FROM cobertura WHERE molecula IN ('', ?) AND patologia IN ('', ?)", (m, p)
+        ).fetchone()
+        if fila[0] is None or time.time() - fila[0] > max_edad:
+            return None
+        sincronizado = datetime.fromtimestamp(fila[0], timezone.utc).isoformat(timespec="seconds")
+        return {"completa": True, "sincronizado": sincronizado}
+
+    def __len__(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM ensayos").fetchone()[0]
+
+
+def __getattr__(nombre):
+    # `indice` (y con él el fichero SQLite) se crea en el primer `from indice import indice`, como
+    # upstream.cliente: importar el módulo (sync_ensayos.py, benchmarks) no abre ni crea nada
+    if nombre == "indice":
+        global indice
+        indice = IndiceEnsayos()
+        return indice
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from cache import CACHE_BACKEND, BackendMemoria, BackendSQLite
+from metricas import observar_etapa
+
+# -------------------- CONFIGURACIÓN --------------------
+PDF_PROCESOS = int(os.environ.get("PDF_PROCESOS", os.cpu_count() or 1))
+PDF_CACHE_RUTA = os.environ.get("PDF_CACHE_RUTA", "cache_pdf.sqlite3")
+PDF_CACHE_MAX_ENTRADAS = int(os.environ.get("PDF_CACHE_MAX_ENTRADAS", 256))
+PDF_TRABAJOS_TTL = float(os.environ.get("PDF_TRABAJOS_TTL", 3600))
+PDF_FLOWABLES_POR_PAGINA = 200  # más de los que caben en una página A4
+# Arrancar el pool (y reportlab) al calentar el servidor en vez de con el primer PDF
+PDF_CALENTAR = os.environ.get("PDF_CALENTAR", "0").lower() not in ("0", "false", "no")
+
+# Cambiar al modificar cualquier plantilla: invalida los PDFs ya cacheados
+VERSION_PLANTILLAS = 2
+
+log = logging.getLogger("informes")
+
+
+# -------------------- PLANTILLAS --------------------
+# Se ejecutan en los procesos del pool: funciones de módulo, argumentos
+# serializables y reportlab importado dentro para no cargarlo en el servidor.
+def pdf_pico(molecula, patologia, pico):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(50, height - 50, f"Esquema PICO - {molecula} / {patologia}")
+    c.setFont("Helvetica", 12)
+    y = height - 100
+    for clave, valor in pico.items():
+        c.drawString(50, y, f"{clave}: {valor}")
+        y -= 30
+    c.save()
+    return buffer.getvalue()
+
+
+def pdf_exportacion(molecula, patologia=None, ruta_filas=None, ensayos=()):
+    from xml.sax.saxutils import escape
+
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Frame, Paragraph, Spacer
+
+    from exportacion import leer_filas
+
+    estilos = getSampleStyleSheet()
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    def historia():
+        yield Paragraph(escape(f"Exportación de Ensayos - {molecula}"), estilos["Title"])
+        yield Paragraph(escape(f"Patología: {patologia or 'No especificada'}"), estilos["Normal"])
+        yield Spacer(1, 12)
+        for fila in leer_filas(ruta_filas) if ruta_filas else ensayos:
+            fase = fila.get("fase")
+            detalles = [fila.get("estado"), fase and f"Fase {fase}", fila.get("paises")]
+            yield Paragraph(f"<b>{escape(fila['identificador'])}</b> {escape(fila.get('titulo') or '')}<br/>"
+                            + escape(" · ".join(d for d in detalles if d)), estilos["Normal"])
+            yield Spacer(1, 6)
+
+    # Maquetado página a página: solo existen los flowables de la página en curso
+    pendientes = historia()
+    lista = []
+    pagina = 0
+    while True:
+        lista.extend(itertools.islice(pendientes, PDF_FLOWABLES_POR_PAGINA - len(lista)))
+        if not lista:
+            break
+        pagina += 1
+        primero = lista[0]
+        Frame(40, 40, width - 80, height - 80).addFromList(lista, c)
+        if lista and lista[0] is primero:
+            lista.pop(0)  # no cabe ni en una página vacía: se descarta para no repetir páginas en blanco
+        c.setFont("Helvetica", 8)
+        c.drawRightString(width - 40, 25, f"Página {pagina}")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+PLANTILLAS = {"pico": pdf_pico, "exportacion": pdf_exportacion}
+
+
+def renderizar(plantilla, parametros):
+    return PLANTILLAS[plantilla](**parametros)
+
+
+def clave_pdf(plantilla, parametros):
+    # Mismas entradas => mismo PDF: la clave es el hash del contenido de la petición
+    datos = json.dumps([VERSION_PLANTILLAS, plantilla, parametros], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(datos.encode("utf-8")).hexdigest()
+
+
+def _precargar():
+    import reportlab.pdfgen.canvas  # noqa: F401
+
+
+# -------------------- CACHÉ DE PDFs --------------------
+class CachePDF:
+    """PDFs renderizados por clave de contenido; no caducan, solo se desalojan por LRU."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = self.misses = self.evictions = 0
+
+    def obtener(self, clave):
+        entrada = self.backend.get(clave)
+        if entrada is not None:
+            self.hits += 1
+            return entrada[0]
+        self.misses += 1
+        return None
+
+    def guardar(self, clave, pdf):
+        self.evictions += self.backend.set(clave, pdf, time.time())
+
+    def estadisticas(self):
+        consultas = self.hits + self.misses
+        return {
+            "backend": self.backend.nombre,
+            "entradas": len(self.backend),
+            "max_entradas": self.backend.max_entradas,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / consultas, 4) if consultas else None,
+        }
+
+
+def crear_cache_pdf():
+    # Con el backend SQLite los PDFs (y los trabajos terminados) se comparten entre workers
+    if CACHE_BACKEND == "sqlite":
+        backend = BackendSQLite(PDF_CACHE_RUTA, PDF_CACHE_MAX_ENTRADAS)
+    else:
+        backend = BackendMemoria(PDF_CACHE_MAX_ENTRADAS)
+    return CachePDF(backend)
+
+
+# -------------------- GENERADOR --------------------
+class GeneradorPDF:
+    """Renderiza PDFs en un pool de procesos para no bloquear los workers web.
+
+    Las peticiones idénticas comparten render (mientras está en curso) y
+    resultado (cacheado por hash de sus entradas). El identificador de un
+    trabajo es esa misma clave, así que cualquier worker con acceso a la
+    caché puede servir su descarga.
+    """
+
+    def __init__(self, procesos=PDF_PROCESOS, cache=None):
+        self.procesos = procesos
+        self.cache = cache if cache is not None else crear_cache_pdf()
+        self.renderizados = 0
+        self._pool = None
+        self._lock = threading.Lock()
+        self._vuelos = {}
+        self._trabajos = {}
+
+    def _ejecutor(self):
+        # Pool perezoso (multiprocessing tampoco se importa hasta el primer PDF);
+        # forkserver evita heredar hilos y locks del servidor
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            metodos = multiprocessing.get_all_start_methods()
+            contexto = multiprocessing.get_context("forkserver" if "forkserver" in metodos else None)
+            if contexto.get_start_method() == "forkserver":
+                # Las plantillas y reportlab se importan una vez en el forkserver y cada worker nace con ellos
+                contexto.set_forkserver_preload(["informes", "reportlab.pdfgen.canvas"])
+            principal = sys.modules.get("__main__")
+            if getattr(principal, "__spec__", None) is None and hasattr(principal, "app"):
+                # multiprocessing vuelve a ejecutar el script principal en cada worker (como __mp_main__):
+                # con `python app.py` eso es la app entera. servidor.py y uvicorn no tienen ese coste.
+                log.warning("Workers de PDF lanzados desde %s: cada uno reimporta la app; arranque con servidor.py",
+                            getattr(principal, "__file__", "__main__"))
+            self._pool = ProcessPoolExecutor(self.procesos, mp_context=contexto, initializer=_precargar)
+        return self._pool
+
+    def enviar(self, plantilla, parametros, clave=None):
+        clave = clave or clave_pdf(plantilla, parametros)
+        pdf = self.cache.obtener(clave)
+        if pdf is not None:
+            futuro = Future()
+            futuro.set_result(pdf)
+            return clave, futuro
+        with self._lock:
+            futuro = self._vuelos.get(clave)
+            if futuro is None:
+                futuro = self._vuelos[clave] = self._ejecutor().submit(renderizar, plantilla, parametros)
+                nuevo = True
+            else:
+                nuevo = False
+        if nuevo:
+            inicio = time.perf_counter()
+            futuro.add_done_callback(lambda f: self._terminado(clave, f, inicio))
+        return clave, futuro
+
+    def _terminado(self, clave, futuro, inicio):
+        if not futuro.cancelled() and futuro.exception() is None:
+            # Desde el envío al pool: incluye la espera en cola si todos los procesos están ocupados
+            observar_etapa("pdf", time.perf_counter() - inicio)
+            self.renderizados += 1
+            self.cache.guardar(clave, futuro.result())
+        with self._lock:
+            self._vuelos.pop(clave, None)
+
+    def renderizar(self, plantilla, parametros, timeout=None):
+        return self.enviar(plantilla, parametros)[1].result(timeout)
+
+    async def arenderizar(self, plantilla, parametros):
+        return await asyncio.wrap_future(self.enviar(plantilla, parametros)[1])
+
+    # -------------------- MODO TRABAJO --------------------
+    def crear_trabajo(self, plantilla, parametros):
+        return self.registrar_trabajo(*self.enviar(plantilla, parametros))
+
+    def registrar_trabajo(self, clave, futuro):
+        # Sin clave de contenido (p. ej. una exportación cuyos datos aún se están
+        # descargando) el id es aleatorio y el PDF se guarda en caché bajo ese id
+        if clave is None:
+            clave = uuid.uuid4().hex
+            futuro.add_done_callback(lambda f: self._guardar_trabajo(clave, f))
+        ahora = time.time()
+        with self._lock:
+            # Los pendientes no caducan: el registro es quien mantiene viva la tarea
+            self._trabajos = {k: t for k, t in self._trabajos.items()
+                              if not t[0].done() or ahora - t[1] < PDF_TRABAJOS_TTL}
+            self._trabajos[clave] = (futuro, ahora)
+        return clave
+
+    def _guardar_trabajo(self, clave, futuro):
+        if not futuro.cancelled() and futuro.exception() is None:
+            self.cache.guardar(clave, futuro.result())
+
+    def estado_trabajo(self, clave):
+        trabajo = self._trabajos.get(clave)
+        if trabajo is None:
+            return {"id": clave, "estado": "completado"} if self.cache.backend.get(clave) else None
+        futuro = trabajo[0]
+        if not futuro.done():
+            return {"id": clave, "estado": "pendiente"}
+        if futuro.cancelled():
+            return {"id": clave, "estado": "error", "error": "cancelado"}
+        if futuro.exception() is not None:
+            return {"id": clave, "estado": "error", "error": str(futuro.exception())}
+        return {"id": clave, "estado": "completado", "bytes": len(futuro.result())}
+
+    def resultado_trabajo(self, clave):
+        trabajo = self._trabajos.get(clave)
+        if trabajo is not None and trabajo[0].done() and not trabajo[0].cancelled() and trabajo[0].exception() is None:
+            return trabajo[0].result()
+        entrada = self.cache.backend.get(clave)
+        return entrada[0] if entrada else None
+
+    def estadisticas(self):
+        return {
+            "procesos": self.procesos,
+            "renderizados": self.renderizados,
+            "en_curso": len(self._vuelos),
+            "trabajos": len(self._trabajos),
+            "cache": self.cache.estadisticas(),
+        }
+
+    def calentar(self):
+        # Arranca ya los procesos del pool, con reportlab importado, para que el primer PDF no lo pague
+        with self._lock:
+            ejecutor = self._ejecutor()
+        for futuro in [ejecutor.submit(_precargar) for _ in range(self.procesos)]:
+            futuro.result()
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+generador_pdf = GeneradorPDF()
@@ -0,0 +1,167 @@
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# -------------------- CONFIGURACIÓN --------------------
+# METRICAS=0 desactiva la instrumentación: sin middleware ni cronómetros y /metrics responde 404
+METRICAS_ACTIVAS = os.environ.get("METRICAS", "1").lower() not in ("0", "false", "no")
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_BYTES = tuple(256 * 4 ** i for i in range(10))  # 256 B .. 64 MiB
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+
+def _numero(valor):
+    if valor == math.inf:
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+# -------------------- MÉTRICAS --------------------
+# Formato de exposición de Prometheus sin dependencias. Cada métrica guarda
+# una serie por combinación de valores de etiquetas; las actualizaciones son
+# un dict lookup y una suma bajo un lock. Los valores son por proceso (como
+# los contadores de la caché): con varios workers cada uno expone los suyos.
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series = {}
+        self._lock = threading.Lock()
+        _REGISTRO.append(self)
+
+    def _cabecera(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+    def exponer(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        lineas = self._cabecera()
+        for valores, valor in series:
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(valor)}")
+        return lineas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, *etiquetas, valor=1):
+        with self._lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0) + valor
+
+
+class Indicador(_Metrica):
+    tipo = "gauge"
+
+    def sumar(self, delta, *etiquetas):
+        with self._lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0) + delta
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, *etiquetas):
+        # Solo se incrementa el bucket que corresponde; los acumulados se calculan al exponer
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def exponer(self):
+        with self._lock:
+            series = sorted((valores, list(conteos), suma) for valores, (conteos, suma) in self._series.items())
+        lineas = self._cabecera()
+        nombres = self.etiquetas + ("le",)
+        for valores, conteos, suma in series:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (math.inf,), conteos):
+                acumulado += n
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, valores + (_numero(limite),))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+_REGISTRO = []
+
+
+def exponer():
+    return "\n".join(linea for metrica in _REGISTRO for linea in metrica.exponer()) + "\n"
+
+
+def reiniciar():
+    # Vacía todas las series; p. ej. tras las peticiones de calentamiento, que no son tráfico real
+    for metrica in _REGISTRO:
+        with metrica._lock:
+            metrica._series.clear()
+
+
+# -------------------- MÉTRICAS DEL SERVICIO --------------------
+http_segundos = Histograma("http_peticion_segundos", "Latencia de las peticiones HTTP por endpoint",
+                           ("metodo", "ruta", "estado"))
+http_bytes = Histograma("http_respuesta_bytes", "Tamaño del cuerpo de las respuestas por endpoint",
+                        ("ruta",), BUCKETS_BYTES)
+http_en_curso = Indicador("http_peticiones_en_curso", "Peticiones HTTP en curso", ("metodo",))
+etapa_segundos = Histograma("etapa_segundos",
+                            "Latencia por etapa: upstream, parseo, filtrado, serializacion, pdf", ("etapa",))
+upstream_respuestas = Contador("upstream_respuestas_total",
+                               "Respuestas del upstream por código (error: fallo de red o timeout; "
+                               "circuito_abierto: rechazada sin llamar)", ("codigo",))
+
+
+# -------------------- CRONÓMETROS --------------------
+class _Cronometro:
+    __slots__ = ("etapa", "inicio")
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        etapa_segundos.observar(time.perf_counter() - self.inicio, self.etapa)
+
+
+_NULO = nullcontext()
+
+
+def etapa(nombre):
+    """`with etapa("parseo"): ...` mide el bloque; no hace nada con las métricas desactivadas."""
+    return _Cronometro(nombre) if METRICAS_ACTIVAS else _NULO
+
+
+def observar_etapa(nombre, segundos):
+    if METRICAS_ACTIVAS:
+        etapa_segundos.observar(segundos, nombre)
+
+
+def contar_upstream(codigo):
+    if METRICAS_ACTIVAS:
+        upstream_respuestas.inc(str(codigo))
@@ -0,0 +1,65 @@
+import base64
+import itertools
+import json
+
+
+# -------------------- CURSORES --------------------
+def codificar_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        offset = int(json.loads(base64.urlsafe_b64decode(cursor + relleno))["offset"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Cursor de paginación no válido")
+    if offset < 0:
+        raise ValueError("Cursor de paginación no válido")
+    return offset
+
+
+# -------------------- PÁGINA --------------------
+class Pagina:
+    """Recorre `items` (iterable o async iterable) saltando `offset` y parando en `limite`.
+
+    Lee un elemento de más para saber si existe página siguiente sin tener
+    que contar el total.
+    """
+
+    def __init__(self, items, offset=0, limite=None):
+        self.items = items
+        self.offset = offset
+        self.limite = limite
+        self.devueltos = 0
+        self.hay_mas = False
+
+    def __iter__(self):
+        for item in itertools.islice(self.items, self.offset, None):
+            if self._completa():
+                return
+            self.devueltos += 1
+            yield item
+
+    async def __aiter__(self):
+        saltados = 0
+        async for item in self.items:
+            if saltados < self.offset:
+                saltados += 1
+                continue
+            if self._completa():
+                return
+            self.devueltos += 1
+            yield item
+
+    def _completa(self):
+        self.hay_mas = self.limite is not None and self.devueltos >= self.limite
+        return self.hay_mas
+
+    def metadatos(self):
+        return {
+            "offset": self.offset,
+            "limite": self.limite,
+            "devueltos": self.devueltos,
+            "siguiente_cursor": codificar_cursor(self.offset + self.devueltos) if self.hay_mas else None,
+        }
@@ -0,0 +1,226 @@
+import os
+import sys
+import xml.etree.ElementTree as ET
+from array import array
+from dataclasses import dataclass, field
+
+from clasificacion import clasificador_fases
+from criterios import Elegibilidad, parsear_criterios
+
+
+# -------------------- LECTOR RSS INCREMENTAL --------------------
+class LectorRSS:
+    """Parser incremental de feeds RSS de ClinicalTrials.gov.
+
+    Se alimenta con trozos de bytes a medida que llegan y devuelve cada
+    <item> como dict ligero en cuanto se cierra; el elemento se elimina del
+    árbol tras leerlo, así que la memoria no crece con el tamaño del feed.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._pila = []
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+        return self._leer()
+
+    def close(self):
+        self._parser.close()
+        return self._leer()
+
+    def _leer(self):
+        items = []
+        for evento, el in self._parser.read_events():
+            if evento == "start":
+                self._pila.append(el)
+                continue
+            self._pila.pop()
+            if el.tag == "item":
+                items.append({"titulo": el.findtext("title") or "", "link": el.findtext("link") or ""})
+                if self._pila:
+                    self._pila[-1].remove(el)
+        return items
+
+
+def iterar_items(chunks):
+    lector = LectorRSS()
+    for chunk in chunks:
+        yield from lector.feed(chunk)
+    yield from lector.close()
+
+
+async def aiterar_items(chunks):
+    lector = LectorRSS()
+    async for chunk in chunks:
+        for item in lector.feed(chunk):
+            yield item
+    for item in lector.close():
+        yield item
+
+
+# -------------------- CONSUMIDORES --------------------
+# Objetos con feed(chunk)/close() -> resultado, para ClienteUpstream.consumir:
+# el feed se procesa mientras se descarga y el resultado se comparte entre
+# las peticiones concurrentes a la misma URL.
+class ItemsRSS:
+    def __init__(self):
+        self._lector = LectorRSS()
+        self._items = []
+
+    def feed(self, chunk):
+        self._items.extend(self._lector.feed(chunk))
+
+    def close(self):
+        self._items.extend(self._lector.close())
+        return self._items
+
+
+class ConteoRSS:
+    def __init__(self):
+        self._lector = LectorRSS()
+        self._cantidad = 0
+
+    def feed(self, chunk):
+        self._cantidad += len(self._lector.feed(chunk))
+
+    def close(self):
+        self._cantidad += len(self._lector.close())
+        return self._cantidad
+
+
+class FasesRSS:
+    """Identificadores y códigos de fase (clasificacion.FASES) de los items del feed.
+
+    Cada trozo del feed se clasifica como un lote, con una sola pasada del
+    patrón de fases sobre todos sus títulos.
+    """
+
+    def __init__(self):
+        self._lector = LectorRSS()
+        self._ids = []
+        self._fases = array("b")
+
+    def _procesar(self, items):
+        self._ids.extend(item["link"].rstrip("/").split("/")[-1] for item in items)
+        self._fases.extend(clasificador_fases.clasificar([item["titulo"] for item in items]))
+
+    def feed(self, chunk):
+        self._procesar(self._lector.feed(chunk))
+
+    def close(self):
+        self._procesar(self._lector.close())
+        return self._ids, self._fases
+
+
+# -------------------- ESTUDIO (displayxml) --------------------
+NO_DISPONIBLE = "No disponible"
+INTERNAR = os.environ.get("PARSEO_INTERNAR", "1") != "0"
+
+
+@dataclass(slots=True)
+class RegistroEnsayo:
+    """Registro compacto de un estudio; compartido por todos los endpoints."""
+
+    id: str = NO_DISPONIBLE
+    titulo: str = NO_DISPONIBLE
+    resumen: str = NO_DISPONIBLE
+    estado: str = NO_DISPONIBLE
+    fase: str = NO_DISPONIBLE
+    tipo_estudio: str = NO_DISPONIBLE
+    patrocinador: str = NO_DISPONIBLE
+    fecha_inicio: str = NO_DISPONIBLE
+    condiciones: list = field(default_factory=list)
+    intervenciones: list = field(default_factory=list)
+    ubicaciones: list = field(default_factory=list)
+    paises: list = field(default_factory=list)
+    endpoints: list = field(default_factory=list)
+    criterios: str = NO_DISPONIBLE
+    elegibilidad: Elegibilidad = None
+
+    def a_dict(self):
+        return {
+            "id": self.id,
+            "titulo": self.titulo,
+            "resumen": self.resumen,
+            "estado": self.estado,
+            "fase": self.fase,
+            "tipo_estudio": self.tipo_estudio,
+            "patrocinador": self.patrocinador,
+            "fecha_inicio": self.fecha_inicio,
+            "condiciones": self.condiciones,
+            "intervenciones": self.intervenciones,
+            "ubicaciones": self.ubicaciones,
+            "paises": self.paises,
+            "endpoints": self.endpoints,
+            "criterios": self.criterios,
+            "elegibilidad": self.elegibilidad.a_dict() if self.elegibilidad is not None else None
+        }
+
+
+def _hijo(el, *ruta):
+    for tag in ruta:
+        el = el.find(tag) if el is not None else None
+    return el.text if el is not None else NO_DISPONIBLE
+
+
+def extraer_registro(root, internar=INTERNAR):
+    # Un único recorrido por los hijos directos de <clinical_study>; solo se baja
+    # a los subárboles que interesan, sin búsquedas ".//" sobre el árbol entero.
+    r = RegistroEnsayo()
+    texto = sys.intern if internar else str
+    titulo_breve = None
+    sexo = edad_minima = edad_maxima = None
+    paises = set()
+    for el in root:
+        tag = el.tag
+        if tag == "id_info":
+            r.id = _hijo(el, "nct_id")
+        elif tag == "official_title":
+            r.titulo = el.text
+        elif tag == "brief_title":
+            titulo_breve = el.text
+        elif tag == "brief_summary":
+            r.resumen = _hijo(el, "textblock")
+        elif tag == "overall_status":
+            r.estado = texto(el.text or "")
+        elif tag == "phase":
+            r.fase = texto(el.text or "")
+        elif tag == "study_type":
+            r.tipo_estudio = texto(el.text or "")
+        elif tag == "start_date":
+            r.fecha_inicio = el.text
+        elif tag == "sponsors":
+            r.patrocinador = texto(_hijo(el, "lead_sponsor", "agency") or "")
+        elif tag == "condition":
+            r.condiciones.append(texto(el.text or ""))
+        elif tag == "intervention":
+            nombre = el.find("intervention_name")
+            if nombre is not None:
+                r.intervenciones.append(nombre.text)
+        elif tag == "primary_outcome":
+            medida = el.find("measure")
+            if medida is not None and medida.text:
+                r.endpoints.append(medida.text)
+        elif tag == "eligibility":
+            r.criterios = _hijo(el, "criteria", "textblock")
+            sexo, edad_minima, edad_maxima = (el.findtext(t) for t in ("gender", "minimum_age", "maximum_age"))
+        elif tag == "location":
+            facility = el.find("facility")
+            if facility is not None:
+                nombre = facility.find("name")
+                if nombre is not None:
+                    r.ubicaciones.append(nombre.text)
+                pais = _hijo(facility, "address", "country")
+                if pais != NO_DISPONIBLE and pais:
+                    paises.add(texto(pais))
+    if r.titulo == NO_DISPONIBLE and titulo_breve:
+        r.titulo = titulo_breve
+    r.paises = sorted(paises)
+    # Se parsean una vez aquí; el índice guarda el resultado y las búsquedas por criterios no vuelven al texto
+    r.elegibilidad = parsear_criterios(r.criterios, sexo, edad_minima, edad_maxima)
+    return r
+
+
+def parsear_estudio(contenido):
+    return extraer_registro(ET.fromstring(contenido))
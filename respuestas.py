@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# -------------------- CONFIGURACIÓN --------------------
+COMPRESION_MIN_BYTES = int(os.environ.get("COMPRESION_MIN_BYTES", 1024))
+COMPRESION_NIVEL_GZIP = int(os.environ.get("COMPRESION_NIVEL_GZIP", 6))
+COMPRESION_CALIDAD_BROTLI = int(os.environ.get("COMPRESION_CALIDAD_BROTLI", 4))
+
+# PDF, Parquet y similares ya van comprimidos
+TIPOS_COMPRIMIBLES = ("application/json", "application/x-ndjson", "application/xml", "text/")
+
+
+# -------------------- JSON --------------------
+def volcar_json(obj, ordenar=False, default=None):
+    # JSON compacto en UTF-8; con orjson instalado, varias veces más rápido en respuestas grandes
+    if orjson is not None:
+        opciones = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if ordenar else 0)
+        return orjson.dumps(obj, default=default, option=opciones)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=ordenar,
+                      default=default).encode("utf-8")
+
+
+# -------------------- PETICIONES CONDICIONALES --------------------
+def etiqueta(cuerpo):
+    # ETag débil: la misma respuesta comprimida con gzip o brotli sigue siendo equivalente
+    return 'W/"' + hashlib.blake2b(cuerpo, digest_size=16).hexdigest() + '"'
+
+
+def coincide_etag(if_none_match, etag):
+    # Comparación débil de If-None-Match (RFC 9110 §13.1.2)
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    propia = etag.removeprefix("W/")
+    return any(candidata.strip().removeprefix("W/") == propia for candidata in if_none_match.split(","))
+
+
+# -------------------- COMPRESIÓN --------------------
+def codificacion_aceptada(accept_encoding):
+    # "br" si el cliente lo acepta y brotli está instalado, si no "gzip"; None si no acepta ninguna
+    calidades = {}
+    for parte in (accept_encoding or "").split(","):
+        nombre, _, parametros = parte.partition(";")
+        calidad = 1.0
+        parametros = parametros.strip().lower()
+        if parametros.startswith("q="):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        calidades[nombre.strip().lower()] = calidad
+    for codificacion in ("br", "gzip"):
+        if codificacion == "br" and brotli is None:
+            continue
+        if calidades.get(codificacion, calidades.get("*", 0)) > 0:
+            return codificacion
+    return None
+
+
+def comprimible(tipo_contenido, tamano=None):
+    # Sin tamaño (streaming) se comprime siempre; si no, solo a partir de COMPRESION_MIN_BYTES
+    if not tipo_contenido or not tipo_contenido.lower().startswith(TIPOS_COMPRIMIBLES):
+        return False
+    return tamano is None or tamano >= COMPRESION_MIN_BYTES
+
+
+def comprimir(cuerpo, codificacion):
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=COMPRESION_CALIDAD_BROTLI)
+    compresor = zlib.compressobj(COMPRESION_NIVEL_GZIP, zlib.DEFLATED, 31)
+    return compresor.compress(cuerpo) + compresor.flush()
+
+
+class Compresor:
+    """Compresión incremental para respuestas en streaming: cada trozo se
+    vacía al salir (Z_SYNC_FLUSH en gzip) para que el cliente reciba cada
+    línea NDJSON sin esperar a que se llene el buffer del compresor."""
+
+    def __init__(self, codificacion):
+        self.codificacion = codificacion
+        if codificacion == "br":
+            self._compresor = brotli.Compressor(quality=COMPRESION_CALIDAD_BROTLI)
+        else:
+            self._compresor = zlib.compressobj(COMPRESION_NIVEL_GZIP, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos):
+        if self.codificacion == "br":
+            return self._compresor.process(datos) + self._compresor.flush()
+        return self._compresor.compress(datos) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self):
+        if self.codificacion == "br":
+            return self._compresor.finish()
+        return self._compresor.flush()
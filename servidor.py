@@ -0,0 +1,108 @@
+"""Punto de entrada de producción para las dos apps.
+
+    python servidor.py flask --workers 4 --port 10000
+    python servidor.py fastapi --workers 4
+
+Con gunicorn instalado la app se importa una sola vez en el proceso maestro
+(preload) antes de abrir el puerto: los workers nacen por fork con módulos,
+vocabulario, patrones y tablas ya cargados, y un worker reciclado
+(SERVIDOR_MAX_PETICIONES) no vuelve a importar nada. Cada worker se calienta
+antes de aceptar su primera petición: abre conexiones con el upstream y
+recorre en proceso las rutas locales (Flask en post_fork, FastAPI en su
+lifespan). Sin gunicorn se arranca un único proceso: uvicorn para FastAPI y
+el servidor de Flask.
+
+Es también el arranque a usar para los PDFs: sus workers (forkserver) vuelven
+a ejecutar el script principal, que aquí es este módulo ligero. Con
+`python app.py` cada worker de PDF cargaría la app entera.
+"""
+import argparse
+import importlib
+import importlib.util
+import os
+import sys
+
+# -------------------- CONFIGURACIÓN --------------------
+PORT = int(os.environ.get("PORT", 10000))
+WORKERS = int(os.environ.get("SERVIDOR_WORKERS", os.cpu_count() or 1))
+HILOS = int(os.environ.get("SERVIDOR_HILOS", 8))  # hilos por worker de Flask (gthread)
+MAX_PETICIONES = int(os.environ.get("SERVIDOR_MAX_PETICIONES", 0))  # reciclar workers tras N peticiones; 0 = nunca
+TIMEOUT = int(os.environ.get("SERVIDOR_TIMEOUT", 60))
+
+APPS = {"flask": "app", "fastapi": "app_fastapi_export"}
+
+
+def cargar(nombre):
+    # La app FastAPI lee CALENTAR_AL_ARRANCAR al importarse: cada worker se calienta en su lifespan
+    os.environ.setdefault("CALENTAR_AL_ARRANCAR", "1")
+    return importlib.import_module(APPS[nombre])
+
+
+def clase_worker_asgi():
+    # uvicorn.workers está obsoleto en favor del paquete uvicorn-worker, si está instalado
+    if importlib.util.find_spec("uvicorn_worker") is not None:
+        return "uvicorn_worker.UvicornWorker"
+    return "uvicorn.workers.UvicornWorker"
+
+
+# -------------------- GUNICORN --------------------
+def servir_gunicorn(nombre, modulo, host, port, workers):
+    from gunicorn.app.base import BaseApplication
+
+    opciones = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "preload_app": True,
+        "timeout": TIMEOUT,
+        "max_requests": MAX_PETICIONES,
+        "max_requests_jitter": MAX_PETICIONES // 10,
+    }
+    if nombre == "flask":
+        # Tras el fork: conexiones propias con el upstream y rutas recorridas antes de entrar en el bucle
+        opciones.update(worker_class="gthread", threads=HILOS, post_fork=lambda servidor, worker: modulo.calentar())
+    else:
+        opciones["worker_class"] = clase_worker_asgi()
+
+    class Servidor(BaseApplication):
+        def load_config(self):
+            for clave, valor in opciones.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            return modulo.app
+
+    Servidor().run()
+
+
+# -------------------- SIN GUNICORN --------------------
+def servir_proceso_unico(nombre, modulo, host, port, workers):
+    if workers > 1:
+        print(f"gunicorn no está instalado: se ignora --workers {workers} y se usa un solo proceso",
+              file=sys.stderr)
+    if nombre == "fastapi":
+        import uvicorn
+
+        # El lifespan calienta antes de que uvicorn abra el puerto
+        uvicorn.run(modulo.app, host=host, port=port, backlog=4096, log_level="warning")
+    else:
+        modulo.calentar()
+        modulo.app.run(host=host, port=port, threaded=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", choices=APPS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    modulo = cargar(args.app)
+    if importlib.util.find_spec("gunicorn") is not None:
+        servir_gunicorn(args.app, modulo, args.host, args.port, args.workers)
+    else:
+        servir_proceso_unico(args.app, modulo, args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+
+# -------------------- SINGLE-FLIGHT (HILOS) --------------------
+class _Vuelo:
+    __slots__ = ("evento", "resultado", "error", "esperando")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    El primer hilo ejecuta `fn`; los que llegan mientras tanto esperan y
+    reciben el mismo resultado (o la misma excepción). Con `espera` (segundos)
+    quien espera se rinde con TimeoutError; la ejecución compartida sigue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vuelos = {}
+
+    def hacer(self, clave, fn, espera=None):
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+
+        if not lider:
+            if not vuelo.evento.wait(espera):
+                raise TimeoutError("Sin resultado de la llamada en curso")
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+
+        try:
+            vuelo.resultado = fn()
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.evento.set()
+
+    def abrir(self, clave):
+        # Para un resultado que el líder va entregando mientras lo obtiene (un stream) y no cabe en `hacer`:
+        # (vuelo, True) al líder, que lo cierra con `cerrar`; (vuelo, False) al resto, que espera su evento
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            if vuelo is not None:
+                vuelo.esperando += 1
+                return vuelo, False
+            vuelo = self._vuelos[clave] = _Vuelo()
+            return vuelo, True
+
+    def cerrar(self, clave, vuelo, resultado=None, error=None):
+        vuelo.resultado, vuelo.error = resultado, error
+        with self._lock:
+            del self._vuelos[clave]
+        vuelo.evento.set()
+
+    def en_vuelo(self):
+        return len(self._vuelos)
+
+
+# -------------------- SINGLE-FLIGHT (ASYNCIO) --------------------
+class _VueloAsync:
+    __slots__ = ("evento", "resultado", "error", "esperando")
+
+    def __init__(self):
+        self.evento = asyncio.Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class SingleFlightAsync:
+    """Versión asyncio: todos los llamantes esperan la misma tarea.
+
+    La tarea se protege con `asyncio.shield`, así que si el primer llamante se
+    cancela (cliente desconectado) los demás siguen recibiendo el resultado.
+    """
+
+    def __init__(self):
+        self._vuelos = {}
+
+    async def hacer(self, clave, fn):
+        tarea = self._vuelos.get(clave)
+        if tarea is None:
+            tarea = self._vuelos[clave] = asyncio.ensure_future(fn())
+            tarea.add_done_callback(lambda _: self._vuelos.pop(clave, None))
+        return await asyncio.shield(tarea)
+
+    def abrir(self, clave):
+        # Como SingleFlight.abrir; el resto espera con `await vuelo.evento.wait()`
+        vuelo = self._vuelos.get(clave)
+        if vuelo is not None:
+            vuelo.esperando += 1
+            return vuelo, False
+        vuelo = self._vuelos[clave] = _VueloAsync()
+        return vuelo, True
+
+    def cerrar(self, clave, vuelo, resultado=None, error=None):
+        vuelo.resultado, vuelo.error = resultado, error
+        del self._vuelos[clave]
+        vuelo.evento.set()
+
+    def en_vuelo(self):
+        return len(self._vuelos)
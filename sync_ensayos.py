@@ -0,0 +1,254 @@
+"""Sincronización incremental del índice local de ensayos.
+
+Descarga los estudios actualizados en ClinicalTrials.gov desde el último
+checkpoint, obtiene sus detalles en lotes paralelos bajo un límite de tasa y
+los guarda en el índice local (indice.py). Los IDs pendientes se persisten
+antes de descargarlos, así que una ejecución interrumpida retoma donde quedó.
+
+Cada ámbito (molécula/patología) lleva su propio checkpoint. Una corrida
+que parte de una sincronización completa previa del mismo ámbito (o con
+--completa) y termina sin descartes lo marca como cubierto: solo entonces
+las apps resuelven los filtros de /buscar_ensayos con el índice.
+
+    python sync_ensayos.py --completa --patologia vitiligo
+    python sync_ensayos.py --desde 2024-01-01 --patologia vitiligo
+    python sync_ensayos.py --continuo --intervalo 3600
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from indice import IndiceEnsayos, INDICE_RUTA, ambito
+from parseo import ItemsRSS, parsear_estudio
+from upstream import ClienteUpstream, url_cambios, url_estudio
+
+SYNC_LOTE = int(os.environ.get("SYNC_LOTE", 50))
+SYNC_WORKERS = int(os.environ.get("SYNC_WORKERS", 8))
+SYNC_TASA = float(os.environ.get("SYNC_TASA", 5))  # peticiones de detalle por segundo
+SYNC_MAX_INTENTOS = int(os.environ.get("SYNC_MAX_INTENTOS", 3))
+SYNC_DIAS_INICIALES = int(os.environ.get("SYNC_DIAS_INICIALES", 30))
+SYNC_MAXIMO = int(os.environ.get("SYNC_MAXIMO", 10000))  # estudios por corrida
+HISTORIAL_DESDE = date(1999, 1, 1)  # anterior a cualquier actualización del registro: corrida completa
+
+log = logging.getLogger("sync_ensayos")
+
+
+# -------------------- CHECKPOINT --------------------
+def clave_desde(ambito):
+    # El ámbito global conserva la clave de siempre; cada ámbito acotado lleva la suya
+    return "desde" if ambito == ("", "") else "desde:" + "|".join(ambito)
+
+
+class Checkpoint:
+    """Estado de la sincronización, guardado junto al índice."""
+
+    def __init__(self, ruta=INDICE_RUTA):
+        self.con = sqlite3.connect(ruta, timeout=10, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("CREATE TABLE IF NOT EXISTS sync_estado (clave TEXT PRIMARY KEY, valor TEXT)")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS sync_pendientes (nct_id TEXT PRIMARY KEY, intentos INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    def _leer(self, clave):
+        fila = self.con.execute("SELECT valor FROM sync_estado WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+    def _escribir(self, clave, valor):
+        self.con.execute("INSERT OR REPLACE INTO sync_estado VALUES (?, ?)", (clave, valor))
+
+    def desde(self, ambito=("", "")):
+        valor = self._leer(clave_desde(ambito))
+        return date.fromisoformat(valor) if valor else None
+
+    def objetivo(self):
+        valor = self._leer("objetivo")
+        return date.fromisoformat(valor) if valor else None
+
+    def ambito(self):
+        # Ámbito de la corrida en curso (se guarda al planificarla)
+        return tuple(self._leer("ambito").split("|", 1))
+
+    def sincronizado(self):
+        # Instante (epoch) que la corrida en curso dejará cubierto, o None si no será completa
+        valor = self._leer("sincronizado")
+        return float(valor) if valor else None
+
+    def hay_pendientes(self):
+        return self.con.execute("SELECT 1 FROM sync_pendientes LIMIT 1").fetchone() is not None
+
+    def planificar(self, nct_ids, objetivo, ambito=("", ""), sincronizado=None):
+        with self.con:
+            self.con.execute("BEGIN")
+            self.con.executemany("INSERT OR IGNORE INTO sync_pendientes (nct_id) VALUES (?)", [(i,) for i in nct_ids])
+            self._escribir("objetivo", objetivo.isoformat())
+            self._escribir("ambito", "|".join(ambito))
+            self._escribir("sincronizado", repr(sincronizado) if sincronizado is not None else "")
+
+    def siguiente_lote(self, tamano):
+        return [fila[0] for fila in self.con.execute(
+            "SELECT nct_id FROM sync_pendientes WHERE intentos < ? ORDER BY rowid LIMIT ?", (SYNC_MAX_INTENTOS, tamano)
+        )]
+
+    def completar(self, completados, fallidos):
+        with self.con:
+            self.con.execute("BEGIN")
+            self.con.executemany("DELETE FROM sync_pendientes WHERE nct_id = ?", [(i,) for i in completados])
+            self.con.executemany("UPDATE sync_pendientes SET intentos = intentos + 1 WHERE nct_id = ?",
+                                 [(i,) for i in fallidos])
+
+    def cerrar_corrida(self):
+        # Avanza el checkpoint; los IDs que agotaron sus intentos se descartan
+        with self.con:
+            self.con.execute("BEGIN")
+            descartados = self.con.execute("DELETE FROM sync_pendientes").rowcount
+            objetivo = self._leer("objetivo")
+            if objetivo:
+                self._escribir(clave_desde(self.ambito()), objetivo)
+            self.con.execute("DELETE FROM sync_estado WHERE clave IN ('objetivo', 'ambito', 'sincronizado')")
+        return descartados
+
+
+# -------------------- LÍMITE DE TASA --------------------
+class LimitadorTasa:
+    """Token bucket compartido entre los hilos de descarga."""
+
+    def __init__(self, por_segundo, rafaga=None):
+        self.intervalo = 1.0 / por_segundo
+        self.capacidad = rafaga or max(1.0, por_segundo)
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) / self.intervalo)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) * self.intervalo
+            time.sleep(espera)
+
+
+# -------------------- SINCRONIZACIÓN --------------------
+def sincronizar(indice, cliente, checkpoint, desde=None, molecula=None, patologia=None,
+                lote=SYNC_LOTE, workers=SYNC_WORKERS, tasa=SYNC_TASA, maximo=SYNC_MAXIMO, completa=False):
+    inicio = time.perf_counter()
+    limitador = LimitadorTasa(tasa)
+    corrida = ambito(molecula, patologia)
+
+    if checkpoint.hay_pendientes():
+        # La corrida interrumpida se termina tal como se planificó; lo pedido ahora queda para la siguiente
+        if desde or completa or checkpoint.ambito() != corrida:
+            log.warning("Hay una corrida interrumpida (ámbito %s): se retoma e ignora --desde, --completa "
+                        "y el ámbito de esta ejecución", checkpoint.ambito())
+        corrida = checkpoint.ambito()
+        log.info("Retomando corrida interrumpida (objetivo %s)", checkpoint.objetivo())
+    else:
+        if completa:
+            desde = HISTORIAL_DESDE
+        desde = desde or checkpoint.desde(corrida) or date.today() - timedelta(days=SYNC_DIAS_INICIALES)
+        objetivo, instante = date.today(), time.time()
+        # Un día de solape: las fechas de actualización del upstream no tienen hora
+        items = cliente.consumir(url_cambios(desde - timedelta(days=1), molecula, patologia, maximo), ItemsRSS)
+        nct_ids = list(dict.fromkeys(item["link"].rstrip("/").split("/")[-1] for item in items if item["link"]))
+        # La corrida deja el ámbito completo si no hay hueco de fechas (parte del principio del registro o de
+        # la última corrida completa) y el feed no se cortó en `maximo`
+        anterior = indice.sincronizado(corrida)
+        sin_hueco = desde <= HISTORIAL_DESDE or (anterior is not None and desde <= date.fromtimestamp(anterior))
+        if len(items) >= maximo:
+            log.warning("El feed llegó al máximo de %d estudios: el ámbito no quedará cubierto", maximo)
+        checkpoint.planificar(nct_ids, objetivo, corrida, instante if sin_hueco and len(items) < maximo else None)
+        log.info("%d estudios actualizados desde %s", len(nct_ids), desde)
+
+    def descargar(nct_id):
+        limitador.esperar()
+        try:
+            return nct_id, cliente.obtener(url_estudio(nct_id), parsear_estudio)
+        except Exception as e:
+            log.warning("No se pudo descargar %s: %s", nct_id, e)
+            return nct_id, None
+
+    guardados = fallidos = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync") as pool:
+        while True:
+            nct_ids = checkpoint.siguiente_lote(lote)
+            if not nct_ids:
+                break
+            inicio_lote = time.perf_counter()
+            resultados = list(pool.map(descargar, nct_ids))
+            registros = [r for _, r in resultados if r is not None]
+            indice.guardar(registros)
+            checkpoint.completar([i for i, r in resultados if r is not None], [i for i, r in resultados if r is None])
+            guardados += len(registros)
+            fallidos += len(nct_ids) - len(registros)
+            log.info("Lote de %d: %d guardados en %.2fs (%.1f registros/s)", len(nct_ids), len(registros),
+                     time.perf_counter() - inicio_lote, len(registros) / (time.perf_counter() - inicio_lote))
+
+    sincronizado = checkpoint.sincronizado()
+    descartados = checkpoint.cerrar_corrida()
+    # Un estudio descartado deja el índice incompleto para el ámbito hasta la próxima corrida completa
+    completo = sincronizado is not None and not descartados
+    if completo:
+        indice.registrar_cobertura(corrida, sincronizado)
+    else:
+        indice.retirar_cobertura(corrida)
+    duracion = time.perf_counter() - inicio
+    estadisticas = {
+        "guardados": guardados,
+        "fallos": fallidos,
+        "descartados": descartados,
+        "completo": completo,
+        "segundos": round(duracion, 2),
+        "registros_por_segundo": round(guardados / duracion, 2) if duracion else None,
+        "desde": checkpoint.desde(corrida).isoformat() if checkpoint.desde(corrida) else None,
+    }
+    log.info("Sincronización terminada: %s", estadisticas)
+    return estadisticas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--desde", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date(),
+                        help="Fecha inicial (YYYY-MM-DD); por defecto, la del checkpoint")
+    parser.add_argument("--completa", action="store_true",
+                        help="Descargar todo el historial del ámbito para que el índice lo cubra")
+    parser.add_argument("--molecula")
+    parser.add_argument("--patologia")
+    parser.add_argument("--lote", type=int, default=SYNC_LOTE)
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS)
+    parser.add_argument("--tasa", type=float, default=SYNC_TASA, help="Peticiones de detalle por segundo")
+    parser.add_argument("--maximo", type=int, default=SYNC_MAXIMO, help="Máximo de estudios por corrida")
+    parser.add_argument("--indice", default=INDICE_RUTA)
+    parser.add_argument("--continuo", action="store_true", help="Repetir la sincronización indefinidamente")
+    parser.add_argument("--intervalo", type=float, default=3600, help="Segundos entre corridas en modo continuo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    indice = IndiceEnsayos(args.indice)
+    checkpoint = Checkpoint(args.indice)
+    if checkpoint.hay_pendientes() and (args.desde or args.completa):
+        parser.error("hay una corrida interrumpida: termínela sin --desde ni --completa antes de pedir otra")
+    # Sin caché: la sincronización siempre quiere la versión actual de cada estudio
+    cliente = ClienteUpstream(max_concurrencia=args.workers, cache=None)
+
+    desde, completa = args.desde, args.completa
+    while True:
+        sincronizar(indice, cliente, checkpoint, desde, args.molecula, args.patologia,
+                    args.lote, args.workers, args.tasa, args.maximo, completa)
+        if not args.continuo:
+            break
+        desde, completa = None, False
+        time.sleep(args.intervalo)
+
+
+if __name__ == "__main__":
+    main()
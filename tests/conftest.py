@@ -0,0 +1,161 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+# Los módulos de la app viven en la raíz del repositorio, sin paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar las apps crea el índice y las cachés por defecto: fuera del árbol de trabajo
+_TEMPORAL = tempfile.mkdtemp(prefix="tests_ensayos_")
+for _variable, _fichero in (("INDICE_RUTA", "ensayos.sqlite3"), ("CACHE_RUTA", "cache_upstream.sqlite3"),
+                            ("PDF_CACHE_RUTA", "cache_pdf.sqlite3")):
+    os.environ.setdefault(_variable, os.path.join(_TEMPORAL, _fichero))
+
+
+# -------------------- UPSTREAM SIMULADO --------------------
+class UpstreamFalso:
+    """ClinicalTrials.gov sintético para las pruebas HTTP de las apps, con los documentos de
+    benchmarks/mock_upstream.py y sin red. `ausentes` contesta 404; `esperas` retrasa las URLs
+    que contienen la subcadena dada."""
+
+    def __init__(self, items=5):
+        self.items = items
+        self.ausentes = set()
+        self.esperas = {}
+        self.peticiones = []
+
+    def responder(self, url):
+        from benchmarks.mock_upstream import generar_estudio, generar_rss
+
+        self.peticiones.append(url)
+        partes = urlsplit(url)
+        consulta = parse_qs(partes.query)
+        if partes.path.endswith("/rss.xml"):
+            return 200, generar_rss(self.items, consulta.get("term", [""])[0], consulta.get("cond", [""])[0])
+        nct = partes.path.rsplit("/", 1)[-1]
+        if nct in self.ausentes:
+            return 404, b"Not Found"
+        return 200, generar_estudio(nct, 2)
+
+    def espera(self, url):
+        return max((segundos for clave, segundos in self.esperas.items() if clave in url), default=0)
+
+
+def adaptador_falso(upstream):
+    # Transporte de requests (cliente síncrono, app Flask)
+    import requests
+    from requests.adapters import BaseAdapter
+    from requests.structures import CaseInsensitiveDict
+
+    class AdaptadorFalso(BaseAdapter):
+        def send(self, request, **kwargs):
+            time.sleep(upstream.espera(request.url))
+            estado, cuerpo = upstream.responder(request.url)
+            response = requests.Response()
+            response.status_code = estado
+            response.headers = CaseInsensitiveDict({"Content-Type": "application/xml"})
+            response.raw = io.BytesIO(cuerpo)
+            response.url = request.url
+            response.request = request
+            return response
+
+        def close(self):
+            pass
+
+    return AdaptadorFalso()
+
+
+def transporte_falso(upstream):
+    # Transporte de httpx (cliente asíncrono, app FastAPI)
+    import httpx
+
+    async def responder(request):
+        await asyncio.sleep(upstream.espera(str(request.url)))
+        estado, cuerpo = upstream.responder(str(request.url))
+        return httpx.Response(estado, content=cuerpo, headers={"Content-Type": "application/xml"})
+
+    return httpx.MockTransport(responder)
+
+
+@pytest.fixture
+def upstream_falso():
+    return UpstreamFalso()
+
+
+@pytest.fixture
+def indice_vacio(tmp_path):
+    from indice import IndiceEnsayos
+
+    return IndiceEnsayos(str(tmp_path / "ensayos.sqlite3"))
+
+
+def cache_vacia():
+    from cache import BackendMemoria, CacheRespuestas
+
+    return CacheRespuestas(BackendMemoria())
+
+
+# -------------------- APPS --------------------
+@pytest.fixture
+def api_flask(monkeypatch, upstream_falso, indice_vacio):
+    # test_client() de la app Flask con su cliente upstream y su índice sustituidos
+    import app
+    from circuito import Circuito
+    from upstream import ClienteUpstream
+
+    cliente = ClienteUpstream(transporte=adaptador_falso(upstream_falso), cache=cache_vacia(), circuito=Circuito())
+    monkeypatch.setattr(app, "cliente", cliente)
+    monkeypatch.setattr(app, "indice", indice_vacio)
+    return app.app.test_client()
+
+
+@pytest.fixture
+def api_fastapi(monkeypatch, upstream_falso, indice_vacio):
+    # TestClient de la app FastAPI: el lifespan crea el cliente asíncrono sobre el transporte simulado
+    from fastapi.testclient import TestClient
+
+    import app_fastapi_export
+    from circuito import Circuito
+    from upstream import ClienteUpstreamAsync
+
+    monkeypatch.setattr(app_fastapi_export, "ClienteUpstreamAsync", lambda: ClienteUpstreamAsync(
+        transporte=transporte_falso(upstream_falso), cache=cache_vacia(), circuito=Circuito()))
+    monkeypatch.setattr(app_fastapi_export, "indice", indice_vacio)
+    with TestClient(app_fastapi_export.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture(params=["flask", "fastapi"])
+def api(request):
+    # Las dos apps exponen los mismos endpoints: las pruebas comunes corren contra ambas
+    return request.getfixturevalue(f"api_{request.param}")
+
+
+# -------------------- RESPUESTAS --------------------
+# Respuestas de Flask (werkzeug) y de TestClient (httpx, que ya descomprime) con la misma interfaz
+def cuerpo(respuesta):
+    if not hasattr(respuesta, "data"):
+        return respuesta.content
+    if respuesta.headers.get("Content-Encoding") == "gzip":
+        return gzip.decompress(respuesta.data)
+    if respuesta.headers.get("Content-Encoding") == "br":
+        import brotli
+        return brotli.decompress(respuesta.data)
+    return respuesta.data
+
+
+def datos(respuesta):
+    return json.loads(cuerpo(respuesta))
+
+
+def lineas(respuesta):
+    # NDJSON: un objeto por línea
+    return [json.loads(linea) for linea in cuerpo(respuesta).decode("utf-8").splitlines()]
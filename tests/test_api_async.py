@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+
+import app_fastapi_export
+from conftest import datos
+
+BUSQUEDA = "/buscar_ensayos?molecula=ruxolitinib&patologia=vitiligo"
+
+
+def test_busqueda_por_el_cliente_asincrono(api_fastapi, upstream_falso):
+    respuesta = api_fastapi.get(BUSQUEDA)
+    assert respuesta.status_code == 200
+    resultado = datos(respuesta)
+    assert resultado["fuente"] == "upstream"
+    assert [e["identificador"] for e in resultado["ensayos"]] == [f"NCT{i:08d}" for i in range(5)]
+    assert resultado["ensayos"][2]["fase"] == "3"
+    assert upstream_falso.peticiones == [
+        "https://clinicaltrials.gov/ct2/results/rss.xml?term=ruxolitinib&cond=vitiligo"]
+
+
+def test_detalle_se_cachea_e_indexa(api_fastapi, upstream_falso, indice_vacio):
+    primera = datos(api_fastapi.get("/ensayo_detalle?id=NCT00000001"))
+    segunda = datos(api_fastapi.get("/ensayo_detalle?id=NCT00000001"))
+    assert primera == segunda
+    assert primera["id"] == "NCT00000001" and primera["paises"] == ["France", "Spain"]
+    assert len(upstream_falso.peticiones) == 1
+    assert indice_vacio.estados(["NCT00000001"]) == ["Recruiting"]
+
+
+def test_detalle_inexistente_devuelve_error(api_fastapi, upstream_falso):
+    upstream_falso.ausentes.add("NCT09999999")
+    resultado = datos(api_fastapi.get("/ensayo_detalle?id=NCT09999999"))
+    assert resultado["error"].startswith("No se pudo obtener el detalle del ensayo")
+
+
+def test_peticiones_concurrentes_comparten_descarga(api_fastapi, upstream_falso):
+    # En el mismo event loop que la app: las 5 búsquedas esperan una única descarga
+    upstream_falso.esperas["rss.xml"] = 0.05
+
+    async def buscar_a_la_vez():
+        transporte = httpx.ASGITransport(app=app_fastapi_export.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://api.test") as cliente:
+            return await asyncio.gather(*(cliente.get(BUSQUEDA) for _ in range(5)))
+
+    respuestas = api_fastapi.portal.call(buscar_a_la_vez)
+    assert [r.status_code for r in respuestas] == [200] * 5
+    assert len({r.content for r in respuestas}) == 1
+    assert len(upstream_falso.peticiones) == 1
@@ -0,0 +1,34 @@
+from conftest import datos
+
+
+def test_sugerencias_por_prefijo_y_sinonimo(api):
+    respuesta = api.get("/autocompletar?q=sema")
+    assert respuesta.status_code == 200
+    assert datos(respuesta) == {"q": "sema", "sugerencias": [
+        {"termino": "semaglutide", "tipo": "molecula", "coincide": "semaglutida"}]}
+
+
+def test_filtra_por_tipo_y_limita(api):
+    sugerencias = datos(api.get("/autocompletar?q=cánc&tipo=patologia&limite=2"))["sugerencias"]
+    assert [s["termino"] for s in sugerencias] == ["cancer", "breast cancer"]
+    assert {s["tipo"] for s in sugerencias} == {"patologia"}
+
+
+def test_sin_coincidencias(api):
+    assert datos(api.get("/autocompletar?q=zzzz"))["sugerencias"] == []
+
+
+def test_parametros_no_validos(api):
+    # Flask contesta 400 y FastAPI 422 (validación de los parámetros)
+    for url in ("/autocompletar", "/autocompletar?q=a&tipo=gen", "/autocompletar?q=a&limite=0",
+                "/autocompletar?q=a&limite=1000"):
+        assert api.get(url).status_code in (400, 422), url
+
+
+def test_busqueda_con_sinonimos_comparte_url(api, upstream_falso):
+    # "semaglutida" y "Semaglutide" son la misma búsqueda: una sola descarga
+    primera = datos(api.get("/buscar_ensayos?molecula=semaglutida&patologia=Diabetes tipo 2"))
+    segunda = datos(api.get("/buscar_ensayos?molecula=Semaglutide&patologia=type 2 diabetes"))
+    assert primera == segunda
+    assert upstream_falso.peticiones == [
+        "https://clinicaltrials.gov/ct2/results/rss.xml?term=semaglutide&cond=type+2+diabetes"]
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from conftest import datos
+
+
+def test_compara_n_moleculas(api, upstream_falso):
+    resultado = datos(api.get("/comparar_moleculas?moleculas=ruxolitinib,baricitinib,tofacitinib"
+                              "&patologia=vitiligo"))
+    assert resultado["completo"] is True
+    assert set(resultado["resultados"]) == {"ruxolitinib", "baricitinib", "tofacitinib"}
+    for r in resultado["resultados"].values():
+        assert r["ensayos"] == 5 and r["desde_cache"] is False
+    assert "ruxolitinib" not in resultado  # claves de primer nivel solo en la forma antigua
+    assert len(upstream_falso.peticiones) == 3
+
+
+def test_forma_antigua_y_cache(api):
+    url = "/comparar_moleculas?molecula1=ruxolitinib&molecula2=baricitinib&patologia=vitiligo"
+    datos(api.get(url))
+    resultado = datos(api.get(url))
+    assert resultado["ruxolitinib"] == resultado["baricitinib"] == 5
+    assert all(r["desde_cache"] for r in resultado["resultados"].values())
+
+
+def test_resultado_parcial_al_vencer_el_deadline(api, upstream_falso):
+    upstream_falso.esperas["term=baricitinib"] = 1
+    resultado = datos(api.get("/comparar_moleculas?moleculas=ruxolitinib,baricitinib&patologia=vitiligo"
+                              "&timeout=0.2"))
+    assert resultado["completo"] is False
+    assert resultado["resultados"]["ruxolitinib"]["ensayos"] == 5
+    lenta = resultado["resultados"]["baricitinib"]
+    assert lenta["ensayos"] is None and lenta["error"] == "Sin respuesta en 0.2s"
+
+
+def test_error_por_molecula(api, upstream_falso, monkeypatch):
+    responder = upstream_falso.responder
+
+    def fallar_baricitinib(url):
+        return (404, b"Not Found") if "term=baricitinib" in url else responder(url)
+
+    monkeypatch.setattr(upstream_falso, "responder", fallar_baricitinib)
+    resultado = datos(api.get("/comparar_moleculas?moleculas=ruxolitinib,baricitinib&patologia=vitiligo"))
+    assert resultado["completo"] is False
+    assert resultado["resultados"]["ruxolitinib"]["ensayos"] == 5
+    assert "404" in resultado["resultados"]["baricitinib"]["error"]
+
+
+def test_timeout_acotado(api, upstream_falso, monkeypatch):
+    import app
+    import app_fastapi_export
+
+    for modulo in (app, app_fastapi_export):
+        monkeypatch.setattr(modulo, "COMPARAR_DEADLINE_MAX", 0.2)
+    upstream_falso.esperas["term=baricitinib"] = 1
+    resultado = datos(api.get("/comparar_moleculas?moleculas=ruxolitinib,baricitinib&patologia=vitiligo"
+                              "&timeout=3600"))
+    assert resultado["resultados"]["baricitinib"]["error"] == "Sin respuesta en 0.2s"
+    assert api.get("/comparar_moleculas?moleculas=ruxolitinib,baricitinib&patologia=vitiligo"
+                   "&timeout=0").status_code in (400, 422)
+
+
+def test_concurrencia_por_peticion_y_sin_hilos_sueltos(api_flask, upstream_falso, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "COMPARAR_PARALELO", 2)
+    simultaneas = maximo = 0
+    lock = threading.Lock()
+    responder = upstream_falso.responder
+
+    def contar_simultaneas(url):
+        nonlocal simultaneas, maximo
+        with lock:
+            simultaneas += 1
+            maximo = max(maximo, simultaneas)
+        time.sleep(0.05)
+        with lock:
+            simultaneas -= 1
+        return responder(url)
+
+    monkeypatch.setattr(upstream_falso, "responder", contar_simultaneas)
+    moleculas = ",".join(f"molecula{i}" for i in range(6))
+    assert datos(api_flask.get(f"/comparar_moleculas?moleculas={moleculas}&patologia=vitiligo"))["completo"]
+    assert maximo == 2
+    # Al vencer el plazo la respuesta sale y los hilos de la petición ya han terminado
+    upstream_falso.esperas["term=baricitinib"] = 1
+    api_flask.get("/comparar_moleculas?moleculas=ruxolitinib,baricitinib&patologia=vitiligo&timeout=0.2")
+    assert not any(hilo.name.startswith("comparar") for hilo in threading.enumerate())
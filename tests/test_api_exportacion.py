@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+URL = "/exportar_ensayos_csv?molecula=ruxolitinib&patologia=vitiligo"
+
+
+def test_csv_sin_detalle_por_defecto(api_fastapi, upstream_falso):
+    respuesta = api_fastapi.get(URL)
+    assert respuesta.status_code == 200
+    assert len(respuesta.text.strip().splitlines()) == 1 + 5
+    # Solo la búsqueda: sin una descarga de detalle por fila
+    assert len(upstream_falso.peticiones) == 1
+
+
+def test_csv_con_detalle_a_peticion(api_fastapi, upstream_falso):
+    api_fastapi.get(URL + "&detalle=true")
+    assert len(upstream_falso.peticiones) == 1 + 5
+
+
+def test_pdf_en_modo_trabajo_calcula_los_avisos_una_vez(api_fastapi, monkeypatch):
+    pytest.importorskip("reportlab")
+    import app_fastapi_export
+
+    llamadas = []
+    avisos_busqueda = app_fastapi_export.avisos_busqueda
+
+    async def contar_avisos(*args):
+        llamadas.append(args)
+        return await avisos_busqueda(*args)
+
+    monkeypatch.setattr(app_fastapi_export, "avisos_busqueda", contar_avisos)
+    respuesta = api_fastapi.get("/exportar_ensayos_pdf?molecula=ruxolitinib&patologia=vitiligo&estado=Recruiting"
+                                "&modo=trabajo")
+    assert respuesta.status_code == 202
+    trabajo = respuesta.json()
+    assert trabajo["filtros_no_aplicados"] == ["estado"]
+    limite = time.monotonic() + 30
+    while (estado := api_fastapi.get(trabajo["estado_url"]).json())["estado"] == "pendiente":
+        assert time.monotonic() < limite
+        time.sleep(0.05)
+    assert estado["estado"] == "completado"
+    assert api_fastapi.get(trabajo["descarga_url"]).content.startswith(b"%PDF")
+    assert len(llamadas) == 1
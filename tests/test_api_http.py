@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import cuerpo, datos, lineas
+from metricas import reiniciar
+
+BUSQUEDA = "/buscar_ensayos?molecula=ruxolitinib&patologia=vitiligo"
+SIN_COMPRESION = {"Accept-Encoding": "identity"}
+
+
+@pytest.fixture
+def upstream_grande(upstream_falso):
+    # Respuestas por encima de COMPRESION_MIN_BYTES
+    upstream_falso.items = 30
+    return upstream_falso
+
+
+def test_etag_y_304(api):
+    respuesta = api.get(BUSQUEDA, headers=SIN_COMPRESION)
+    etag = respuesta.headers["ETag"]
+    assert etag.startswith('W/"')
+    no_modificada = api.get(BUSQUEDA, headers={**SIN_COMPRESION, "If-None-Match": etag})
+    assert no_modificada.status_code == 304
+    assert cuerpo(no_modificada) == b""
+    assert no_modificada.headers["ETag"] == etag
+    # Comparación débil: vale también sin el prefijo W/
+    assert api.get(BUSQUEDA, headers={"If-None-Match": etag[2:]}).status_code == 304
+    assert api.get(BUSQUEDA, headers={"If-None-Match": 'W/"otra"'}).status_code == 200
+
+
+def test_sin_etag_en_errores_ni_en_streaming(api):
+    error = api.get("/ensayo_detalle")
+    assert error.status_code in (400, 422)  # validación de Flask / de FastAPI
+    assert "ETag" not in error.headers
+    assert "ETag" not in api.get(BUSQUEDA + "&formato=ndjson").headers
+
+
+def test_gzip_en_respuestas_completas(api, upstream_grande):
+    respuesta = api.get(BUSQUEDA, headers={"Accept-Encoding": "gzip"})
+    assert respuesta.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in respuesta.headers["Vary"]
+    assert len(datos(respuesta)["ensayos"]) == 30
+    # El ETag es el mismo con y sin compresión
+    identidad = api.get(BUSQUEDA, headers=SIN_COMPRESION)
+    assert "Content-Encoding" not in identidad.headers
+    assert identidad.headers["ETag"] == respuesta.headers["ETag"]
+    assert int(identidad.headers["Content-Length"]) > int(respuesta.headers["Content-Length"])
+
+
+def test_respuestas_pequenas_sin_comprimir(api):
+    respuesta = api.get("/analisis_endpoint?patologia=vitiligo", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in respuesta.headers
+
+
+def test_gzip_en_streaming(api, upstream_grande):
+    respuesta = api.get(BUSQUEDA + "&formato=ndjson", headers={"Accept-Encoding": "gzip"})
+    assert respuesta.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in respuesta.headers
+    assert len(lineas(respuesta)) == 30
+
+
+def test_brotli_si_esta_instalado(api, upstream_grande):
+    pytest.importorskip("brotli")
+    respuesta = api.get(BUSQUEDA, headers={"Accept-Encoding": "gzip, br"})
+    assert respuesta.headers["Content-Encoding"] == "br"
+    assert len(datos(respuesta)["ensayos"]) == 30
+
+
+def test_metricas_ven_el_304_y_los_bytes_comprimidos(api, upstream_grande):
+    # Orden de los middlewares: las métricas quedan por fuera de la negociación
+    reiniciar()
+    etag = api.get(BUSQUEDA, headers=SIN_COMPRESION).headers["ETag"]
+    api.get(BUSQUEDA, headers={**SIN_COMPRESION, "If-None-Match": etag})
+    comprimida = api.get(BUSQUEDA, headers={"Accept-Encoding": "gzip"})
+    texto = api.get("/metrics").text
+    reiniciar()
+    assert 'http_peticion_segundos_count{metodo="GET",ruta="/buscar_ensayos",estado="304"} 1' in texto
+    assert 'http_peticion_segundos_count{metodo="GET",ruta="/buscar_ensayos",estado="200"} 2' in texto
+    # El 304 sale sin cuerpo y la respuesta comprimida cuenta lo que se envía
+    total = len(cuerpo(comprimida)) + int(comprimida.headers["Content-Length"])
+    suma = next(linea for linea in texto.splitlines()
+                if linea.startswith('http_respuesta_bytes_sum{ruta="/buscar_ensayos"}'))
+    assert float(suma.rsplit(" ", 1)[1]) == total
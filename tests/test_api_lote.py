@@ -0,0 +1,39 @@
+from conftest import datos, lineas
+
+
+def test_lote_separa_detalles_y_errores(api, upstream_falso):
+    upstream_falso.ausentes.add("NCT09999999")
+    respuesta = api.post("/ensayos_detalle", json={"ids": ["NCT00000001", "NCT09999999", " NCT00000001 "]})
+    assert respuesta.status_code == 200
+    resultado = datos(respuesta)
+    assert list(resultado["ensayos"]) == ["NCT00000001"]
+    assert resultado["ensayos"]["NCT00000001"]["titulo"] == "Official title of NCT00000001"
+    assert list(resultado["errores"]) == ["NCT09999999"]
+    assert "404" in resultado["errores"]["NCT09999999"]
+    # Ids repetidos: una sola descarga
+    assert len(upstream_falso.peticiones) == 2
+
+
+def test_lote_ndjson_una_linea_por_id(api, upstream_falso):
+    upstream_falso.ausentes.add("NCT09999999")
+    upstream_falso.esperas["NCT00000001"] = 0.1
+    respuesta = api.post("/ensayos_detalle?formato=ndjson", json={"ids": ["NCT00000001", "NCT09999999", "NCT00000002"]})
+    assert respuesta.headers["Content-Type"].startswith("application/x-ndjson")
+    resultados = lineas(respuesta)
+    # En orden de llegada: el lento sale el último
+    assert [r["id"] for r in resultados][-1] == "NCT00000001"
+    por_id = {r["id"]: r for r in resultados}
+    assert set(por_id) == {"NCT00000001", "NCT09999999", "NCT00000002"}
+    assert por_id["NCT00000002"]["detalle"]["id"] == "NCT00000002"
+    assert "error" in por_id["NCT09999999"] and "detalle" not in por_id["NCT09999999"]
+
+
+def test_lote_rechaza_listas_vacias_o_demasiado_largas(api, monkeypatch):
+    import app
+    import app_fastapi_export
+
+    monkeypatch.setattr(app, "DETALLE_MAX_IDS", 2)
+    monkeypatch.setattr(app_fastapi_export, "DETALLE_MAX_IDS", 2)
+    assert datos(api.post("/ensayos_detalle", json={"ids": [" "]})) == {"error": "La lista 'ids' está vacía"}
+    resultado = datos(api.post("/ensayos_detalle", json={"ids": ["NCT1", "NCT2", "NCT3"]}))
+    assert resultado == {"error": "Máximo 2 identificadores por petición"}
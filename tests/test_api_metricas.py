@@ -0,0 +1,59 @@
+import pytest
+
+from metricas import TIPO_CONTENIDO, reiniciar
+
+BUSQUEDA = "/buscar_ensayos?molecula=ruxolitinib&patologia=vitiligo"
+
+
+@pytest.fixture(autouse=True)
+def metricas_vacias():
+    reiniciar()
+    yield
+    reiniciar()
+
+
+def valores(api, nombre):
+    # {"etiquetas": valor} de las series de `nombre` en /metrics
+    respuesta = api.get("/metrics")
+    assert respuesta.headers["Content-Type"] == TIPO_CONTENIDO
+    series = {}
+    for linea in respuesta.text.splitlines():
+        if linea.startswith(nombre + "{"):
+            etiquetas, valor = linea[len(nombre):].rsplit(" ", 1)
+            series[etiquetas] = float(valor)
+    return series
+
+
+def test_latencia_por_plantilla_de_ruta_y_estado(api):
+    api.get(BUSQUEDA)
+    api.get(BUSQUEDA.replace("ruxolitinib", "baricitinib"))
+    api.get("/ensayo_detalle?id=NCT00000001")
+    api.get("/trabajos_pdf/no-existe")
+    api.get("/no_existe")
+    conteos = valores(api, "http_peticion_segundos_count")
+    assert conteos['{metodo="GET",ruta="/buscar_ensayos",estado="200"}'] == 2
+    assert conteos['{metodo="GET",ruta="/ensayo_detalle",estado="200"}'] == 1
+    # La ruta es la plantilla, no la URL: el id no crea series nuevas
+    trabajos = [etiquetas for etiquetas in conteos if "trabajos_pdf" in etiquetas]
+    assert len(trabajos) == 1 and "no-existe" not in trabajos[0] and 'estado="404"' in trabajos[0]
+    assert conteos['{metodo="GET",ruta="sin_ruta",estado="404"}'] == 1
+    assert not any("molecula=" in etiquetas for etiquetas in conteos)
+
+
+def test_bytes_y_peticiones_en_curso(api):
+    respuesta = api.get(BUSQUEDA)
+    tamano = int(respuesta.headers["Content-Length"])
+    assert valores(api, "http_respuesta_bytes_sum")['{ruta="/buscar_ensayos"}'] == tamano
+    # Solo queda en curso la propia petición a /metrics
+    assert valores(api, "http_peticiones_en_curso")['{metodo="GET"}'] == 1
+
+
+def test_upstream_y_etapas(api, upstream_falso):
+    upstream_falso.ausentes.add("NCT09999999")
+    api.get(BUSQUEDA)
+    api.get("/ensayo_detalle?id=NCT09999999")
+    codigos = valores(api, "upstream_respuestas_total")
+    assert codigos == {'{codigo="200"}': 1, '{codigo="404"}': 1}
+    etapas = valores(api, "etapa_segundos_count")
+    for nombre in ("upstream", "parseo", "filtrado", "serializacion"):
+        assert etapas[f'{{etapa="{nombre}"}}'] >= 1
@@ -0,0 +1,57 @@
+import json
+
+from conftest import cuerpo, datos, lineas
+
+BUSQUEDA = "/buscar_ensayos?molecula=ruxolitinib&patologia=vitiligo"
+IDS = [f"NCT{i:08d}" for i in range(5)]
+
+
+def test_ndjson_un_ensayo_por_linea(api):
+    respuesta = api.get(BUSQUEDA + "&formato=ndjson")
+    assert respuesta.status_code == 200
+    assert respuesta.headers["Content-Type"].startswith("application/x-ndjson")
+    assert cuerpo(respuesta).endswith(b"\n")
+    # Sin paginación ni avisos no hay línea final
+    assert [e["identificador"] for e in lineas(respuesta)] == IDS
+
+
+def test_ndjson_recorre_las_paginas_con_el_cursor(api):
+    vistos, url = [], BUSQUEDA + "&formato=ndjson&limite=2"
+    for _ in range(3):
+        *ensayos, final = lineas(api.get(url))
+        vistos += [e["identificador"] for e in ensayos]
+        cursor = final["paginacion"]["siguiente_cursor"]
+        if cursor is None:
+            break
+        url = BUSQUEDA + f"&formato=ndjson&limite=2&cursor={cursor}"
+    assert vistos == IDS
+    assert final["paginacion"] == {"offset": 4, "limite": 2, "devueltos": 1, "siguiente_cursor": None}
+
+
+def test_ndjson_avisos_en_la_linea_final(api):
+    *ensayos, final = lineas(api.get(BUSQUEDA + "&formato=ndjson&estado=reclutando&fase=3"))
+    assert [e["identificador"] for e in ensayos] == ["NCT00000002"]
+    assert final == {"filtros_no_aplicados": ["estado"]}
+
+
+def test_json_stream_es_un_unico_objeto(api):
+    respuesta = api.get(BUSQUEDA + "&formato=json_stream&limite=3")
+    assert respuesta.headers["Content-Type"].startswith("application/json")
+    resultado = json.loads(cuerpo(respuesta))
+    assert [e["identificador"] for e in resultado["ensayos"]] == IDS[:3]
+    assert resultado["paginacion"]["devueltos"] == 3
+    siguiente = datos(api.get(BUSQUEDA + f"&formato=json_stream&cursor={resultado['paginacion']['siguiente_cursor']}"))
+    assert [e["identificador"] for e in siguiente["ensayos"]] == IDS[3:]
+
+
+def test_json_stream_sin_resultados(api, upstream_falso):
+    upstream_falso.items = 0
+    resultado = datos(api.get(BUSQUEDA + "&formato=json_stream&pais=spain"))
+    assert resultado["ensayos"] == []
+    assert resultado["filtros_no_aplicados"] == ["pais"]
+
+
+def test_cursor_no_valido(api_flask):
+    respuesta = api_flask.get(BUSQUEDA + "&formato=ndjson&cursor=no-es-un-cursor")
+    assert respuesta.status_code == 400
+    assert datos(respuesta) == {"error": "Cursor de paginación no válido"}
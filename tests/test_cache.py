@@ -0,0 +1,75 @@
+import pytest
+
+import cache as modulo_cache
+from cache import BackendMemoria, BackendSQLite, CacheRespuestas, normalizar_url
+
+RSS = "https://clinicaltrials.gov/ct2/results/rss.xml?term=ruxolitinib&cond=vitiligo"
+ESTUDIO = "https://clinicaltrials.gov/ct2/show/NCT00000001?displayxml=true"
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return BackendSQLite(str(tmp_path / "cache.sqlite3"), max_entradas=3)
+    return BackendMemoria(max_entradas=3)
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    # Reloj manual para la frescura: avanzar con reloj["t"] += segundos
+    reloj = {"t": 1_000_000.0}
+    monkeypatch.setattr(modulo_cache.time, "time", lambda: reloj["t"])
+    return reloj
+
+
+def test_normalizar_url_ordena_parametros_y_colapsa_espacios():
+    assert normalizar_url("HTTPS://ClinicalTrials.gov/x?term=a%20%20b&cond=c") == \
+        normalizar_url("https://clinicaltrials.gov/x?cond=c&term=a+b")
+
+
+def test_lru_desaloja_la_entrada_menos_usada(backend):
+    for i in range(3):
+        backend.set(f"k{i}", b"v", 0.0)
+    backend.get("k0")  # k0 pasa a ser la más reciente
+    assert backend.set("k3", b"v", 0.0) == 1
+    assert backend.get("k1") is None
+    assert backend.get("k0") is not None
+    assert len(backend) == 3
+
+
+def test_ttl_distinto_para_busquedas_y_estudios(backend, reloj):
+    cache = CacheRespuestas(backend, ttl_busqueda=10, ttl_estudio=100)
+    cache.guardar(RSS, b"feed")
+    cache.guardar(ESTUDIO, b"estudio")
+    reloj["t"] += 50
+    assert cache.obtener(RSS) is None
+    assert cache.obtener(ESTUDIO) == b"estudio"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_obsoleto_sirve_copias_caducadas_hasta_el_limite(backend, reloj):
+    cache = CacheRespuestas(backend, ttl_busqueda=10, max_obsolescencia=60)
+    cache.guardar(RSS, b"feed")
+    reloj["t"] += 30
+    assert cache.obtener(RSS) is None
+    assert cache.obtener_obsoleto(RSS) == (b"feed", 30)
+    reloj["t"] += 60
+    assert cache.obtener_obsoleto(RSS) is None
+
+
+def test_revalidar_renueva_la_copia_con_sus_validadores(backend, reloj):
+    cache = CacheRespuestas(backend, ttl_busqueda=10)
+    cache.guardar(RSS, b"feed", ('"abc"', "Mon, 01 Jan 2024 00:00:00 GMT"))
+    reloj["t"] += 30
+    assert cache.condiciones(RSS) == {"If-None-Match": '"abc"',
+                                      "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    assert cache.revalidar(RSS) == b"feed"
+    assert cache.obtener(RSS) == b"feed"
+    assert cache.condiciones(RSS)["If-None-Match"] == '"abc"'
+
+
+def test_sin_validadores_no_hay_get_condicional(backend):
+    cache = CacheRespuestas(backend)
+    cache.guardar(RSS, b"feed")
+    assert cache.condiciones(RSS) == {}
+    assert cache.revalidar(ESTUDIO) is None
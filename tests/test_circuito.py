@@ -0,0 +1,117 @@
+import io
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+import circuito as modulo_circuito
+from cache import BackendMemoria, CacheRespuestas
+from circuito import ABIERTO, CERRADO, SEMIABIERTO, Circuito, CircuitoAbierto
+from upstream import ClienteUpstream
+
+URL = "http://upstream.test/ct2/results/rss.xml?cond=vitiligo"
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = {"t": 1000.0}
+    monkeypatch.setattr(modulo_circuito.time, "monotonic", lambda: reloj["t"])
+    return reloj
+
+
+def abrir(circuito):
+    for _ in range(circuito.umbral):
+        circuito.registrar(False, circuito.entrar())
+
+
+# -------------------- ESTADOS --------------------
+def test_se_abre_tras_umbral_de_fallos_consecutivos(reloj):
+    circuito = Circuito(umbral=3, espera=30)
+    circuito.registrar(False)
+    circuito.registrar(False)
+    circuito.registrar(True)  # un éxito reinicia la cuenta
+    circuito.registrar(False)
+    circuito.registrar(False)
+    assert circuito.estado == CERRADO
+    circuito.registrar(False)
+    assert circuito.estado == ABIERTO
+    with pytest.raises(CircuitoAbierto) as error:
+        circuito.entrar()
+    assert error.value.reintentar_en == 30
+    assert circuito.estadisticas()["rechazadas"] == 1
+
+
+def test_semiabierto_deja_pasar_las_sondas_y_se_cierra_con_un_exito(reloj):
+    circuito = Circuito(umbral=1, espera=30, sondas=1)
+    abrir(circuito)
+    reloj["t"] += 30
+    assert circuito.estado == SEMIABIERTO
+    sonda = circuito.entrar()
+    assert sonda is True
+    with pytest.raises(CircuitoAbierto):
+        circuito.entrar()  # solo una sonda a la vez
+    circuito.registrar(True, sonda)
+    assert circuito.estado == CERRADO
+
+
+def test_sonda_fallida_vuelve_a_abrir(reloj):
+    circuito = Circuito(umbral=1, espera=30)
+    abrir(circuito)
+    reloj["t"] += 30
+    circuito.registrar(False, circuito.entrar())
+    assert circuito.estado == ABIERTO
+    assert circuito.estadisticas()["aperturas"] == 2
+
+
+def test_sonda_cancelada_libera_su_plaza(reloj):
+    circuito = Circuito(umbral=1, espera=30)
+    abrir(circuito)
+    reloj["t"] += 30
+    circuito.registrar(None, circuito.entrar())
+    assert circuito.estado == SEMIABIERTO
+    assert circuito.entrar() is True
+
+
+def test_exito_tardio_no_cierra_un_circuito_abierto(reloj):
+    circuito = Circuito(umbral=1, espera=30)
+    sonda = circuito.entrar()  # llamada iniciada con el circuito cerrado
+    abrir(circuito)
+    circuito.registrar(True, sonda)
+    assert circuito.estado == ABIERTO
+
+
+# -------------------- CLIENTE UPSTREAM --------------------
+class AdaptadorCaido(BaseAdapter):
+    """Responde siempre 503 y cuenta las peticiones que llegan al upstream."""
+
+    def __init__(self):
+        super().__init__()
+        self.peticiones = 0
+
+    def send(self, request, **kwargs):
+        self.peticiones += 1
+        response = requests.Response()
+        response.status_code = 503
+        response.headers = CaseInsensitiveDict()
+        response.raw = io.BytesIO(b"")
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def test_cliente_sirve_la_copia_obsoleta_y_deja_de_llamar_con_el_circuito_abierto(reloj):
+    adaptador = AdaptadorCaido()
+    cache = CacheRespuestas(BackendMemoria(), ttl_busqueda=0)
+    cache.guardar(URL, b"<rss/>")
+    cliente = ClienteUpstream(max_reintentos=0, transporte=adaptador, cache=cache,
+                              circuito=Circuito(umbral=2, espera=60))
+
+    for _ in range(3):
+        assert cliente.obtener(URL, con_origen=True) == (b"<rss/>", "obsoleto")
+    assert adaptador.peticiones == 2  # la tercera la rechaza el circuito sin llamar al upstream
+    with pytest.raises(CircuitoAbierto):
+        cliente.obtener(URL.replace("vitiligo", "psoriasis"))  # sin copia en caché
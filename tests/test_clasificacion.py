@@ -0,0 +1,79 @@
+import pytest
+
+from clasificacion import (ESTADOS, FASES, clasificador_estados, clasificador_fases, coincide_estado, coincide_fase,
+                           resumen_clinico)
+
+TITULOS = {
+    "Phase 3 Study of Ruxolitinib Cream": "3",
+    "A Phase 1b Trial": "1",
+    "Phase 2a Dose-Ranging Study": "2",
+    "Phase IIb Extension": "2",
+    "PHASE III Confirmatory Trial": "3",
+    "Phase IV Post-Marketing Study": "4",
+    "Phase 1/Phase 2 Trial": "1/2",
+    "Phase 1b/2a Study": "1/2",
+    "Phase 2/Phase 3": "2/3",
+    "Phase II/III Adaptive Trial": "2/3",
+    "Phase 2b-3 Seamless Design": "2/3",
+    "Early Phase 1": "1",
+    "Phase 3/Phase 3 Duplicate": "3",
+    "Observational Registry": "Desconocida",
+    "Phase 5": "Desconocida",
+    "Phase 2c": "Desconocida",
+    "": "Desconocida",
+}
+
+
+@pytest.mark.parametrize("titulo, fase", TITULOS.items())
+def test_clasificar_uno(titulo, fase):
+    assert FASES[clasificador_fases.clasificar_uno(titulo)] == fase
+
+
+def test_clasificar_en_lote_equivale_a_uno_a_uno():
+    titulos = list(TITULOS) + [None, "Phase 2\nPhase 3 en otra línea"]
+    esperado = [clasificador_fases.clasificar_uno(t) for t in titulos]
+    assert list(clasificador_fases.clasificar(titulos)) == esperado
+    assert list(clasificador_fases.clasificar([])) == []
+
+
+@pytest.mark.parametrize("estado, etiqueta", [
+    ("Recruiting", "Reclutando"),
+    ("Not yet recruiting", "No iniciado"),
+    ("Active, not recruiting", "Activo"),
+    ("Enrolling by invitation", "Reclutando"),
+    ("Terminated", "Interrumpido"),
+    ("Unknown status", "Desconocido"),
+])
+def test_estados(estado, etiqueta):
+    assert ESTADOS[clasificador_estados.clasificar([estado])[0]] == etiqueta
+
+
+@pytest.mark.parametrize("fase, filtro, coincide", [
+    ("3", "3", True),
+    ("2/3", "3", True),
+    ("2/3", "2/3", True),
+    ("2", "2/3", False),
+    ("Desconocida", "desconocida", True),
+    ("3", "fase 3", False),
+])
+def test_coincide_fase(fase, filtro, coincide):
+    assert coincide_fase(FASES.index(fase), filtro) is coincide
+
+
+def test_resumen_clinico():
+    fases = clasificador_fases.clasificar(["Phase 2b/3 Study", "Phase 1b Study", "Registry"])
+    resumen = resumen_clinico("ruxolitinib", "vitiligo", fases, ["Recruiting"])
+    assert resumen["ensayos_por_fase"]["Fase 2/3"] == 1 and resumen["ensayos_por_fase"]["Fase 1"] == 1
+    assert resumen["recomendación"] == "Revisión favorable"
+    assert resumen["ensayos_por_estado"]["Reclutando"] == 1
+
+
+@pytest.mark.parametrize("estado, filtro, coincide", [
+    ("Reclutando", "reclut", True),
+    ("Activo", "en curso", True),
+    ("Completado", "en curso", False),
+    ("Desconocido", "desconocido", True),
+    ("Retirado", "reclutando", False),
+])
+def test_coincide_estado(estado, filtro, coincide):
+    assert coincide_estado(ESTADOS.index(estado), filtro) is coincide
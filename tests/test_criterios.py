@@ -0,0 +1,78 @@
+import pytest
+
+from criterios import concepto, dividir_criterios, edad_en_anios, normalizar_sexo, parsear_criterios
+from indice import IndiceEnsayos
+from test_indice import registro
+
+CRITERIOS = """Inclusion Criteria:
+
+  1. Age 12 to 65 years
+  2. Non-segmental vitiligo
+  - Willing to use contraception
+
+Exclusion Criteria:
+
+  - Pregnant or breastfeeding women
+  - Active infection, including tuberculosis or HIV
+  - Prior JAK inhibitor therapy
+"""
+
+
+def test_dividir_criterios_por_secciones_y_vinetas():
+    inclusion, exclusion = dividir_criterios(CRITERIOS)
+    assert inclusion == ["Age 12 to 65 years", "Non-segmental vitiligo", "Willing to use contraception"]
+    assert exclusion[0] == "Pregnant or breastfeeding women"
+    assert len(exclusion) == 3
+
+
+def test_sin_cabeceras_todo_es_inclusion():
+    assert dividir_criterios("- Adults - Signed consent") == (["Adults", "Signed consent"], [])
+
+
+def test_parsear_criterios_extrae_edades_sexo_y_conceptos():
+    e = parsear_criterios(CRITERIOS, sexo="All")
+    assert (e.edad_minima, e.edad_maxima, e.sexo) == (12, 65, "todos")
+    assert e.terminos_inclusion == ["anticoncepcion"]
+    assert e.terminos_exclusion == ["embarazo", "infeccion_activa", "inhibidores_jak", "tuberculosis", "vih"]
+
+
+def test_los_campos_estructurados_tienen_prioridad_sobre_el_texto():
+    e = parsear_criterios(CRITERIOS, edad_minima="18 Years", edad_maxima="N/A")
+    assert (e.edad_minima, e.edad_maxima) == (18, 65)
+
+
+@pytest.mark.parametrize("texto, minima, maxima", [
+    ("Inclusion Criteria: - Aged 18 years or older", 18, None),
+    ("Inclusion Criteria: - Age >= 2 years - At least 2 years of disease", 2, None),
+    ("Exclusion Criteria: - Age > 75 years", None, 75),
+    ("Inclusion Criteria: - 18 - 70 years of age", 18, 70),
+])
+def test_edades_del_texto(texto, minima, maxima):
+    e = parsear_criterios(texto)
+    assert (e.edad_minima, e.edad_maxima) == (minima, maxima)
+
+
+@pytest.mark.parametrize("texto, anios", [("18 Years", 18), ("6 Months", 0.5), ("N/A", None), (None, None)])
+def test_edad_en_anios(texto, anios):
+    assert edad_en_anios(texto) == anios
+
+
+def test_conceptos_y_sexos():
+    assert concepto("pregnancy") == concepto("embarazo") == "embarazo"
+    assert concepto("Hepatitis B") == "hepatitis_b"
+    assert concepto("pregnancy test negative") is None
+    assert normalizar_sexo(" Female ") == "mujeres" and normalizar_sexo("otro") is None
+
+
+# -------------------- BÚSQUEDA EN EL ÍNDICE --------------------
+def test_buscar_por_criterios(tmp_path):
+    indice = IndiceEnsayos(str(tmp_path / "ensayos.sqlite3"))
+    indice.guardar([registro("NCT00000001"), registro("NCT00000002", criterios=CRITERIOS)])
+
+    def ids(**filtros):
+        return [r["identificador"] for r in indice.buscar_por_criterios(patologia="vitiligo", **filtros)]
+
+    assert ids(edad=15) == ["NCT00000002"]
+    assert ids(edad=40, no_excluye=["vih"]) == ["NCT00000001"]
+    assert ids(incluye=["contraception"]) == ["NCT00000002"]
+    assert ids(no_excluye=["pregnancy"]) == []
@@ -0,0 +1,73 @@
+import asyncio
+import gzip
+import io
+import os
+
+import pytest
+
+from exportacion import COLUMNAS, EscritorCSV, EscritorParquet, VolcadoFilas, aexportar, fila_exportacion, leer_filas
+from parseo import parsear_estudio
+from test_parseo import ESTUDIO
+
+ENSAYO = {"identificador": "NCT00000001", "titulo": "Phase 3 Study", "estado": "Desconocido", "fase": "3",
+          "ubicacion": "Desconocida"}
+
+
+def exportar(filas, escritor, comprimir=False):
+    async def fuente():
+        for fila in filas:
+            yield fila
+
+    async def leer():
+        return b"".join([datos async for datos in aexportar(fuente(), escritor, comprimir)])
+
+    return asyncio.run(leer())
+
+
+def test_fila_sin_detalle_usa_los_datos_de_busqueda():
+    fila = fila_exportacion(ENSAYO)
+    assert list(fila) == [clave for clave, _ in COLUMNAS]
+    assert (fila["identificador"], fila["fase"], fila["paises"], fila["patrocinador"]) == \
+        ("NCT00000001", "3", "", "")
+
+
+def test_fila_con_detalle():
+    fila = fila_exportacion(ENSAYO, parsear_estudio(ESTUDIO))
+    assert (fila["estado"], fila["patrocinador"], fila["paises"]) == ("Reclutando", "Synthetic Pharma", "France; Spain")
+
+
+def test_csv_y_excel():
+    filas = [fila_exportacion(ENSAYO)] * 2
+    csv = exportar(filas, EscritorCSV()).decode("utf-8")
+    assert csv.splitlines()[0] == ",".join(cabecera for _, cabecera in COLUMNAS)
+    assert csv.count("\n") == 3
+    excel = exportar(filas, EscritorCSV(excel=True))
+    assert excel.startswith("﻿".encode("utf-8")) and b";" in excel and b"\r\n" in excel
+
+
+def test_gzip_en_streaming():
+    filas = [fila_exportacion(ENSAYO)] * 50
+    assert gzip.decompress(exportar(filas, EscritorCSV(), comprimir=True)) == exportar(filas, EscritorCSV())
+
+
+def test_parquet():
+    pq = pytest.importorskip("pyarrow.parquet")
+    datos = exportar([fila_exportacion(ENSAYO)] * 3, EscritorParquet(lote=2))
+    tabla = pq.read_table(io.BytesIO(datos))
+    assert tabla.num_rows == 3 and tabla.column_names == [clave for clave, _ in COLUMNAS]
+
+
+def test_volcado_filas():
+    filas = [fila_exportacion(ENSAYO), fila_exportacion({**ENSAYO, "titulo": "Vitíligo"})]
+    volcados = []
+    for _ in range(2):
+        volcado = VolcadoFilas()
+        for fila in filas:
+            volcado.agregar(fila)
+        volcados.append((volcado, volcado.cerrar()))
+    (volcado, huella), (otro, otra_huella) = volcados
+    assert huella == otra_huella  # mismas filas, mismo hash (clave del PDF en caché)
+    assert list(leer_filas(volcado.ruta)) == filas
+    for v in (volcado, otro):
+        v.eliminar()
+        assert not os.path.exists(v.ruta)
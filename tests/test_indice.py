@@ -0,0 +1,161 @@
+import sqlite3
+import time
+
+import pytest
+
+from indice import IndiceEnsayos, ambito, consulta_fts
+from parseo import NO_DISPONIBLE, RegistroEnsayo
+
+
+def registro(nct_id, fase="Phase 3", condiciones=("Vitiligo",), intervenciones=("Ruxolitinib",),
+             estado="Recruiting", paises=("Spain",), fecha_inicio="January 2023",
+             criterios="Inclusion Criteria: - Age 18 to 65 years Exclusion Criteria: - Pregnancy"):
+    return RegistroEnsayo(id=nct_id, titulo=f"Study {nct_id}", resumen="Synthetic summary.", estado=estado,
+                          fase=fase, fecha_inicio=fecha_inicio, condiciones=list(condiciones),
+                          intervenciones=list(intervenciones), paises=list(paises), endpoints=["F-VASI75"],
+                          criterios=criterios)
+
+
+@pytest.fixture
+def indice(tmp_path):
+    return IndiceEnsayos(str(tmp_path / "ensayos.sqlite3"))
+
+
+def ids(resultados):
+    return [r["identificador"] for r in resultados]
+
+
+# -------------------- FILTRO DE FASE --------------------
+@pytest.fixture
+def con_fases(indice):
+    indice.guardar([
+        registro("NCT00000001", "Phase 2/Phase 3"),
+        registro("NCT00000002", "Phase 3"),
+        registro("NCT00000003", "Phase 2"),
+        registro("NCT00000004", "Early Phase 1"),
+        registro("NCT00000005", "N/A"),
+    ])
+    return indice
+
+
+@pytest.mark.parametrize("filtro, esperados", [
+    ("3", ["NCT00000001", "NCT00000002"]),
+    ("2", ["NCT00000001", "NCT00000003"]),
+    ("2/3", ["NCT00000001"]),
+    ("1", ["NCT00000004"]),
+    ("desconocida", ["NCT00000005"]),
+    ("fase 3", []),
+])
+def test_filtro_de_fase_usa_las_reglas_de_coincide_fase(con_fases, filtro, esperados):
+    assert ids(con_fases.buscar(patologia="vitiligo", fase=filtro)) == esperados
+
+
+def test_resultados_con_codigos_de_fase(con_fases):
+    assert [r["fase"] for r in con_fases.buscar()] == ["2/3", "3", "2", "1", "Desconocida"]
+
+
+def test_reguardar_actualiza_la_fase(con_fases):
+    con_fases.guardar([registro("NCT00000003", "Phase 3")])
+    assert ids(con_fases.buscar(fase="2")) == ["NCT00000001"]
+    assert "NCT00000003" in ids(con_fases.buscar(fase="3"))
+
+
+# -------------------- COBERTURA --------------------
+def test_sin_sincronizacion_no_hay_cobertura(con_fases):
+    # Tener ensayos indexados (p. ej. de /ensayo_detalle) no implica tenerlos todos
+    assert con_fases.cobertura(patologia="vitiligo") is None
+
+
+def test_cobertura_del_ambito_y_de_ambitos_mas_amplios(indice):
+    indice.registrar_cobertura(ambito(patologia="vitiligo"), time.time())
+    assert indice.cobertura(patologia="vitiligo")["completa"] is True
+    assert indice.cobertura(molecula="ruxolitinib", patologia="vitiligo") is not None
+    assert indice.cobertura(molecula="ruxolitinib") is None
+    assert indice.cobertura(patologia="psoriasis") is None
+
+
+def test_cobertura_caduca_y_se_retira(indice):
+    indice.registrar_cobertura(ambito(patologia="vitiligo"), time.time() - 3600)
+    assert indice.cobertura(patologia="vitiligo", max_edad=60) is None
+    assert indice.cobertura(patologia="vitiligo", max_edad=7200) is not None
+    indice.retirar_cobertura(ambito(patologia="vitiligo"))
+    assert indice.cobertura(patologia="vitiligo", max_edad=7200) is None
+
+
+# -------------------- DETALLES DE LAS PETICIONES --------------------
+def test_guardar_detalle_omite_registros_sin_id(indice):
+    indice.guardar_detalle(registro(NO_DISPONIBLE))
+    indice.guardar_detalle(registro(""))
+    assert len(indice) == 0
+
+
+def test_guardar_detalle_registra_los_fallos_sin_propagarlos(indice, monkeypatch, caplog):
+    def fallar(registros):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(indice, "guardar", fallar)
+    indice.guardar_detalle(registro("NCT00000001"))
+    assert "No se pudo indexar NCT00000001" in caplog.text
+
+
+# -------------------- FILTROS DE ESTADO Y PAÍS --------------------
+@pytest.fixture
+def con_estados(indice):
+    indice.guardar([
+        registro("NCT00000001", estado="Recruiting", paises=("Spain", "United States")),
+        registro("NCT00000002", estado="Not yet recruiting", paises=("United Kingdom",)),
+        registro("NCT00000003", estado="Completed", paises=("France",)),
+    ])
+    return indice
+
+
+def test_estados_con_las_etiquetas_del_upstream(con_estados):
+    assert [r["estado"] for r in con_estados.buscar()] == ["Reclutando", "No iniciado", "Completado"]
+
+
+@pytest.mark.parametrize("filtro, esperados", [
+    ("recruiting", ["NCT00000001", "NCT00000002"]),  # subcadena del texto original
+    ("reclutando", ["NCT00000001"]),
+    ("en curso", ["NCT00000001", "NCT00000002"]),
+    ("COMPLETADO", ["NCT00000003"]),
+    ("retirado", []),
+])
+def test_filtro_de_estado(con_estados, filtro, esperados):
+    assert ids(con_estados.buscar(estado=filtro)) == esperados
+
+
+@pytest.mark.parametrize("filtro, esperados", [
+    ("united", ["NCT00000001", "NCT00000002"]),
+    ("Spain", ["NCT00000001"]),
+    ("italy", []),
+])
+def test_filtro_de_pais_por_subcadena(con_estados, filtro, esperados):
+    assert ids(con_estados.buscar(pais=filtro)) == esperados
+
+
+# -------------------- SINÓNIMOS EN LA BÚSQUEDA --------------------
+def test_consulta_fts_con_alternativas():
+    assert consulta_fts("a", ("b", 'c"d'), None, ()) == '"a" AND ("b" OR "c""d")'
+    assert consulta_fts(("b",), columna="inclusion") == 'inclusion : "b"'
+
+
+@pytest.fixture
+def con_sinonimos(indice):
+    indice.guardar([
+        registro("NCT00000001", condiciones=("Vitiligo",), intervenciones=("Semaglutide",)),
+        registro("NCT00000002", condiciones=("Leucodermia",), intervenciones=("Ozempic",)),
+        registro("NCT00000003", condiciones=("Psoriasis",), intervenciones=("Wegovy",)),
+    ])
+    return indice
+
+
+@pytest.mark.parametrize("molecula, patologia, esperados", [
+    (None, "vitíligo", ["NCT00000001", "NCT00000002"]),
+    (None, "leucodermia", ["NCT00000001", "NCT00000002"]),
+    ("semaglutida", None, ["NCT00000001", "NCT00000002", "NCT00000003"]),
+    ("ozempic", "vitiligo", ["NCT00000001", "NCT00000002"]),
+    ("ruxolitinib", None, []),
+])
+def test_buscar_por_todas_las_formas_del_vocabulario(con_sinonimos, molecula, patologia, esperados):
+    assert ids(con_sinonimos.buscar(molecula=molecula, patologia=patologia)) == esperados
+    assert ids(con_sinonimos.buscar_por_criterios(molecula=molecula, patologia=patologia)) == esperados
@@ -0,0 +1,57 @@
+import pytest
+
+import metricas
+from metricas import Contador, Histograma, Indicador, exponer, reiniciar
+
+
+@pytest.fixture
+def registro(monkeypatch):
+    # Registro vacío: las métricas del test no se mezclan con las del servicio
+    monkeypatch.setattr(metricas, "_REGISTRO", [])
+    return metricas._REGISTRO
+
+
+def test_contador_e_indicador(registro):
+    peticiones = Contador("peticiones_total", "Peticiones", ("codigo",))
+    en_curso = Indicador("en_curso", "En curso")
+    peticiones.inc("200")
+    peticiones.inc("200", valor=2)
+    peticiones.inc('5"0\n3')
+    en_curso.sumar(1)
+    en_curso.sumar(-1)
+    assert exponer().splitlines() == [
+        "# HELP peticiones_total Peticiones",
+        "# TYPE peticiones_total counter",
+        'peticiones_total{codigo="200"} 3',
+        'peticiones_total{codigo="5\\"0\\n3"} 1',
+        "# HELP en_curso En curso",
+        "# TYPE en_curso gauge",
+        "en_curso 0",
+    ]
+
+
+def test_histograma_acumula_buckets_al_exponer(registro):
+    latencia = Histograma("latencia", "Latencia", ("etapa",), buckets=(0.1, 1))
+    for valor in (0.05, 0.1, 0.5, 3):
+        latencia.observar(valor, "upstream")
+    assert latencia.exponer()[2:] == [
+        'latencia_bucket{etapa="upstream",le="0.1"} 2',
+        'latencia_bucket{etapa="upstream",le="1"} 3',
+        'latencia_bucket{etapa="upstream",le="+Inf"} 4',
+        'latencia_sum{etapa="upstream"} 3.65',
+        'latencia_count{etapa="upstream"} 4',
+    ]
+    reiniciar()
+    assert latencia.exponer() == ["# HELP latencia Latencia", "# TYPE latencia histogram"]
+
+
+def test_etapa_mide_el_bloque(monkeypatch):
+    observadas = []
+    monkeypatch.setattr(metricas, "METRICAS_ACTIVAS", True)
+    monkeypatch.setattr(metricas.etapa_segundos, "observar", lambda valor, nombre: observadas.append(nombre))
+    with metricas.etapa("parseo"):
+        pass
+    monkeypatch.setattr(metricas, "METRICAS_ACTIVAS", False)
+    with metricas.etapa("filtrado"):
+        pass
+    assert observadas == ["parseo"]
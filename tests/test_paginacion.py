@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from paginacion import Pagina, codificar_cursor, decodificar_cursor
+
+
+def test_cursor_ida_y_vuelta():
+    assert decodificar_cursor(codificar_cursor(40)) == 40
+
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", codificar_cursor(-1), "eyJvdHJvIjogMX0"])
+def test_cursor_no_valido(cursor):
+    with pytest.raises(ValueError):
+        decodificar_cursor(cursor)
+
+
+def test_pagina_salta_offset_y_para_en_el_limite():
+    consumidos = []
+
+    def items():
+        for i in range(100):
+            consumidos.append(i)
+            yield i
+
+    pagina = Pagina(items(), offset=10, limite=5)
+    assert list(pagina) == [10, 11, 12, 13, 14]
+    # Solo se lee un elemento de más para saber que hay página siguiente
+    assert consumidos[-1] == 15
+    metadatos = pagina.metadatos()
+    assert metadatos["devueltos"] == 5
+    assert decodificar_cursor(metadatos["siguiente_cursor"]) == 15
+
+
+def test_ultima_pagina_sin_cursor_siguiente():
+    pagina = Pagina(range(12), offset=10, limite=5)
+    assert list(pagina) == [10, 11]
+    assert pagina.metadatos()["siguiente_cursor"] is None
+
+
+def test_pagina_asincrona():
+    async def items():
+        for i in range(20):
+            yield i
+
+    async def leer():
+        pagina = Pagina(items(), offset=3, limite=4)
+        return [i async for i in pagina], pagina.metadatos()
+
+    ensayos, metadatos = asyncio.run(leer())
+    assert ensayos == [3, 4, 5, 6]
+    assert decodificar_cursor(metadatos["siguiente_cursor"]) == 7
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+from clasificacion import FASES
+from parseo import NO_DISPONIBLE, ConteoRSS, FasesRSS, ItemsRSS, LectorRSS, aiterar_items, iterar_items, parsear_estudio
+
+RSS = (
+    '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>ClinicalTrials.gov</title>'
+    "<item><title>Phase 3 Study of Ruxolitinib Cream</title>"
+    "<link>https://clinicaltrials.gov/ct2/show/NCT00000001</link></item>"
+    "<item><title>Phase 1/Phase 2 Trial in Vitíligo</title>"
+    "<link>https://clinicaltrials.gov/ct2/show/NCT00000002</link></item>"
+    "<item><title>Observational Registry</title>"
+    "<link>https://clinicaltrials.gov/ct2/show/NCT00000003/</link></item>"
+    "</channel></rss>"
+).encode("utf-8")
+
+ESTUDIO = (
+    '<?xml version="1.0" encoding="UTF-8"?><clinical_study>'
+    "<id_info><nct_id>NCT00000001</nct_id></id_info>"
+    "<brief_title>Short title</brief_title>"
+    "<overall_status>Recruiting</overall_status><phase>Phase 2/Phase 3</phase>"
+    "<start_date>January 2023</start_date>"
+    "<sponsors><lead_sponsor><agency>Synthetic Pharma</agency></lead_sponsor></sponsors>"
+    "<condition>Vitiligo</condition>"
+    "<intervention><intervention_name>Ruxolitinib</intervention_name></intervention>"
+    "<primary_outcome><measure>F-VASI75</measure></primary_outcome>"
+    "<eligibility><criteria><textblock>Inclusion Criteria: - Age 18 to 65 years "
+    "Exclusion Criteria: - Pregnancy</textblock></criteria><gender>Female</gender>"
+    "<minimum_age>18 Years</minimum_age><maximum_age>65 Years</maximum_age></eligibility>"
+    "<location><facility><name>Hospital A</name><address><country>Spain</country></address></facility></location>"
+    "<location><facility><name>Hospital B</name><address><country>France</country></address></facility></location>"
+    "<location><facility><name>Hospital C</name><address><country>Spain</country></address></facility></location>"
+    "</clinical_study>"
+).encode("utf-8")
+
+
+def trozos(contenido, tamano):
+    return [contenido[i:i + tamano] for i in range(0, len(contenido), tamano)]
+
+
+# -------------------- RSS --------------------
+def test_lector_rss_da_los_mismos_items_con_cualquier_troceado():
+    completos = list(iterar_items([RSS]))
+    assert completos[0] == {"titulo": "Phase 3 Study of Ruxolitinib Cream",
+                            "link": "https://clinicaltrials.gov/ct2/show/NCT00000001"}
+    assert len(completos) == 3
+    for tamano in (1, 7, 64):
+        assert list(iterar_items(trozos(RSS, tamano))) == completos
+
+
+def test_lector_rss_entrega_cada_item_al_cerrarse():
+    lector = LectorRSS()
+    corte = RSS.index(b"</item>") + len(b"</item>")
+    assert [i["titulo"] for i in lector.feed(RSS[:corte])] == ["Phase 3 Study of Ruxolitinib Cream"]
+    assert len(lector.feed(RSS[corte:]) + lector.close()) == 2
+
+
+def test_aiterar_items_equivale_a_iterar_items():
+    async def fuente():
+        for trozo in trozos(RSS, 16):
+            yield trozo
+
+    async def leer():
+        return [item async for item in aiterar_items(fuente())]
+
+    assert asyncio.run(leer()) == list(iterar_items([RSS]))
+
+
+def test_consumidores():
+    def consumir(consumidor):
+        instancia = consumidor()
+        for trozo in trozos(RSS, 10):
+            instancia.feed(trozo)
+        return instancia.close()
+
+    assert consumir(ConteoRSS) == 3
+    assert len(consumir(ItemsRSS)) == 3
+    ids, fases = consumir(FasesRSS)
+    assert ids == ["NCT00000001", "NCT00000002", "NCT00000003"]
+    assert [FASES[c] for c in fases] == ["3", "1/2", "Desconocida"]
+
+
+# -------------------- ESTUDIO --------------------
+def test_parsear_estudio():
+    r = parsear_estudio(ESTUDIO)
+    assert r.id == "NCT00000001"
+    assert r.titulo == "Short title"  # sin official_title se usa el breve
+    assert (r.estado, r.fase, r.patrocinador) == ("Recruiting", "Phase 2/Phase 3", "Synthetic Pharma")
+    assert r.condiciones == ["Vitiligo"] and r.intervenciones == ["Ruxolitinib"]
+    assert r.endpoints == ["F-VASI75"]
+    assert r.ubicaciones == ["Hospital A", "Hospital B", "Hospital C"]
+    assert r.paises == ["France", "Spain"]
+    assert r.resumen == NO_DISPONIBLE
+    assert (r.elegibilidad.edad_minima, r.elegibilidad.edad_maxima, r.elegibilidad.sexo) == (18, 65, "mujeres")
+
+
+def test_registro_a_dict_es_serializable():
+    datos = parsear_estudio(ESTUDIO).a_dict()
+    assert json.loads(json.dumps(datos))["elegibilidad"]["sexo"] == "mujeres"
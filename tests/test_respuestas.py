@@ -0,0 +1,56 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+import respuestas
+from respuestas import Compresor, codificacion_aceptada, coincide_etag, comprimible, comprimir, etiqueta, volcar_json
+
+
+def test_volcar_json_compacto_en_utf8():
+    datos = {"b": 1, "a": "vitíligo"}
+    assert json.loads(volcar_json(datos)) == datos
+    assert volcar_json(datos, ordenar=True).index(b'"a"') < volcar_json(datos, ordenar=True).index(b'"b"')
+    assert "vitíligo".encode("utf-8") in volcar_json(datos)
+
+
+def test_etag_debil_y_if_none_match():
+    etag = etiqueta(b"{}")
+    assert etag.startswith('W/"') and etag == etiqueta(b"{}") != etiqueta(b"[]")
+    assert coincide_etag(etag, etag)
+    assert coincide_etag('"otra", ' + etag.removeprefix("W/"), etag)
+    assert coincide_etag("*", etag)
+    assert not coincide_etag(None, etag) and not coincide_etag('"otra"', etag)
+
+
+@pytest.mark.parametrize("cabecera, con_brotli, esperada", [
+    ("gzip, deflate, br", True, "br"),
+    ("gzip, deflate, br", False, "gzip"),
+    ("br;q=0, gzip;q=0.5", True, "gzip"),
+    ("*", False, "gzip"),
+    ("gzip;q=0", False, None),
+    ("identity", True, None),
+    (None, True, None),
+])
+def test_codificacion_aceptada(monkeypatch, cabecera, con_brotli, esperada):
+    monkeypatch.setattr(respuestas, "brotli", object() if con_brotli else None)
+    assert codificacion_aceptada(cabecera) == esperada
+
+
+def test_comprimible():
+    assert comprimible("application/json; charset=utf-8", 4096)
+    assert not comprimible("application/json", 10)
+    assert comprimible("application/x-ndjson")  # streaming: sin tamaño
+    assert not comprimible("application/pdf", 4096) and not comprimible(None)
+
+
+def test_compresor_gzip_entrega_cada_trozo():
+    compresor = Compresor("gzip")
+    lector = zlib.decompressobj(31)
+    for linea in (b'{"a": 1}\n', b'{"b": 2}\n'):
+        # Cada trozo comprimido se puede descomprimir ya, sin esperar al resto
+        assert lector.decompress(compresor.comprimir(linea)) == linea
+    lector.decompress(compresor.terminar())
+    assert lector.eof
+    assert gzip.decompress(comprimir(b"x" * 2000, "gzip")) == b"x" * 2000
@@ -0,0 +1,352 @@
+import asyncio
+import io
+import threading
+import time
+
+import httpx
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+import upstream
+from cache import BackendMemoria, CacheRespuestas
+from parseo import ConteoRSS
+from singleflight import SingleFlight, SingleFlightAsync
+from upstream import TAMANO_CHUNK, ClienteUpstream, ClienteUpstreamAsync
+
+URL = "http://upstream.test/ct2/results/rss.xml?term=ruxolitinib&cond=vitiligo"
+RSS = (b'<?xml version="1.0"?><rss><channel>'
+       + b"".join(b"<item><title>Phase 3 #%d</title><link>https://x/ct2/show/NCT%08d</link></item>" % (i, i)
+                  for i in range(5))
+       + b"</channel></rss>")
+GRANDE = bytes(range(256)) * (3 * TAMANO_CHUNK // 256)  # varios chunks
+LLAMANTES = 20
+
+
+# -------------------- TRANSPORTES QUE CUENTAN --------------------
+class AdaptadorContador(BaseAdapter):
+    """Adaptador de requests que responde `cuerpo` tras `espera` segundos y cuenta las peticiones."""
+
+    def __init__(self, cuerpo=RSS, espera=0.2, estado=200):
+        super().__init__()
+        self.cuerpo, self.espera, self.estado = cuerpo, espera, estado
+        self.peticiones = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.peticiones += 1
+        time.sleep(self.espera)
+        response = requests.Response()
+        response.status_code = self.estado
+        response.headers = CaseInsensitiveDict()
+        response.raw = io.BytesIO(self.cuerpo)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class TransporteContador(httpx.AsyncBaseTransport):
+    def __init__(self, cuerpo=RSS, espera=0.2):
+        self.cuerpo, self.espera = cuerpo, espera
+        self.peticiones = 0
+
+    async def handle_async_request(self, request):
+        self.peticiones += 1
+        await asyncio.sleep(self.espera)
+        return httpx.Response(200, content=self.cuerpo, request=request)
+
+
+class TransporteGoteo(TransporteContador):
+    """Entrega el cuerpo chunk a chunk, con `espera` segundos entre uno y otro."""
+
+    async def handle_async_request(self, request):
+        self.peticiones += 1
+
+        async def gotear():
+            for inicio in range(0, len(self.cuerpo), TAMANO_CHUNK):
+                await asyncio.sleep(self.espera)
+                yield self.cuerpo[inicio:inicio + TAMANO_CHUNK]
+
+        return httpx.Response(200, content=gotear(), request=request)
+
+
+def en_paralelo(fn, n=LLAMANTES):
+    # Lanza `n` hilos que llaman a `fn` a la vez y devuelve sus resultados
+    barrera = threading.Barrier(n)
+    resultados = [None] * n
+
+    def hilo(i):
+        barrera.wait()
+        resultados[i] = fn()
+
+    hilos = [threading.Thread(target=hilo, args=(i,)) for i in range(n)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return resultados
+
+
+# -------------------- SINGLE-FLIGHT (HILOS) --------------------
+def test_singleflight_ejecuta_una_vez_para_llamadas_concurrentes():
+    vuelos = SingleFlight()
+    ejecuciones = []
+
+    def lento():
+        ejecuciones.append(1)
+        time.sleep(0.2)
+        return "valor"
+
+    assert en_paralelo(lambda: vuelos.hacer("clave", lento)) == ["valor"] * LLAMANTES
+    assert len(ejecuciones) == 1
+    assert vuelos.en_vuelo() == 0
+
+
+def test_singleflight_comparte_la_excepcion():
+    vuelos = SingleFlight()
+    ejecuciones = []
+
+    def falla():
+        ejecuciones.append(1)
+        time.sleep(0.2)
+        raise ValueError("upstream caído")
+
+    def llamar():
+        try:
+            vuelos.hacer("clave", falla)
+        except ValueError as e:
+            return str(e)
+
+    assert en_paralelo(llamar) == ["upstream caído"] * LLAMANTES
+    assert len(ejecuciones) == 1
+
+
+def test_cliente_obtener_concurrente_hace_una_peticion():
+    adaptador = AdaptadorContador()
+    cliente = ClienteUpstream(transporte=adaptador, cache=None)
+    assert en_paralelo(lambda: cliente.obtener(URL)) == [RSS] * LLAMANTES
+    assert adaptador.peticiones == 1
+
+
+def test_cliente_consumir_concurrente_hace_una_peticion():
+    adaptador = AdaptadorContador()
+    cliente = ClienteUpstream(transporte=adaptador, cache=None)
+    assert en_paralelo(lambda: cliente.consumir(URL, ConteoRSS)) == [5] * LLAMANTES
+    assert adaptador.peticiones == 1
+
+
+def test_cliente_url_equivalente_comparte_peticion():
+    # Mismos parámetros en otro orden y con espacios de más: misma clave normalizada
+    adaptador = AdaptadorContador()
+    cliente = ClienteUpstream(transporte=adaptador, cache=None)
+    variantes = [URL, "http://UPSTREAM.test/ct2/results/rss.xml?cond=vitiligo&term=ruxolitinib%20"]
+    contador = iter(range(LLAMANTES))
+    en_paralelo(lambda: cliente.obtener(variantes[next(contador) % 2]))
+    assert adaptador.peticiones == 1
+
+
+def test_cliente_iterar_concurrente_hace_una_peticion():
+    adaptador = AdaptadorContador(cuerpo=GRANDE)
+    cliente = ClienteUpstream(transporte=adaptador, cache=None)
+    assert en_paralelo(lambda: b"".join(cliente.iterar(URL))) == [GRANDE] * LLAMANTES
+    assert adaptador.peticiones == 1
+    assert cliente._streams.en_vuelo() == 0
+
+
+def test_iterar_comparte_la_excepcion():
+    adaptador = AdaptadorContador(estado=404)
+    cliente = ClienteUpstream(transporte=adaptador, cache=None)
+
+    def llamar():
+        with pytest.raises(requests.HTTPError) as error:
+            b"".join(cliente.iterar(URL))
+        return error.value.response.status_code
+
+    assert en_paralelo(llamar) == [404] * LLAMANTES
+    assert adaptador.peticiones == 1
+
+
+def test_iterar_si_el_primero_corta_termina_la_descarga_para_quien_espera():
+    adaptador = AdaptadorContador(cuerpo=GRANDE, espera=0.05)
+    cache = CacheRespuestas(BackendMemoria())
+    cliente = ClienteUpstream(transporte=adaptador, cache=cache)
+    primero = cliente.iterar(URL)
+    assert next(primero) == GRANDE[:TAMANO_CHUNK]
+    resultado = []
+    segundo = threading.Thread(target=lambda: resultado.append(b"".join(cliente.iterar(URL))))
+    segundo.start()
+    time.sleep(0.1)  # el segundo ya espera al primero
+    primero.close()
+    segundo.join()
+    assert resultado == [GRANDE]
+    assert cache.obtener(URL) == GRANDE
+    assert adaptador.peticiones == 1
+
+
+def test_iterar_sin_nadie_esperando_corta_la_descarga():
+    adaptador = AdaptadorContador(cuerpo=GRANDE, espera=0)
+    cache = CacheRespuestas(BackendMemoria())
+    cliente = ClienteUpstream(transporte=adaptador, cache=cache)
+    primero = cliente.iterar(URL)
+    next(primero)
+    primero.close()
+    assert cache.obtener(URL) is None
+    assert b"".join(cliente.iterar(URL)) == GRANDE
+    assert adaptador.peticiones == 2
+
+
+def test_iterar_cuerpo_grande_cada_uno_descarga_el_suyo_sin_esperar_en_fila(monkeypatch):
+    # Excepción documentada en ClienteUpstream.iterar: un cuerpo que no se retiene no se puede compartir,
+    # y quien esperaba lo sabe en cuanto se pasa del límite
+    monkeypatch.setattr(upstream, "MAX_CUERPO_CACHE", TAMANO_CHUNK)
+    adaptador = AdaptadorContador(cuerpo=GRANDE, espera=0.2)
+    cliente = ClienteUpstream(transporte=adaptador, cache=None)
+    inicio = time.perf_counter()
+    assert en_paralelo(lambda: b"".join(cliente.iterar(URL)), n=5) == [GRANDE] * 5
+    assert adaptador.peticiones == 5
+    assert time.perf_counter() - inicio < 3 * 0.2
+    assert cliente._streams.en_vuelo() == 0
+
+
+# -------------------- SINGLE-FLIGHT (ASYNCIO) --------------------
+def test_singleflight_async_ejecuta_una_vez():
+    async def prueba():
+        vuelos = SingleFlightAsync()
+        ejecuciones = []
+
+        async def lento():
+            ejecuciones.append(1)
+            await asyncio.sleep(0.1)
+            return "valor"
+
+        resultados = await asyncio.gather(*(vuelos.hacer("clave", lento) for _ in range(LLAMANTES)))
+        assert resultados == ["valor"] * LLAMANTES
+        assert len(ejecuciones) == 1
+        await asyncio.sleep(0)
+        assert vuelos.en_vuelo() == 0
+
+    asyncio.run(prueba())
+
+
+def test_cliente_async_concurrente_hace_una_peticion():
+    async def prueba():
+        transporte = TransporteContador()
+        cliente = ClienteUpstreamAsync(transporte=transporte, cache=None)
+        try:
+            obtenidos = await asyncio.gather(*(cliente.obtener(URL) for _ in range(LLAMANTES)))
+            conteos = await asyncio.gather(*(cliente.consumir(URL, ConteoRSS) for _ in range(LLAMANTES)))
+        finally:
+            await cliente.aclose()
+        assert obtenidos == [RSS] * LLAMANTES
+        assert conteos == [5] * LLAMANTES
+        # Una descarga para `obtener` y otra para `consumir` (resultados distintos por URL)
+        assert transporte.peticiones == 2
+
+    asyncio.run(prueba())
+
+
+def test_cancelar_al_primer_llamante_no_cancela_la_descarga():
+    async def prueba():
+        transporte = TransporteContador(espera=0.3)
+        cliente = ClienteUpstreamAsync(transporte=transporte, cache=None)
+        try:
+            primero = asyncio.ensure_future(cliente.obtener(URL))
+            await asyncio.sleep(0.05)  # el primero ya lidera la descarga
+            resto = [asyncio.ensure_future(cliente.obtener(URL)) for _ in range(LLAMANTES - 1)]
+            await asyncio.sleep(0.05)
+            primero.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await primero
+            assert await asyncio.gather(*resto) == [RSS] * (LLAMANTES - 1)
+        finally:
+            await cliente.aclose()
+        assert transporte.peticiones == 1
+
+    asyncio.run(prueba())
+
+
+def test_cancelar_a_todos_no_deja_vuelos_colgados():
+    async def prueba():
+        vuelos = SingleFlightAsync()
+        terminado = asyncio.Event()
+
+        async def lento():
+            await asyncio.sleep(0.1)
+            terminado.set()
+            return "valor"
+
+        tareas = [asyncio.ensure_future(vuelos.hacer("clave", lento)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        # La ejecución compartida termina igualmente y libera la clave
+        await asyncio.wait_for(terminado.wait(), 1)
+        await asyncio.sleep(0)
+        assert vuelos.en_vuelo() == 0
+        assert await vuelos.hacer("clave", lento) == "valor"
+
+    asyncio.run(prueba())
+
+
+async def recoger(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+def test_cliente_async_iterar_concurrente_hace_una_peticion():
+    async def prueba():
+        transporte = TransporteGoteo(cuerpo=GRANDE, espera=0.02)
+        cliente = ClienteUpstreamAsync(transporte=transporte, cache=None)
+        try:
+            cuerpos = await asyncio.gather(*(recoger(cliente.iterar(URL)) for _ in range(LLAMANTES)))
+        finally:
+            await cliente.aclose()
+        assert cuerpos == [GRANDE] * LLAMANTES
+        assert transporte.peticiones == 1
+        assert cliente._streams.en_vuelo() == 0
+
+    asyncio.run(prueba())
+
+
+def test_cliente_async_iterar_si_el_primero_corta_termina_para_quien_espera():
+    async def prueba():
+        transporte = TransporteGoteo(cuerpo=GRANDE, espera=0.02)
+        cliente = ClienteUpstreamAsync(transporte=transporte, cache=None)
+        try:
+            primero = cliente.iterar(URL)
+            await anext(primero)
+            segundo = asyncio.ensure_future(recoger(cliente.iterar(URL)))
+            await asyncio.sleep(0.01)
+            await primero.aclose()
+            assert await segundo == GRANDE
+        finally:
+            await cliente.aclose()
+        assert transporte.peticiones == 1
+
+    asyncio.run(prueba())
+
+
+def test_cliente_async_iterar_primero_cancelado_los_demas_descargan_por_su_cuenta():
+    # Excepción documentada en ClienteUpstream.iterar: sin el cuerpo entero no hay nada que compartir
+    async def prueba():
+        transporte = TransporteGoteo(cuerpo=GRANDE, espera=0.05)
+        cliente = ClienteUpstreamAsync(transporte=transporte, cache=None)
+        try:
+            primero = asyncio.ensure_future(recoger(cliente.iterar(URL)))
+            await asyncio.sleep(0.07)  # a mitad de la descarga
+            segundo = asyncio.ensure_future(recoger(cliente.iterar(URL)))
+            await asyncio.sleep(0.01)
+            primero.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await primero
+            assert await segundo == GRANDE
+        finally:
+            await cliente.aclose()
+        assert transporte.peticiones == 2
+
+    asyncio.run(prueba())
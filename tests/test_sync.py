@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from indice import IndiceEnsayos, ambito
+from sync_ensayos import HISTORIAL_DESDE, Checkpoint, sincronizar
+from test_indice import registro
+
+
+class ClienteFalso:
+    """Feed de cambios y detalles en memoria; los IDs de `fallan` nunca se descargan."""
+
+    def __init__(self, nct_ids, fallan=()):
+        self.nct_ids = list(nct_ids)
+        self.fallan = set(fallan)
+        self.consultas = []
+
+    def consumir(self, url, consumidor):
+        self.consultas.append(parse_qs(urlparse(url).query))
+        return [{"titulo": i, "link": f"https://clinicaltrials.gov/ct2/show/{i}"} for i in self.nct_ids]
+
+    def obtener(self, url, parser):
+        nct_id = urlparse(url).path.split("/")[-1]
+        if nct_id in self.fallan:
+            raise ConnectionError(nct_id)
+        return registro(nct_id)
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "ensayos.sqlite3")
+
+
+def sincronizar_con(ruta, cliente, **kwargs):
+    return sincronizar(IndiceEnsayos(ruta), cliente, Checkpoint(ruta), patologia="vitiligo", tasa=1000, **kwargs)
+
+
+def test_corrida_completa_registra_cobertura(ruta):
+    cliente = ClienteFalso(["NCT00000001", "NCT00000002"])
+    estadisticas = sincronizar_con(ruta, cliente, completa=True)
+    assert estadisticas["guardados"] == 2 and estadisticas["completo"]
+    assert cliente.consultas[0]["lup_s"] == [(HISTORIAL_DESDE - timedelta(days=1)).strftime("%m/%d/%Y")]
+    assert IndiceEnsayos(ruta).cobertura(patologia="vitiligo") is not None
+
+
+def test_corrida_incremental_sin_completa_previa_no_cubre(ruta):
+    assert not sincronizar_con(ruta, ClienteFalso(["NCT00000001"]))["completo"]
+    assert IndiceEnsayos(ruta).cobertura(patologia="vitiligo") is None
+
+
+def test_incremental_tras_completa_mantiene_la_cobertura(ruta):
+    sincronizar_con(ruta, ClienteFalso(["NCT00000001"]), completa=True)
+    cliente = ClienteFalso(["NCT00000002"])
+    assert sincronizar_con(ruta, cliente)["completo"]
+    # Parte del checkpoint de su ámbito (hoy, con un día de solape)
+    assert cliente.consultas[0]["lup_s"] == [(date.today() - timedelta(days=1)).strftime("%m/%d/%Y")]
+
+
+def test_descartes_retiran_la_cobertura(ruta):
+    sincronizar_con(ruta, ClienteFalso(["NCT00000001"]), completa=True)
+    estadisticas = sincronizar_con(ruta, ClienteFalso(["NCT00000002"], fallan={"NCT00000002"}))
+    assert estadisticas["descartados"] == 1 and not estadisticas["completo"]
+    assert IndiceEnsayos(ruta).cobertura(patologia="vitiligo") is None
+
+
+def test_feed_cortado_en_el_maximo_no_cubre(ruta):
+    estadisticas = sincronizar_con(ruta, ClienteFalso(["NCT00000001", "NCT00000002"]), completa=True, maximo=2)
+    assert estadisticas["guardados"] == 2 and not estadisticas["completo"]
+
+
+def test_checkpoint_por_ambito(ruta):
+    sincronizar_con(ruta, ClienteFalso([]), desde=date(2024, 1, 1))
+    checkpoint = Checkpoint(ruta)
+    assert checkpoint.desde(ambito(patologia="vitiligo")) == date.today()
+    assert checkpoint.desde() is None
+
+
+def test_retomar_ignora_desde_y_avisa(ruta, caplog):
+    cliente = ClienteFalso(["NCT00000001"], fallan={"NCT00000001"})
+    Checkpoint(ruta).planificar(["NCT00000001"], date.today(), ambito(patologia="vitiligo"))
+    sincronizar_con(ruta, cliente, desde=date(2024, 1, 1))
+    assert cliente.consultas == []  # no se planifica otra corrida mientras queden pendientes
+    assert "se retoma e ignora --desde" in caplog.text
@@ -0,0 +1,279 @@
+import asyncio
+import io
+import threading
+import time
+
+import httpx
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+import upstream
+from cache import BackendMemoria, CacheRespuestas
+from circuito import Circuito
+from upstream import BACKOFF_BASE, BACKOFF_MAX, ClienteUpstream, ClienteUpstreamAsync, espera_backoff
+
+URL = "http://upstream.test/ct2/show/NCT00000001?displayxml=true"
+
+
+@pytest.fixture
+def esperas(monkeypatch):
+    # (intento, Retry-After) de cada reintento, sin dormir
+    esperas = []
+    monkeypatch.setattr(upstream, "espera_backoff", lambda intento, retry_after=None: esperas.append(
+        (intento, retry_after)) or 0)
+    return esperas
+
+
+def guion(pasos):
+    # Cada paso es un código de estado, (código, cabeceras) o una excepción que se lanza
+    pasos = list(pasos)
+    return lambda: pasos.pop(0) if len(pasos) > 1 else pasos[0]
+
+
+# -------------------- BACKOFF --------------------
+def test_backoff_exponencial_con_full_jitter(monkeypatch):
+    rangos = []
+    monkeypatch.setattr(upstream.random, "uniform", lambda a, b: rangos.append((a, b)) or b)
+    for intento in range(8):
+        espera_backoff(intento)
+    assert rangos[:3] == [(0, BACKOFF_BASE), (0, BACKOFF_BASE * 2), (0, BACKOFF_BASE * 4)]
+    assert rangos[-1] == (0, BACKOFF_MAX)
+
+
+def test_retry_after_tiene_prioridad_y_se_acota():
+    assert espera_backoff(0, "2") == 2
+    assert espera_backoff(0, "3600") == BACKOFF_MAX
+    assert 0 <= espera_backoff(0, "Wed, 21 Oct 2026 07:28:00 GMT") <= BACKOFF_BASE  # fecha: se ignora
+
+
+# -------------------- CLIENTE SÍNCRONO --------------------
+class AdaptadorGuion(BaseAdapter):
+    """Responde según `siguiente()` y cuenta las peticiones y el máximo de peticiones simultáneas."""
+
+    def __init__(self, siguiente, espera=0.0):
+        super().__init__()
+        self.siguiente, self.espera = siguiente, espera
+        self.peticiones = self.simultaneas = self.max_simultaneas = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.peticiones += 1
+            self.simultaneas += 1
+            self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+            paso = self.siguiente()
+        try:
+            time.sleep(self.espera)
+            if isinstance(paso, Exception):
+                raise paso
+            estado, cabeceras = paso if isinstance(paso, tuple) else (paso, {})
+            response = requests.Response()
+            response.status_code = estado
+            response.headers = CaseInsensitiveDict(cabeceras)
+            response.raw = io.BytesIO(b"<clinical_study/>")
+            response.url = request.url
+            response.request = request
+            return response
+        finally:
+            with self._lock:
+                self.simultaneas -= 1
+
+    def close(self):
+        pass
+
+
+def cliente_sync(adaptador, **kwargs):
+    return ClienteUpstream(transporte=adaptador, cache=None, circuito=Circuito(umbral=100), **kwargs)
+
+
+def test_reintenta_5xx_y_429_respetando_retry_after(esperas):
+    adaptador = AdaptadorGuion(guion([503, (429, {"Retry-After": "2"}), 200]))
+    assert cliente_sync(adaptador, max_reintentos=3).get(URL).status_code == 200
+    assert adaptador.peticiones == 3
+    assert esperas == [(0, None), (1, "2")]
+
+
+def test_agotados_los_reintentos_lanza_el_error_http(esperas):
+    adaptador = AdaptadorGuion(guion([502]))
+    with pytest.raises(requests.HTTPError) as error:
+        cliente_sync(adaptador, max_reintentos=2).get(URL)
+    assert error.value.response.status_code == 502
+    assert adaptador.peticiones == 3 and len(esperas) == 2
+
+
+def test_un_404_no_se_reintenta(esperas):
+    adaptador = AdaptadorGuion(guion([404]))
+    with pytest.raises(requests.HTTPError):
+        cliente_sync(adaptador).get(URL)
+    assert adaptador.peticiones == 1 and esperas == []
+
+
+def test_timeouts_de_conexion_y_lectura(esperas):
+    adaptador = AdaptadorGuion(guion([requests.ConnectTimeout("connect"), requests.ReadTimeout("read"), 200]))
+    assert cliente_sync(adaptador, max_reintentos=2).get(URL).status_code == 200
+    adaptador = AdaptadorGuion(guion([requests.ReadTimeout("read")]))
+    with pytest.raises(requests.ReadTimeout):
+        cliente_sync(adaptador, max_reintentos=1).get(URL)
+    assert adaptador.peticiones == 2
+
+
+def test_limite_de_concurrencia_sync():
+    adaptador = AdaptadorGuion(guion([200]), espera=0.05)
+    cliente = cliente_sync(adaptador, max_concurrencia=3)
+    hilos = [threading.Thread(target=cliente.get, args=(f"{URL}&n={i}",)) for i in range(12)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert adaptador.peticiones == 12 and adaptador.max_simultaneas == 3
+
+
+def test_cuerpos_por_encima_del_limite_no_se_guardan_en_cache(monkeypatch):
+    cache = CacheRespuestas(BackendMemoria())
+    adaptador = AdaptadorGuion(guion([200]))
+    cliente = ClienteUpstream(transporte=adaptador, cache=cache, circuito=Circuito(umbral=100))
+    monkeypatch.setattr(upstream, "MAX_CUERPO_CACHE", len(b"<clinical_study/>") - 1)
+    assert b"".join(cliente.iterar(URL)) == b"<clinical_study/>"
+    assert cliente.obtener(URL) == b"<clinical_study/>"
+    assert cache.obtener(URL) is None and adaptador.peticiones == 2
+    monkeypatch.setattr(upstream, "MAX_CUERPO_CACHE", len(b"<clinical_study/>"))
+    assert b"".join(cliente.iterar(URL)) == b"<clinical_study/>"
+    assert cache.obtener(URL) == b"<clinical_study/>"
+
+
+def test_el_plazo_acota_el_timeout_de_cada_intento(esperas):
+    timeouts = []
+
+    class AdaptadorTimeouts(AdaptadorGuion):
+        def send(self, request, **kwargs):
+            timeouts.append(kwargs["timeout"])
+            return super().send(request, **kwargs)
+
+    cliente = cliente_sync(AdaptadorTimeouts(guion([200])), connect_timeout=5, read_timeout=30)
+    cliente.get(URL)
+    cliente.get(URL, plazo=time.monotonic() + 1)
+    assert timeouts[0] == (5, 30)
+    assert all(0 < t <= 1 for t in timeouts[1])
+
+
+def test_el_plazo_vencido_lanza_timeout_sin_reintentar(monkeypatch):
+    # Con el plazo agotado no se duerme el backoff ni se reintenta, y el circuito no lo cuenta
+    adaptador = AdaptadorGuion(guion([(503, {"Retry-After": "5"}), 200]))
+    cliente = cliente_sync(adaptador, max_reintentos=3)
+    with pytest.raises(TimeoutError):
+        cliente.get(URL, plazo=time.monotonic() + 1)
+    assert adaptador.peticiones == 1 and cliente.circuito._fallos == 0
+    adaptador = AdaptadorGuion(guion([requests.ReadTimeout("read"), 200]), espera=0.2)
+    with pytest.raises(TimeoutError):
+        cliente_sync(adaptador, max_reintentos=3).get(URL, plazo=time.monotonic() + 0.1)
+    assert adaptador.peticiones == 1
+
+
+def test_el_plazo_acota_la_espera_por_el_semaforo():
+    adaptador = AdaptadorGuion(guion([200]), espera=0.5)
+    cliente = cliente_sync(adaptador, max_concurrencia=1)
+    ocupante = threading.Thread(target=cliente.get, args=(URL,))
+    ocupante.start()
+    time.sleep(0.05)
+    inicio = time.monotonic()
+    with pytest.raises(TimeoutError):
+        cliente.get(f"{URL}&n=2", plazo=time.monotonic() + 0.1)
+    assert time.monotonic() - inicio < 0.3
+    ocupante.join()
+    assert adaptador.peticiones == 1
+
+
+def test_consumir_con_plazo_no_espera_a_la_llamada_en_curso():
+    from parseo import ConteoRSS
+
+    adaptador = AdaptadorGuion(guion([200]), espera=0.5)
+    cliente = cliente_sync(adaptador)
+    lider = threading.Thread(target=cliente.consumir, args=(URL, ConteoRSS))
+    lider.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        cliente.consumir(URL, ConteoRSS, plazo=time.monotonic() + 0.1)
+    lider.join()
+    assert adaptador.peticiones == 1
+
+
+# -------------------- CLIENTE ASÍNCRONO --------------------
+class TransporteGuion:
+    """Manejador de httpx.MockTransport con el mismo guion y contadores que AdaptadorGuion."""
+
+    def __init__(self, siguiente, espera=0.0):
+        self.siguiente, self.espera = siguiente, espera
+        self.peticiones = self.simultaneas = self.max_simultaneas = 0
+
+    async def __call__(self, request):
+        self.peticiones += 1
+        self.simultaneas += 1
+        self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+        try:
+            paso = self.siguiente()
+            await asyncio.sleep(self.espera)
+            if isinstance(paso, type) and issubclass(paso, httpx.TransportError):
+                raise paso("fallo simulado", request=request)
+            estado, cabeceras = paso if isinstance(paso, tuple) else (paso, {})
+            return httpx.Response(estado, headers=cabeceras, content=b"<clinical_study/>")
+        finally:
+            self.simultaneas -= 1
+
+
+def get_async(manejador, peticiones=1, **kwargs):
+    async def pedir():
+        cliente = ClienteUpstreamAsync(transporte=httpx.MockTransport(manejador), cache=None,
+                                       circuito=Circuito(umbral=100), **kwargs)
+        respuestas = await asyncio.gather(*(cliente.get(f"{URL}&n={i}") for i in range(peticiones)))
+        return respuestas[0]
+
+    return asyncio.run(pedir())
+
+
+def test_async_reintenta_5xx_y_429_respetando_retry_after(esperas):
+    manejador = TransporteGuion(guion([500, (429, {"Retry-After": "1"}), 200]))
+    assert get_async(manejador, max_reintentos=3).status_code == 200
+    assert manejador.peticiones == 3
+    assert esperas == [(0, None), (1, "1")]
+
+
+def test_async_agotados_los_reintentos_lanza_el_error_http(esperas):
+    manejador = TransporteGuion(guion([503]))
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        get_async(manejador, max_reintentos=2)
+    assert error.value.response.status_code == 503
+    assert manejador.peticiones == 3 and len(esperas) == 2
+
+
+def test_async_timeouts_de_conexion_y_lectura(esperas):
+    manejador = TransporteGuion(guion([httpx.ConnectTimeout, httpx.ReadTimeout, 200]))
+    assert get_async(manejador, max_reintentos=2).status_code == 200
+    manejador = TransporteGuion(guion([httpx.ConnectTimeout]))
+    with pytest.raises(httpx.ConnectTimeout):
+        get_async(manejador, max_reintentos=1)
+    assert manejador.peticiones == 2
+
+
+def test_async_limite_de_concurrencia():
+    manejador = TransporteGuion(guion([200]), espera=0.02)
+    get_async(manejador, peticiones=12, max_concurrencia=3)
+    assert manejador.peticiones == 12 and manejador.max_simultaneas == 3
+
+
+def test_async_cuerpos_por_encima_del_limite_no_se_guardan_en_cache(monkeypatch):
+    async def prueba():
+        cache = CacheRespuestas(BackendMemoria())
+        cliente = ClienteUpstreamAsync(transporte=httpx.MockTransport(TransporteGuion(guion([200]))), cache=cache,
+                                       circuito=Circuito(umbral=100))
+        try:
+            cuerpo = b"".join([chunk async for chunk in cliente.iterar(URL)])
+            obtenido = await cliente.obtener(URL)
+        finally:
+            await cliente.aclose()
+        assert cuerpo == obtenido == b"<clinical_study/>"
+        assert cache.obtener(URL) is None
+
+    monkeypatch.setattr(upstream, "MAX_CUERPO_CACHE", 8)
+    asyncio.run(prueba())
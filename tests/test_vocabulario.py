@@ -0,0 +1,60 @@
+import json
+
+from vocabulario import IndicePrefijos, cargar, plegar
+
+ENTRADAS = [
+    ("molecula", "ruxolitinib", ["Opzelura", "INCB018424"]),
+    ("molecula", "rituximab", ["Rituxan"]),
+    ("patologia", "rheumatoid arthritis", ["RA"]),
+    ("patologia", "psoriatic arthritis", []),
+    ("patologia", "vitiligo", ["Vitíligo", "leucodermia"]),
+]
+
+
+def terminos(sugerencias):
+    return [s["termino"] for s in sugerencias]
+
+
+def test_plegar():
+    assert plegar("  Cáncer   de  MAMA ") == "cancer de mama"
+    assert plegar(None) == ""
+
+
+def test_autocompletar_prefiere_inicio_y_nombres_cortos():
+    indice = IndicePrefijos(ENTRADAS)
+    assert terminos(indice.autocompletar("ri")) == ["rituximab"]
+    # Un canónico aparece una vez, por su forma más corta: "ra" pone primero a la artritis reumatoide
+    assert [(s["termino"], s["coincide"]) for s in indice.autocompletar("r")] == [
+        ("rheumatoid arthritis", "ra"), ("rituximab", "rituxan"), ("ruxolitinib", "ruxolitinib")]
+    # "arthritis" encuentra los nombres que la contienen como palabra
+    assert sorted(terminos(indice.autocompletar("arthr"))) == ["psoriatic arthritis", "rheumatoid arthritis"]
+    assert indice.autocompletar("xyz") == []
+
+
+def test_autocompletar_por_sinonimo_y_tipo():
+    indice = IndicePrefijos(ENTRADAS)
+    assert indice.autocompletar("opz") == [{"termino": "ruxolitinib", "tipo": "molecula", "coincide": "opzelura"}]
+    assert terminos(indice.autocompletar("vitil", tipo="patologia")) == ["vitiligo"]
+    assert indice.autocompletar("vitil", tipo="molecula") == []
+
+
+def test_autocompletar_respeta_maximo_y_limite():
+    indice = IndicePrefijos([("molecula", f"farmaco {i}", []) for i in range(20)], maximo=5)
+    assert len(indice.autocompletar("farm")) == 5
+    assert len(indice.autocompletar("farm", limite=2)) == 2
+
+
+def test_canonizar_y_variantes():
+    indice = IndicePrefijos(ENTRADAS)
+    assert indice.canonizar("OPZELURA", "molecula") == "ruxolitinib"
+    assert indice.canonizar("Vitíligo", "patologia") == "vitiligo"
+    assert indice.canonizar("Desconocida", "patologia") == "desconocida"  # sin sinónimo: solo se pliega
+    assert indice.canonizar("Opzelura", "patologia") == "opzelura"  # los sinónimos son por tipo
+    assert indice.variantes("leucodermia", "patologia") == ("vitiligo", "vitíligo", "leucodermia")
+
+
+def test_cargar(tmp_path):
+    ruta = tmp_path / "vocabulario.json"
+    ruta.write_text(json.dumps({"moleculas": {"Ruxolitinib": ["Opzelura"]}, "patologias": {}}), encoding="utf-8")
+    assert len(cargar(str(ruta))) == 1
+    assert len(cargar(str(tmp_path / "no_existe.json"))) == 0
@@ -0,0 +1,713 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from cache import cache as cache_compartida, normalizar_url, validadores
+from circuito import Circuito, CircuitoAbierto
+from metricas import contar_upstream, etapa, observar_etapa
+from singleflight import SingleFlight, SingleFlightAsync
+from vocabulario import canonizar_molecula, canonizar_patologia
+
+# -------------------- CONFIGURACIÓN --------------------
+BASE_URL = os.environ.get("CLINICALTRIALS_BASE_URL", "https://clinicaltrials.gov").rstrip("/")
+POOL_SIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", 20))
+CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("UPSTREAM_READ_TIMEOUT", 15))
+MAX_REINTENTOS = int(os.environ.get("UPSTREAM_MAX_REINTENTOS", 3))
+BACKOFF_BASE = float(os.environ.get("UPSTREAM_BACKOFF_BASE", 0.25))
+BACKOFF_MAX = float(os.environ.get("UPSTREAM_BACKOFF_MAX", 4))
+MAX_CONCURRENCIA = int(os.environ.get("UPSTREAM_MAX_CONCURRENCIA", 20))
+TAMANO_CHUNK = int(os.environ.get("UPSTREAM_TAMANO_CHUNK", 64 * 1024))
+# Cuerpos más grandes no se guardan en caché ni se retienen en memoria durante la descarga
+MAX_CUERPO_CACHE = int(os.environ.get("UPSTREAM_MAX_CUERPO_CACHE", 16 * 2 ** 20))
+CALENTAR_CONEXIONES = int(os.environ.get("UPSTREAM_CALENTAR_CONEXIONES", 4))  # conexiones abiertas al arrancar
+
+ESTADOS_REINTENTABLES = frozenset({429, 500, 502, 503, 504})
+
+
+# -------------------- URLS --------------------
+# Los términos se canonizan ("Cáncer" -> "cancer", "semaglutida" -> "semaglutide"): las variantes
+# de una misma búsqueda comparten URL y, con ella, entrada de caché y descarga en curso.
+def url_busqueda(molecula=None, patologia=None, base_url=BASE_URL):
+    query = urlencode({"term": canonizar_molecula(molecula) or "", "cond": canonizar_patologia(patologia) or ""})
+    return f"{base_url}/ct2/results/rss.xml?{query}"
+
+
+def url_cambios(desde, molecula=None, patologia=None, maximo=10000, base_url=BASE_URL):
+    # Estudios con "last update posted" desde la fecha dada (sincronización incremental)
+    query = urlencode({"term": canonizar_molecula(molecula) or "", "cond": canonizar_patologia(patologia) or "",
+                       "lup_s": desde.strftime("%m/%d/%Y"), "count": maximo})
+    return f"{base_url}/ct2/results/rss.xml?{query}"
+
+
+def url_estudio(ensayo_id, base_url=BASE_URL):
+    return f"{base_url}/ct2/show/{ensayo_id}?displayxml=true"
+
+
+def espera_backoff(intento, retry_after=None):
+    # Backoff exponencial con "full jitter"; Retry-After del servidor tiene prioridad
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** intento)))
+
+
+def trocear(contenido, tamano_chunk=TAMANO_CHUNK):
+    for inicio in range(0, len(contenido), tamano_chunk):
+        yield contenido[inicio:inicio + tamano_chunk]
+
+
+def restante(plazo):
+    # Segundos hasta `plazo` (time.monotonic()), nunca negativos; None sin plazo
+    return None if plazo is None else max(0.0, plazo - time.monotonic())
+
+
+class CopiaCuerpo:
+    """Trozos ya entregados de una descarga en streaming, para guardarla en caché al terminar.
+    Al pasar de MAX_CUERPO_CACHE bytes los suelta y deja de acumular."""
+
+    __slots__ = ("partes", "tamano")
+
+    def __init__(self):
+        self.partes = []
+        self.tamano = 0
+
+    def agregar(self, chunk):
+        # False si el cuerpo ya no cabe (y no se va a guardar)
+        if self.partes is None:
+            return False
+        self.tamano += len(chunk)
+        if self.tamano > MAX_CUERPO_CACHE:
+            self.partes = None
+            return False
+        self.partes.append(chunk)
+        return True
+
+    def cuerpo(self):
+        return b"".join(self.partes) if self.partes is not None else None
+
+
+# -------------------- DATOS OBSOLETOS --------------------
+# Origen de un contenido: "upstream", "cache" (fresco) u "obsoleto" (copia
+# caducada servida porque el upstream falló o el circuito está abierto).
+# Cada petición abre un registro donde los clientes anotan la antigüedad de lo
+# obsoleto que sirven; es un dict mutable para que también lo vean las tareas
+# e hilos que copian el contexto (run_in_threadpool, gather...).
+_obsolescencia = contextvars.ContextVar("obsolescencia", default=None)
+
+
+def vigilar_obsolescencia():
+    registro = {}
+    _obsolescencia.set(registro)
+    return registro
+
+
+def _anotar_obsoleto(antiguedad):
+    registro = _obsolescencia.get()
+    if registro is not None:
+        registro["antiguedad"] = max(registro.get("antiguedad", 0), antiguedad)
+
+
+def cabeceras_obsolescencia(registro):
+    if not registro:
+        return {}
+    return {"Warning": '110 - "Response is Stale"', "X-Datos-Obsoletos": str(int(registro["antiguedad"]))}
+
+
+# -------------------- CLIENTE SÍNCRONO --------------------
+class ClienteUpstream:
+    """Cliente HTTP compartido hacia ClinicalTrials.gov.
+
+    Mantiene un pool keep-alive, aplica timeouts de conexión/lectura, reintenta
+    con backoff ante 5xx/429 y limita las peticiones simultáneas al upstream.
+    `transporte` permite montar otro adaptador de requests (p. ej. para tests)
+    y `cache` una CacheRespuestas (None la desactiva). Si la copia en caché
+    caducó pero el upstream dio ETag/Last-Modified, el GET es condicional y un
+    304 la renueva sin descargar el cuerpo (origen "cache"). `obtener` acepta una
+    función `procesar` (p. ej. ET.fromstring) cuyo resultado se comparte entre
+    las llamadas concurrentes a la misma URL; con `con_origen=True` devuelve
+    además su origen ("upstream", "cache" u "obsoleto"). `iterar` y `consumir`
+    procesan el cuerpo en trozos a medida que se descarga (ver parseo.py).
+
+    Las llamadas pasan por un circuit breaker (circuito.py). Si el upstream
+    falla o el circuito está abierto se sirve la última copia buena de la
+    caché, aunque haya caducado, y se anota su antigüedad en el registro de
+    la petición; sin copia, el error (o CircuitoAbierto) se propaga.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_reintentos=MAX_REINTENTOS,
+                 max_concurrencia=MAX_CONCURRENCIA, transporte=None, cache=cache_compartida, circuito=None):
+        # requests se importa aquí: la app FastAPI usa el cliente asíncrono y no lo carga
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._requests = requests
+        self.cache = cache
+        self.circuito = circuito if circuito is not None else Circuito()
+        self._vuelos = SingleFlight()
+        self._streams = SingleFlight()
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_reintentos = max_reintentos
+        self._semaforo = threading.BoundedSemaphore(max_concurrencia)
+        self.session = requests.Session()
+        adaptador = transporte or HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adaptador)
+        self.session.mount("https://", adaptador)
+
+    def get(self, url, stream=False, cabeceras=None, plazo=None):
+        # Con el circuito abierto falla al instante (CircuitoAbierto) sin tocar el upstream
+        try:
+            sonda = self.circuito.entrar()
+        except CircuitoAbierto:
+            contar_upstream("circuito_abierto")
+            raise
+        try:
+            response = self._get(url, stream, cabeceras, plazo)
+        except TimeoutError:
+            # Vence el plazo de quien llama, no es un veredicto sobre el upstream
+            self.circuito.registrar(None, sonda)
+            raise
+        except Exception as e:
+            self.circuito.registrar(not self._es_fallo(e), sonda)
+            raise
+        except BaseException:
+            self.circuito.registrar(None, sonda)
+            raise
+        self.circuito.registrar(True, sonda)
+        return response
+
+    def _get(self, url, stream, cabeceras=None, plazo=None):
+        # `plazo` (time.monotonic()) acota la espera por el semáforo, los timeouts y los reintentos:
+        # al vencer se lanza TimeoutError en lugar de seguir esperando
+        intento = 0
+        while True:
+            if not self._semaforo.acquire(timeout=restante(plazo)):
+                raise TimeoutError("Plazo agotado esperando turno para el upstream")
+            try:
+                timeout = self.timeout if plazo is None else tuple(min(t, restante(plazo)) for t in self.timeout)
+                response = self.session.get(url, headers=cabeceras, timeout=timeout, stream=stream)
+                contar_upstream(response.status_code)
+            except (self._requests.ConnectionError, self._requests.Timeout) as e:
+                contar_upstream("error")
+                if plazo is not None and restante(plazo) <= 0:
+                    raise TimeoutError("Plazo agotado esperando al upstream") from e
+                if intento >= self.max_reintentos:
+                    raise
+                response = None
+            finally:
+                self._semaforo.release()
+            if response is not None and (response.status_code not in ESTADOS_REINTENTABLES
+                                         or intento >= self.max_reintentos):
+                if not response.ok:
+                    response.close()
+                response.raise_for_status()
+                return response
+            retry_after = None
+            if response is not None:
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+            espera = espera_backoff(intento, retry_after)
+            if plazo is not None and espera >= restante(plazo):
+                raise TimeoutError("Plazo agotado antes del siguiente reintento")
+            time.sleep(espera)
+            intento += 1
+
+    def _es_fallo(self, error):
+        # Caída, timeout o 5xx/429 agotados los reintentos; un 404 es una respuesta válida
+        if isinstance(error, self._requests.HTTPError):
+            return error.response is not None and error.response.status_code in ESTADOS_REINTENTABLES
+        return isinstance(error, (CircuitoAbierto, self._requests.ConnectionError, self._requests.Timeout))
+
+    def _respaldo(self, url, error):
+        # Copia caducada (contenido, antigüedad) si el fallo es del upstream y la caché la conserva
+        if self.cache is None or not self._es_fallo(error):
+            return None
+        return self.cache.obtener_obsoleto(url)
+
+    def _pedir(self, url, stream=False, plazo=None):
+        # GET condicional si hay validadores: (response, None) o, tras un 304, (None, copia renovada)
+        cabeceras = self.cache.condiciones(url) if self.cache is not None else None
+        response = self.get(url, stream, cabeceras, plazo)
+        if response.status_code != 304:
+            return response, None
+        response.close()
+        contenido = self.cache.revalidar(url, validadores(response.headers))
+        if contenido is None:
+            # Desalojada entre la consulta y la respuesta: se pide entera
+            return self.get(url, stream, plazo=plazo), None
+        return None, contenido
+
+    def obtener(self, url, procesar=None, con_origen=False):
+        # Las llamadas concurrentes a la misma URL comparten descarga y resultado de `procesar`
+        resultado, origen, antiguedad = self._vuelos.hacer((normalizar_url(url), procesar),
+                                                           lambda: self._obtener(url, procesar))
+        if origen == "obsoleto":
+            _anotar_obsoleto(antiguedad)
+        return (resultado, origen) if con_origen else resultado
+
+    def _obtener(self, url, procesar):
+        contenido = self.cache.obtener(url) if self.cache is not None else None
+        origen, antiguedad = "cache", None
+        if contenido is None:
+            try:
+                with etapa("upstream"):
+                    response, contenido = self._pedir(url)
+                    if response is not None:
+                        contenido = response.content
+            except Exception as e:
+                obsoleto = self._respaldo(url, e)
+                if obsoleto is None:
+                    raise
+                (contenido, antiguedad), origen = obsoleto, "obsoleto"
+            else:
+                if response is not None:
+                    origen = "upstream"
+                    if self.cache is not None and len(contenido) <= MAX_CUERPO_CACHE:
+                        self.cache.guardar(url, contenido, validadores(response.headers))
+        if procesar is None:
+            return contenido, origen, antiguedad
+        with etapa("parseo"):
+            return procesar(contenido), origen, antiguedad
+
+    def _fuente(self, url, plazo=None):
+        # (contenido, origen, antigüedad) de la caché o de una copia obsoleta; (response, "upstream", None)
+        # si hay que descargarlo
+        contenido = self.cache.obtener(url) if self.cache is not None else None
+        if contenido is not None:
+            return contenido, "cache", None
+        try:
+            response, revalidado = self._pedir(url, stream=True, plazo=plazo)
+        except Exception as e:
+            obsoleto = self._respaldo(url, e)
+            if obsoleto is None:
+                raise
+            return obsoleto[0], "obsoleto", obsoleto[1]
+        if response is None:
+            return revalidado, "cache", None
+        return response, "upstream", None
+
+    def iterar(self, url):
+        # Streams concurrentes de la misma URL sin copia en caché: el primero descarga y entrega según
+        # llega; el resto espera a que termine y recibe el cuerpo entero (o su misma excepción). Si el
+        # primero deja de leer antes del final con alguien esperando, la descarga sigue para ellos.
+        # Excepción: si el primero se queda sin el cuerpo entero (cancelado, o más de MAX_CUERPO_CACHE
+        # bytes, que no se retienen) los que esperaban descargan cada uno el suyo, sin volver a esperar.
+        clave = normalizar_url(url)
+        while True:
+            contenido = self.cache.obtener(url) if self.cache is not None else None
+            if contenido is not None:
+                yield from trocear(contenido)
+                return
+            vuelo, lider = self._streams.abrir(clave)
+            if lider:
+                stream = (clave, vuelo)
+                break
+            vuelo.evento.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            if vuelo.resultado is None:
+                stream = None
+                break
+            contenido, origen, antiguedad = vuelo.resultado
+            if origen == "obsoleto":
+                _anotar_obsoleto(antiguedad)
+            yield from trocear(contenido)
+            return
+        try:
+            fuente, origen, antiguedad = self._fuente(url)
+        except Exception as e:
+            self._soltar(stream, error=e)
+            raise
+        except BaseException:
+            self._soltar(stream)
+            raise
+        if origen != "upstream":
+            self._soltar(stream, (fuente, origen, antiguedad))
+            if origen == "obsoleto":
+                _anotar_obsoleto(antiguedad)
+            yield from trocear(fuente)
+            return
+        yield from self._descargar(url, fuente, stream)
+
+    def _soltar(self, stream, resultado=None, error=None):
+        # Cierra el vuelo de un stream de `iterar` (si lo lidera) y despierta a quien lo espera
+        if stream is not None:
+            self._streams.cerrar(*stream, resultado, error)
+
+    def consumir(self, url, consumidor, con_origen=False, plazo=None):
+        # `consumidor` es una clase con feed(chunk)/close(); su resultado se comparte como en `obtener`.
+        # Con `plazo` (time.monotonic()) lanza TimeoutError al vencer, también esperando a otra llamada.
+        resultado, origen, antiguedad = self._vuelos.hacer((normalizar_url(url), consumidor),
+                                                           lambda: self._consumir(url, consumidor, plazo),
+                                                           restante(plazo))
+        if origen == "obsoleto":
+            _anotar_obsoleto(antiguedad)
+        return (resultado, origen) if con_origen else resultado
+
+    def _consumir(self, url, consumidor, plazo=None):
+        # El parseo va intercalado con la descarga: se cronometra aparte el tiempo dentro de feed/close
+        inicio = time.perf_counter()
+        parseo = 0.0
+        instancia = consumidor()
+        fuente, origen, antiguedad = self._fuente(url, plazo)
+        for chunk in self._descargar(url, fuente) if origen == "upstream" else trocear(fuente):
+            if plazo is not None and restante(plazo) <= 0:
+                raise TimeoutError("Plazo agotado descargando del upstream")
+            t = time.perf_counter()
+            instancia.feed(chunk)
+            parseo += time.perf_counter() - t
+        t = time.perf_counter()
+        resultado = instancia.close()
+        fin = time.perf_counter()
+        observar_etapa("parseo", parseo + fin - t)
+        if origen == "upstream":
+            observar_etapa("upstream", t - inicio - parseo)
+        return resultado, origen, antiguedad
+
+    def _descargar(self, url, response, stream=None):
+        # Entrega el cuerpo según llega. Si se descarga entero (y no pasa de MAX_CUERPO_CACHE) se guarda en
+        # caché y se pasa a quien espera el `stream` de iterar; si pasa, se deja de retener al momento.
+        copia = CopiaCuerpo()
+        cuerpo = error = None
+        chunks = response.iter_content(TAMANO_CHUNK)
+        try:
+            for chunk in chunks:
+                if not copia.agregar(chunk) and stream is not None:
+                    # Quien espera no va a recibir el cuerpo: que empiece ya su propia descarga
+                    self._soltar(stream)
+                    stream = None
+                yield chunk
+            cuerpo = copia.cuerpo()
+        except GeneratorExit:
+            if stream is not None and stream[1].esperando:
+                try:
+                    for chunk in chunks:
+                        if not copia.agregar(chunk):
+                            break
+                    cuerpo = copia.cuerpo()
+                except Exception:
+                    pass
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            response.close()
+            if cuerpo is not None and self.cache is not None:
+                self.cache.guardar(url, cuerpo, validadores(response.headers))
+            self._soltar(stream, (cuerpo, "upstream", None) if cuerpo is not None else None, error)
+
+    def calentar(self, conexiones=CALENTAR_CONEXIONES, url=BASE_URL + "/"):
+        # Abre `conexiones` conexiones keep-alive antes de la primera petición real (HEAD en paralelo,
+        # una conexión cada uno). Cualquier respuesta deja la conexión en el pool; los fallos se ignoran.
+        def abrir(_):
+            try:
+                self.session.head(url, timeout=self.timeout).close()
+            except self._requests.RequestException:
+                pass
+
+        with ThreadPoolExecutor(max(1, conexiones)) as pool:
+            list(pool.map(abrir, range(conexiones)))
+
+    def close(self):
+        self.session.close()
+
+
+def __getattr__(nombre):
+    # `cliente` se crea en el primer `from upstream import cliente` (app Flask); quien solo usa
+    # el cliente asíncrono no paga la importación de requests
+    if nombre == "cliente":
+        global cliente
+        cliente = ClienteUpstream()
+        return cliente
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+# -------------------- CLIENTE ASÍNCRONO --------------------
+MAX_CONCURRENCIA_ASYNC = int(os.environ.get("UPSTREAM_MAX_CONCURRENCIA_ASYNC", 1000))
+
+
+class ClienteUpstreamAsync:
+    """Equivalente asíncrono de ClienteUpstream sobre httpx.AsyncClient.
+
+    Pensado para abrirse y cerrarse en el lifespan de la app FastAPI, de modo
+    que miles de llamadas lentas al upstream compartan un único event loop.
+    `transporte` acepta cualquier httpx.AsyncBaseTransport.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_reintentos=MAX_REINTENTOS,
+                 max_concurrencia=MAX_CONCURRENCIA_ASYNC, transporte=None, cache=cache_compartida, circuito=None):
+        import httpx
+
+        self.cache = cache
+        self.circuito = circuito if circuito is not None else Circuito()
+        self._vuelos = SingleFlightAsync()
+        self._streams = SingleFlightAsync()
+        self._httpx = httpx
+        self.max_reintentos = max_reintentos
+        self._semaforo = asyncio.Semaphore(max_concurrencia)
+        # El pool de httpcore recorre todas sus conexiones por cada petición en
+        # cola (coste cuadrático con cientos de conexiones), así que repartimos
+        # la concurrencia entre varios clientes con pools pequeños.
+        n_clientes = 1 if transporte is not None else max(1, -(-max_concurrencia // pool_size))
+        # Un solo contexto TLS para todos: cargar los certificados de CA cuesta ~50 ms por cliente
+        # y, con decenas de clientes, segundos de arranque
+        contexto_tls = httpx.create_ssl_context()
+        self.clientes = [
+            httpx.AsyncClient(
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=None),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                transport=transporte,
+                verify=contexto_tls,
+            )
+            for _ in range(n_clientes)
+        ]
+        self._turno = itertools.cycle(self.clientes)
+
+    async def get(self, url, stream=False, cabeceras=None):
+        try:
+            sonda = self.circuito.entrar()
+        except CircuitoAbierto:
+            contar_upstream("circuito_abierto")
+            raise
+        try:
+            response = await self._get(url, stream, cabeceras)
+        except Exception as e:
+            self.circuito.registrar(not self._es_fallo(e), sonda)
+            raise
+        except BaseException:
+            self.circuito.registrar(None, sonda)
+            raise
+        self.circuito.registrar(True, sonda)
+        return response
+
+    async def _get(self, url, stream, cabeceras=None):
+        intento = 0
+        while True:
+            async with self._semaforo:
+                client = next(self._turno)
+                try:
+                    response = await client.send(client.build_request("GET", url, headers=cabeceras), stream=stream)
+                    contar_upstream(response.status_code)
+                except self._httpx.TransportError:
+                    contar_upstream("error")
+                    if intento >= self.max_reintentos:
+                        raise
+                    response = None
+            if response is not None and (response.status_code not in ESTADOS_REINTENTABLES
+                                         or intento >= self.max_reintentos):
+                if response.status_code == 304:
+                    # httpx trata los 3xx como error en raise_for_status
+                    await response.aclose()
+                    return response
+                if not response.is_success:
+                    await response.aclose()
+                response.raise_for_status()
+                return response
+            retry_after = None
+            if response is not None:
+                retry_after = response.headers.get("Retry-After")
+                await response.aclose()
+            await asyncio.sleep(espera_backoff(intento, retry_after))
+            intento += 1
+
+    def _es_fallo(self, error):
+        if isinstance(error, self._httpx.HTTPStatusError):
+            return error.response.status_code in ESTADOS_REINTENTABLES
+        return isinstance(error, (CircuitoAbierto, self._httpx.TransportError))
+
+    def _respaldo(self, url, error):
+        if self.cache is None or not self._es_fallo(error):
+            return None
+        return self.cache.obtener_obsoleto(url)
+
+    async def _pedir(self, url, stream=False):
+        cabeceras = self.cache.condiciones(url) if self.cache is not None else None
+        response = await self.get(url, stream, cabeceras)
+        if response.status_code != 304:
+            return response, None
+        contenido = self.cache.revalidar(url, validadores(response.headers))
+        if contenido is None:
+            return await self.get(url, stream), None
+        return None, contenido
+
+    async def obtener(self, url, procesar=None, con_origen=False):
+        resultado, origen, antiguedad = await self._vuelos.hacer((normalizar_url(url), procesar),
+                                                                 lambda: self._obtener(url, procesar))
+        if origen == "obsoleto":
+            _anotar_obsoleto(antiguedad)
+        return (resultado, origen) if con_origen else resultado
+
+    async def _obtener(self, url, procesar):
+        contenido = self.cache.obtener(url) if self.cache is not None else None
+        origen, antiguedad = "cache", None
+        if contenido is None:
+            try:
+                with etapa("upstream"):
+                    response, contenido = await self._pedir(url)
+                    if response is not None:
+                        contenido = response.content
+            except Exception as e:
+                obsoleto = self._respaldo(url, e)
+                if obsoleto is None:
+                    raise
+                (contenido, antiguedad), origen = obsoleto, "obsoleto"
+            else:
+                if response is not None:
+                    origen = "upstream"
+                    if self.cache is not None and len(contenido) <= MAX_CUERPO_CACHE:
+                        self.cache.guardar(url, contenido, validadores(response.headers))
+        if procesar is None:
+            return contenido, origen, antiguedad
+        with etapa("parseo"):
+            return procesar(contenido), origen, antiguedad
+
+    async def _fuente(self, url):
+        contenido = self.cache.obtener(url) if self.cache is not None else None
+        if contenido is not None:
+            return contenido, "cache", None
+        try:
+            response, revalidado = await self._pedir(url, stream=True)
+        except Exception as e:
+            obsoleto = self._respaldo(url, e)
+            if obsoleto is None:
+                raise
+            return obsoleto[0], "obsoleto", obsoleto[1]
+        if response is None:
+            return revalidado, "cache", None
+        return response, "upstream", None
+
+    async def iterar(self, url):
+        # Como ClienteUpstream.iterar: un solo stream en frío por URL y el resto espera su cuerpo
+        clave = normalizar_url(url)
+        while True:
+            contenido = self.cache.obtener(url) if self.cache is not None else None
+            if contenido is not None:
+                for chunk in trocear(contenido):
+                    yield chunk
+                return
+            vuelo, lider = self._streams.abrir(clave)
+            if lider:
+                stream = (clave, vuelo)
+                break
+            await vuelo.evento.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            if vuelo.resultado is None:
+                stream = None
+                break
+            contenido, origen, antiguedad = vuelo.resultado
+            if origen == "obsoleto":
+                _anotar_obsoleto(antiguedad)
+            for chunk in trocear(contenido):
+                yield chunk
+            return
+        try:
+            fuente, origen, antiguedad = await self._fuente(url)
+        except Exception as e:
+            self._soltar(stream, error=e)
+            raise
+        except BaseException:
+            self._soltar(stream)
+            raise
+        if origen != "upstream":
+            self._soltar(stream, (fuente, origen, antiguedad))
+            if origen == "obsoleto":
+                _anotar_obsoleto(antiguedad)
+            for chunk in trocear(fuente):
+                yield chunk
+            return
+        async with aclosing(self._descargar(url, fuente, stream)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    def _soltar(self, stream, resultado=None, error=None):
+        if stream is not None:
+            self._streams.cerrar(*stream, resultado, error)
+
+    async def consumir(self, url, consumidor, con_origen=False):
+        resultado, origen, antiguedad = await self._vuelos.hacer((normalizar_url(url), consumidor),
+                                                                 lambda: self._consumir(url, consumidor))
+        if origen == "obsoleto":
+            _anotar_obsoleto(antiguedad)
+        return (resultado, origen) if con_origen else resultado
+
+    async def _consumir(self, url, consumidor):
+        inicio = time.perf_counter()
+        parseo = 0.0
+        instancia = consumidor()
+        fuente, origen, antiguedad = await self._fuente(url)
+        if origen != "upstream":
+            for chunk in trocear(fuente):
+                t = time.perf_counter()
+                instancia.feed(chunk)
+                parseo += time.perf_counter() - t
+        else:
+            async with aclosing(self._descargar(url, fuente)) as chunks:
+                async for chunk in chunks:
+                    t = time.perf_counter()
+                    instancia.feed(chunk)
+                    parseo += time.perf_counter() - t
+        t = time.perf_counter()
+        resultado = instancia.close()
+        fin = time.perf_counter()
+        observar_etapa("parseo", parseo + fin - t)
+        if origen == "upstream":
+            observar_etapa("upstream", t - inicio - parseo)
+        return resultado, origen, antiguedad
+
+    async def _descargar(self, url, response, stream=None):
+        copia = CopiaCuerpo()
+        cuerpo = error = None
+        chunks = response.aiter_bytes(TAMANO_CHUNK)
+        try:
+            async for chunk in chunks:
+                if not copia.agregar(chunk) and stream is not None:
+                    # Quien espera no va a recibir el cuerpo: que empiece ya su propia descarga
+                    self._soltar(stream)
+                    stream = None
+                yield chunk
+            cuerpo = copia.cuerpo()
+        except GeneratorExit:
+            if stream is not None and stream[1].esperando:
+                try:
+                    async for chunk in chunks:
+                        if not copia.agregar(chunk):
+                            break
+                    cuerpo = copia.cuerpo()
+                except Exception:
+                    pass
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            await response.aclose()
+            if cuerpo is not None and self.cache is not None:
+                self.cache.guardar(url, cuerpo, validadores(response.headers))
+            self._soltar(stream, (cuerpo, "upstream", None) if cuerpo is not None else None, error)
+
+    async def calentar(self, conexiones=CALENTAR_CONEXIONES, url=BASE_URL + "/"):
+        # Como ClienteUpstream.calentar, repartiendo las conexiones entre los clientes del pool
+        async def abrir(client):
+            try:
+                await client.head(url)
+            except self._httpx.HTTPError:
+                pass
+
+        await asyncio.gather(*(abrir(next(self._turno)) for _ in range(conexiones)))
+
+    async def aclose(self):
+        for client in self.clientes:
+            await client.aclose()
@@ -0,0 +1,114 @@
+import json
+import os
+import unicodedata
+
+# -------------------- CONFIGURACIÓN --------------------
+VOCABULARIO_RUTA = os.environ.get(
+    "VOCABULARIO_RUTA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vocabulario.json")
+)
+AUTOCOMPLETAR_MAX = int(os.environ.get("AUTOCOMPLETAR_MAX", 10))
+
+# Secciones del JSON: {"moleculas": {canónico: [sinónimos...]}, "patologias": {...}}
+TIPOS = {"moleculas": "molecula", "patologias": "patologia"}
+
+
+def plegar(texto):
+    # Minúsculas, sin tildes ni diéresis y con un solo espacio entre palabras: "  Cáncer " -> "cancer"
+    texto = (texto or "").lower()
+    if not texto.isascii():
+        texto = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
+
+# -------------------- ÍNDICE DE PREFIJOS --------------------
+class IndicePrefijos:
+    """Trie de nombres de moléculas y patologías con sus sinónimos, plegados con `plegar`.
+
+    Cada nombre se inserta desde el principio de cada una de sus palabras
+    ("arthritis" encuentra "rheumatoid arthritis") y cada nodo guarda ya
+    ordenadas las mejores `maximo` sugerencias de su subárbol, así que
+    autocompletar cuesta O(len(prefijo)) sin recorrer nada más.
+    """
+
+    def __init__(self, entradas=(), maximo=AUTOCOMPLETAR_MAX):
+        # entradas: (tipo, canónico, sinónimos)
+        self.maximo = maximo
+        self._canonicos = {}  # (tipo, forma plegada) -> canónico
+        self._variantes = {}  # (tipo, canónico) -> formas escritas, en minúsculas
+        self._raiz = ({}, {})  # nodo: (hijos por carácter, sugerencias por tipo; None = todos)
+        claves = []
+        for tipo, canonico, sinonimos in entradas:
+            canonico = " ".join(canonico.lower().split())
+            formas = tuple(dict.fromkeys([canonico] + [" ".join(s.lower().split()) for s in sinonimos]))
+            self._variantes[(tipo, canonico)] = formas
+            for forma in formas:
+                plegada = plegar(forma)
+                self._canonicos.setdefault((tipo, plegada), canonico)
+                sugerencia = {"termino": canonico, "tipo": tipo, "coincide": forma}
+                for inicio in [0] + [i + 1 for i, c in enumerate(plegada) if c == " "]:
+                    # Antes lo que empieza por el prefijo, luego los nombres más cortos
+                    claves.append(((inicio > 0, len(plegada), plegada), plegada[inicio:], sugerencia))
+        # Insertando en orden, cada nodo se llena con sus mejores sugerencias y no hay que ordenarlo
+        claves.sort(key=lambda clave: clave[0])
+        for _, trozo, sugerencia in claves:
+            nodo = self._raiz
+            for c in trozo:
+                nodo = nodo[0].setdefault(c, ({}, {}))
+                for tipo in (None, sugerencia["tipo"]):
+                    # Una sugerencia por canónico: la de la forma mejor situada
+                    elegidas = nodo[1].setdefault(tipo, {})
+                    if len(elegidas) < self.maximo:
+                        elegidas.setdefault((sugerencia["tipo"], sugerencia["termino"]), sugerencia)
+        pendientes = [self._raiz]
+        while pendientes:
+            hijos, sugerencias = pendientes.pop()
+            pendientes.extend(hijos.values())
+            for tipo, elegidas in sugerencias.items():
+                sugerencias[tipo] = list(elegidas.values())
+
+    def autocompletar(self, prefijo, tipo=None, limite=AUTOCOMPLETAR_MAX):
+        nodo = self._raiz
+        for c in plegar(prefijo):
+            nodo = nodo[0].get(c)
+            if nodo is None:
+                return []
+        return nodo[1].get(tipo, [])[:limite]
+
+    def canonizar(self, texto, tipo):
+        # Nombre canónico de un sinónimo conocido; si no, el texto plegado (mismas claves de caché)
+        plegado = plegar(texto)
+        return self._canonicos.get((tipo, plegado), plegado)
+
+    def variantes(self, texto, tipo):
+        # Todas las formas escritas del concepto (para comparar con datos del upstream sin plegar)
+        canonico = self._canonicos.get((tipo, plegar(texto)))
+        propia = " ".join((texto or "").lower().split())
+        return tuple(dict.fromkeys(self._variantes.get((tipo, canonico), ()) + (propia,)))
+
+    def __len__(self):
+        return len(self._variantes)
+
+
+def cargar(ruta=VOCABULARIO_RUTA):
+    # Sin diccionario el índice queda vacío: autocompletar no sugiere y canonizar solo pliega
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+    except FileNotFoundError:
+        datos = {}
+    return IndicePrefijos(
+        (tipo, canonico, sinonimos)
+        for seccion, tipo in TIPOS.items()
+        for canonico, sinonimos in datos.get(seccion, {}).items()
+    )
+
+
+vocabulario = cargar()
+
+
+def canonizar_molecula(texto):
+    return vocabulario.canonizar(texto, "molecula") if texto else texto
+
+
+def canonizar_patologia(texto):
+    return vocabulario.canonizar(texto, "patologia") if texto else texto